@@ -1,18 +1,28 @@
 import pandas as pd
-import datetime
-import time
-import os
-import uuid
-import subprocess
-import json
-from pathlib import Path
 import streamlit as st
-
-# File paths for persistent storage
-DATA_DIR = Path("data")
-DATA_DIR.mkdir(exist_ok=True)
-JOBS_FILE = DATA_DIR / "jobs.json"
-HISTORY_FILE = DATA_DIR / "history.json"
+from profiling import profile_page
+import core
+# Used by the pages, which import them from here
+from core import (get_state, get_timestamp, prune_history, execute_script, start_job_run, finish_run, get_script_content,
+                  add_job, add_jobs, export_jobs, update_job, set_jobs_enabled, toggle_job, delete_job, delete_jobs,
+                  live_snapshot, format_countdown)
+from overlap import get_active_runs
+
+# Errors of the data layer are shown on the page
+core.set_error_handler(st.error)
+
+# Seconds between refreshes of the live status panels
+LIVE_REFRESH_SECONDS = 5
+
+# How the runs in the recent runs feed are labelled
+RECENT_STATUS = {
+    'success': "Success",
+    'failed': "Failed",
+    'cached': "Success (cached)",
+    'skipped': "Skipped",
+    'coalesced': "Coalesced",
+    'cancelled': "Cancelled",
+}
 
 
 # Function to create a status indicator
@@ -26,313 +36,41 @@ def status_indicator(enabled, use_emoji=False):
         dot_html = f'<span class="status-dot {status_class}"></span>'
         return dot_html
 
-# Load jobs and history from files
+# Load jobs and history from files and point the session at them
 def load_data():
-    if 'jobs' not in st.session_state:
-        if JOBS_FILE.exists():
-            try:
-                with open(JOBS_FILE, 'r') as f:
-                    jobs_data = json.load(f)
-                    # Convert string timestamps back to datetime objects
-                    for job in jobs_data:
-                        job['created_at'] = datetime.datetime.fromisoformat(job['created_at'])
-                        if job['last_run']:
-                            job['last_run'] = datetime.datetime.fromisoformat(job['last_run'])
-                    st.session_state.jobs = jobs_data
-            except Exception as e:
-                st.error(f"Error loading jobs: {str(e)}")
-                st.session_state.jobs = []
-        else:
-            st.session_state.jobs = []
-    
-    if 'job_history' not in st.session_state:
-        if HISTORY_FILE.exists():
-            try:
-                with open(HISTORY_FILE, 'r') as f:
-                    history_data = json.load(f)
-                    # Convert string timestamps back to datetime objects
-                    for entry in history_data:
-                        entry['timestamp'] = datetime.datetime.fromisoformat(entry['timestamp'])
-                    st.session_state.job_history = history_data
-            except Exception as e:
-                st.error(f"Error loading history: {str(e)}")
-                st.session_state.job_history = []
-        else:
-            st.session_state.job_history = []
-    
-    if 'next_run_times' not in st.session_state:
-        st.session_state.next_run_times = {}
-        # Recalculate next run times based on loaded jobs
-        for job in st.session_state.jobs:
-            if job['enabled']:
-                last_run = job['last_run'] or datetime.datetime.now()
-                st.session_state.next_run_times[job['id']] = last_run + datetime.timedelta(seconds=job['interval_seconds'])
+    state = core.load_data()
+    
+    # The session only keeps references to the shared objects, never copies
+    if st.session_state.get('jobs') is not state.jobs:
+        st.session_state.jobs = state.jobs
+        st.session_state.next_run_times = state.next_run_times
+        st.session_state.retry_times = state.retry_times
+    if state.history is not None and st.session_state.get('job_history') is not state.history:
+        st.session_state.job_history = state.history
+    
+    # Lets pages tell whether another session saved changes since this session's last rerun
+    seen = st.session_state.get('state_version')
+    st.session_state.state_changed = seen is not None and seen != state.version
+    st.session_state.state_version = state.version
+
+# Function to wait for the history to be loaded and return it as a HistoryStore
+def get_job_history():
+    history = core.get_job_history()
+    st.session_state.job_history = history
+    return history
 
 # Save jobs and history to files
 def save_data():
-    try:
-        # Convert datetime objects to strings for JSON serialization
-        jobs_data = []
-        for job in st.session_state.jobs:
-            job_copy = job.copy()
-            job_copy['created_at'] = job_copy['created_at'].isoformat()
-            if job_copy['last_run']:
-                job_copy['last_run'] = job_copy['last_run'].isoformat()
-            jobs_data.append(job_copy)
-        
-        with open(JOBS_FILE, 'w') as f:
-            json.dump(jobs_data, f, indent=2)
-        
-        history_data = []
-        for entry in st.session_state.job_history:
-            entry_copy = entry.copy()
-            entry_copy['timestamp'] = entry_copy['timestamp'].isoformat()
-            history_data.append(entry_copy)
-        
-        with open(HISTORY_FILE, 'w') as f:
-            json.dump(history_data, f, indent=2)
-    except Exception as e:
-        st.error(f"Error saving data: {str(e)}")
+    if core.save_data():
+        # The saving session has seen its own change
+        st.session_state.state_version = get_state().version
 
 # Function to check and execute scheduled jobs
 def check_scheduled_jobs():
-    # Load data if not already loaded
-    load_data()
-    
-    now = datetime.datetime.now()
-    jobs_executed = False
-    
-    for job in st.session_state.jobs:
-        job_id = job['id']
-        
-        # Skip disabled jobs
-        if not job['enabled']:
-            continue
-        
-        # Check if it's time to run the job
-        if job_id in st.session_state.next_run_times and now >= st.session_state.next_run_times[job_id]:
-            # Get the default arguments (if they exist)
-            script_arguments = job.get('script_arguments', "")
-            
-            # Execute the job with default arguments
-            success, output = execute_script(job_id, job['script_path'], job['script_type'], script_arguments)
-            jobs_executed = True
-            
-            # Update last run time
-            for i, j in enumerate(st.session_state.jobs):
-                if j['id'] == job_id:
-                    st.session_state.jobs[i]['last_run'] = now
-                    break
-            
-            # Schedule next run
-            st.session_state.next_run_times[job_id] = now + datetime.timedelta(seconds=job['interval_seconds'])
-    
-    # Save data if any jobs were executed
-    if jobs_executed:
-        save_data()
-
-# Function to execute a script
-def execute_script(job_id, script_path, script_type, arguments=None):
-    try:
-        # Build command with arguments if provided
-        if arguments is None:
-            arguments = ""
-        
-        if script_type == 'py':
-            result = subprocess.run(['python', script_path] + arguments.split(), capture_output=True, text=True)
-        elif script_type == 'sh':
-            result = subprocess.run(['bash', script_path] + arguments.split(), capture_output=True, text=True)
-        elif script_type == 'php':
-            result = subprocess.run(['php', script_path] + arguments.split(), capture_output=True, text=True)
-        elif script_type == 'js':
-            result = subprocess.run(['node', script_path] + arguments.split(), capture_output=True, text=True)
-        elif script_type == 'rb':
-            result = subprocess.run(['ruby', script_path] + arguments.split(), capture_output=True, text=True)
-        elif script_type == 'pl':
-            result = subprocess.run(['perl', script_path] + arguments.split(), capture_output=True, text=True)
-        elif script_type == 'ps1':
-            result = subprocess.run(['powershell', '-File', script_path] + arguments.split(), capture_output=True, text=True)
-        elif script_type == 'bat' or script_type == 'cmd':
-            result = subprocess.run([script_path] + arguments.split(), shell=True, capture_output=True, text=True)
-        elif script_type == 'r':
-            result = subprocess.run(['Rscript', script_path] + arguments.split(), capture_output=True, text=True)
-        elif script_type == 'lua':
-            result = subprocess.run(['lua', script_path] + arguments.split(), capture_output=True, text=True)
-        elif script_type == 'go':
-            result = subprocess.run(['go', 'run', script_path] + arguments.split(), capture_output=True, text=True)
-        elif script_type == 'sql':
-            # Generic SQL execution - would need to be customized for specific DB engines
-            result = subprocess.run(['sqlite3', '-init', script_path, ':memory:', '.exit'] + arguments.split(), capture_output=True, text=True)
-        else:
-            return False, f"Unsupported script type: {script_type}"
-        
-        # Record the execution in history
-        st.session_state.job_history.append({
-            'job_id': job_id,
-            'timestamp': datetime.datetime.now(),
-            'success': result.returncode == 0,
-            'output': result.stdout,
-            'error': result.stderr,
-            'arguments': arguments  # Store the arguments that were used
-        })
-        
-        # Save history data
-        save_data()
-        
-        return result.returncode == 0, result.stdout if result.returncode == 0 else result.stderr
-    except Exception as e:
-        error_message = str(e)
-        
-        # Record the execution failure in history
-        st.session_state.job_history.append({
-            'job_id': job_id,
-            'timestamp': datetime.datetime.now(),
-            'success': False,
-            'output': '',
-            'error': error_message,
-            'arguments': arguments  # Store the arguments that were used
-        })
-        
-        # Save history data
-        save_data()
-        
-        return False, error_message
-
-# Function to create a temporary script file
-def create_script_file(content, script_type):
-    # Create a scripts directory if it doesn't exist
-    script_dir = Path("scripts")
-    script_dir.mkdir(exist_ok=True)
-    
-    # Generate a unique filename
-    script_id = str(uuid.uuid4())
-    filename = script_dir / f"{script_id}.{script_type}"
-    
-    # Write content to the file
-    with open(filename, 'w') as f:
-        f.write(content)
-    
-    # Make the file executable for script types that require it
-    if script_type in ['sh', 'pl', 'rb', 'py', 'php', 'js', 'lua', 'r', 'bat', 'cmd']:
-        os.chmod(filename, 0o755)
-    
-    return filename
-
-# Function to get script content
-def get_script_content(script_path):
-    try:
-        with open(script_path, 'r') as f:
-            return f.read()
-    except:
-        return "Error reading script content."
-
-# Function to add a new job
-def add_job(name, script_content, script_type, interval_value, interval_unit, enabled=True, script_arguments=""):
-    # Convert interval to seconds
-    interval_seconds = interval_value
-    if interval_unit == "minutes":
-        interval_seconds *= 60
-    elif interval_unit == "hours":
-        interval_seconds *= 3600
-    elif interval_unit == "days":
-        interval_seconds *= 86400
-    
-    # Create the script file
-    script_path = create_script_file(script_content, script_type)
-    
-    # Generate a unique ID for the job
-    job_id = str(uuid.uuid4())
-    
-    # Create the job object with ALL fields for consistency
-    job = {
-        'id': job_id,
-        'name': name,
-        'script_path': str(script_path),
-        'script_type': script_type,
-        'interval_value': interval_value,
-        'interval_unit': interval_unit,
-        'interval_seconds': interval_seconds,
-        'created_at': datetime.datetime.now(),
-        'last_run': None,
-        'enabled': enabled,
-        'script_arguments': script_arguments  # Add default arguments field
-    }
-    
-    # Add the job to the session state
-    st.session_state.jobs.append(job)
-    
-    # Schedule the next run if the job is enabled
-    if enabled:
-        st.session_state.next_run_times[job_id] = datetime.datetime.now() + datetime.timedelta(seconds=interval_seconds)
-    
-    # Save the updated jobs data
-    save_data()
+    core.check_scheduled_jobs()
     
-    return job_id
-
-# Function to update an existing job
-def update_job(job_id, name, script_content, script_type, interval_value, interval_unit, enabled, script_arguments=""):
-    try:
-        # Find the job to update
-        job_index = None
-        for i, job in enumerate(st.session_state.jobs):
-            if job['id'] == job_id:
-                job_index = i
-                break
-        
-        if job_index is None:
-            return False
-        
-        # Convert interval to seconds
-        interval_seconds = interval_value
-        if interval_unit == "minutes":
-            interval_seconds *= 60
-        elif interval_unit == "hours":
-            interval_seconds *= 3600
-        elif interval_unit == "days":
-            interval_seconds *= 86400
-        
-        # Create a new script file if the content has changed
-        old_script_path = st.session_state.jobs[job_index]['script_path']
-        old_script_content = get_script_content(old_script_path)
-        
-        if script_content != old_script_content or script_type != st.session_state.jobs[job_index]['script_type']:
-            # Create a new script file
-            script_path = create_script_file(script_content, script_type)
-            
-            # Remove the old script file
-            try:
-                os.remove(old_script_path)
-            except:
-                pass
-        else:
-            # Keep the existing script file
-            script_path = old_script_path
-        
-        # Update the job
-        st.session_state.jobs[job_index]['name'] = name
-        st.session_state.jobs[job_index]['script_path'] = str(script_path)
-        st.session_state.jobs[job_index]['script_type'] = script_type
-        st.session_state.jobs[job_index]['interval_value'] = interval_value
-        st.session_state.jobs[job_index]['interval_unit'] = interval_unit
-        st.session_state.jobs[job_index]['interval_seconds'] = interval_seconds
-        st.session_state.jobs[job_index]['enabled'] = enabled
-        st.session_state.jobs[job_index]['script_arguments'] = script_arguments  # Add default arguments
-        
-        # Update next run time if enabled
-        if enabled:
-            last_run = st.session_state.jobs[job_index]['last_run'] or datetime.datetime.now()
-            st.session_state.next_run_times[job_id] = last_run + datetime.timedelta(seconds=interval_seconds)
-        elif job_id in st.session_state.next_run_times:
-            del st.session_state.next_run_times[job_id]
-        
-        # Save data
-        save_data()
-        
-        return True
-    except Exception as e:
-        print(f"Error updating job: {str(e)}")
-        return False
+    # Loaded after the check, which may have taken over jobs changed by another process
+    load_data()
 
 def custom_metric(label, value, color):
     html = f"""
@@ -343,7 +81,68 @@ def custom_metric(label, value, color):
     """
     return html
 
+# Function to show a table of live job states
+def show_live_jobs(jobs):
+    st.dataframe(pd.DataFrame([
+        {
+            "Job": job['name'],
+            "Now": {'running': "▶️ Running", 'queued': "⏳ Queued"}.get(job['state'], ""),
+            "Last Result": {'success': "✅ Success", 'failed': "❌ Failed"}.get(job['last_status'], "Never run"),
+            "Next Run": format_countdown(job['next_run_in']),
+        }
+        for job in jobs
+    ]), use_container_width=True, hide_index=True)
+
+# Function to show the running, upcoming and recent runs on the home page; reruns on its own without the page
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def live_overview():
+    # Runs queued or going right now
+    running = get_active_runs().running(10)
+    if running:
+        st.header("Currently Running")
+        st.dataframe(pd.DataFrame([
+            {
+                "Job": run['name'],
+                "Since": run['since'].strftime('%Y-%m-%d %H:%M:%S'),
+                "State": "Running" if run['running'] else "Queued",
+            }
+            for run in running
+        ]), use_container_width=True)
+    
+    snapshot = live_snapshot()
+    if snapshot['jobs']:
+        st.header("Next Runs")
+        show_live_jobs(snapshot['jobs'])
+    
+    # Show recently executed jobs
+    st.header("Recently Executed Jobs")
+    
+    runs = get_state().recent_runs.latest(5)
+    if not runs:
+        st.info("No recemtly executed jobs yet.")
+    else:
+        history_df = pd.DataFrame([
+            {
+                "Job": run['name'],
+                "Timestamp": run['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
+                "Status": RECENT_STATUS[run['status']],
+                "Duration": f"{run['duration']:.2f}s" if run['duration'] is not None else "",
+            }
+            for run in runs
+        ])
+        st.dataframe(history_df, use_container_width=True)
+    st.caption(f"Updated {snapshot['time'].strftime('%H:%M:%S')}")
+
+# Function to show the live state of some jobs on the jobs page; reruns on its own without the page
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def live_job_status(job_ids):
+    snapshot = live_snapshot(job_ids)
+    with st.expander("Live Status", expanded=True):
+        show_live_jobs(snapshot['jobs'])
+        st.caption(f"Updated {snapshot['time'].strftime('%H:%M:%S')}, every {LIVE_REFRESH_SECONDS} seconds")
+
 # Main page - Only execute when run directly (not when imported)
+@profile_page("home")
 def main():
     # Set page configuration - this is now inside the main function
     st.set_page_config(
@@ -378,7 +177,7 @@ def main():
     # Check and execute scheduled jobs
     check_scheduled_jobs()
     
-    col1, col2, col3 = st.columns(3)
+    col1, col2, col3, col4 = st.columns(4)
     
     with col1:
         st.markdown(custom_metric("Total Jobs", len(st.session_state.jobs), "white"), unsafe_allow_html=True)
@@ -391,11 +190,16 @@ def main():
         inactive_jobs = sum(1 for job in st.session_state.jobs if job['enabled'] == False)
         st.markdown(custom_metric("Inactive Jobs", inactive_jobs, "red"), unsafe_allow_html=True)
     
+    with col4:
+        # Jobs whose last run failed, from the stats kept with each job
+        failing_jobs = sum(1 for job in st.session_state.jobs if (job.get('stats') or {}).get('consecutive_failures'))
+        st.markdown(custom_metric("Failing Jobs", failing_jobs, "orange"), unsafe_allow_html=True)
+    
     st.divider()
 
     # Quick links
     st.header("Quick Links")
-    col1, col2, col3, col4 = st.columns(4)
+    col1, col2, col3, col4, col5 = st.columns(5)
     
     with col1:
         if st.button("All Jobs", use_container_width=True):
@@ -413,32 +217,19 @@ def main():
         if st.button("Templates", use_container_width=True):
             st.switch_page("pages/4_templates.py")
     
+    with col5:
+        if st.button("Capacity Forecast", use_container_width=True):
+            st.switch_page("pages/6_forecast.py")
+    
     st.divider()
 
-    # Show recently executed jobs
-    st.header("Recently Executed Jobs")
+    # Only the first page view after a start waits for the history, to fill the recent runs feed
+    if not get_state().recent_runs.seeded:
+        with st.spinner("Loading execution history..."):
+            get_job_history()
     
-    if not st.session_state.job_history:
-        st.info("No recemtly executed jobs yet.")
-    else:
-        # Get the 5 most recent job executions
-        recent_history = sorted(st.session_state.job_history, key=lambda x: x['timestamp'], reverse=True)[:5]
-        
-        # Create a DataFrame for display
-        history_data = []
-        for history in recent_history:
-            job_name = next((job['name'] for job in st.session_state.jobs if job['id'] == history['job_id']), 'Unknown')
-            status = "Success" if history['success'] else "Failed"
-            timestamp = history['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
-            
-            history_data.append({
-                "Job": job_name,
-                "Timestamp": timestamp,
-                "Status": status
-            })
-        
-        history_df = pd.DataFrame(history_data)
-        st.dataframe(history_df, use_container_width=True)
+    # Running, upcoming and recent runs, refreshed in place on a timer
+    live_overview()
 
 # Only run the main function when this script is executed directly
 if __name__ == "__main__":
@@ -0,0 +1,339 @@
+"""Scalability benchmarks for the core TaskFlow data paths.
+
+Generates synthetic jobs.json / history.json files in a scratch directory and
+times the functions from app.py and core.py that every page rerun goes through.
+Results are written as JSON so runs from different versions can be compared:
+
+    python benchmarks/bench_core.py --sizes 100,10000 --output before.json
+    python benchmarks/bench_core.py --sizes 100,10000 --compare before.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_SIZES = [100, 10_000, 1_000_000]
+DEFAULT_OUTPUT = REPO_DIR / "benchmarks" / "results.json"
+
+# Cap on the rows used for the per-row job name lookups. The history page does
+# one linear scan of the jobs list per history row, so at 1M x 1M the full loop
+# never finishes; we time a sample and report the per-row cost instead.
+LOOKUP_SAMPLE_ROWS = 1000
+
+SCRIPT_TYPES = ["py", "sh", "php", "js", "rb", "pl", "r", "lua", "go", "sql"]
+INTERVAL_UNITS = {"minutes": 60, "hours": 3600, "days": 86400}
+SAMPLE_OUTPUT = "PING google.com (142.250.185.78): 56 data bytes\n64 bytes from 142.250.185.78: icmp_seq=0 ttl=117 time=12.3 ms\nGoogle is reachable.\n"
+SAMPLE_ERROR = "ping: cannot resolve google.com: Unknown host\n"
+BENCH_SCRIPT = "#!/bin/sh\necho benchmark\n"
+
+
+# Function to generate synthetic jobs in the on-disk format of save_data()
+def generate_jobs(count, script_path, rng):
+    now = datetime.datetime.now()
+    jobs = []
+    for i in range(count):
+        unit = rng.choice(list(INTERVAL_UNITS))
+        value = rng.randint(1, 30)
+        last_run = now - datetime.timedelta(seconds=rng.randint(0, 3600))
+        jobs.append({
+            'id': f"job-{i:08d}",
+            'name': f"Job {i}",
+            'script_path': str(script_path),
+            'script_type': rng.choice(SCRIPT_TYPES),
+            'interval_value': value,
+            'interval_unit': unit,
+            # Keep every job well in the future so check_scheduled_jobs() only scans
+            'interval_seconds': value * INTERVAL_UNITS[unit] + 86400,
+            'created_at': (now - datetime.timedelta(days=30)).isoformat(),
+            'last_run': last_run.isoformat(),
+            'enabled': rng.random() < 0.8,
+            'script_arguments': "" if rng.random() < 0.5 else "--verbose example.com",
+        })
+    return jobs
+
+
+# Function to store the sample texts once, the way finish_run() stores run output
+def packed_samples():
+    import output_store
+    output_hash = output_store.put_blob(SAMPLE_OUTPUT, "bench-sample")
+    error_hash = output_store.put_blob(SAMPLE_ERROR, "bench-sample")
+    return {
+        True: {'output_hash': output_hash, 'error_hash': None},
+        False: {'output_hash': None, 'error_hash': error_hash},
+    }
+
+
+# Function to generate synthetic history entries in the on-disk format of save_data()
+def generate_history(count, job_count, rng):
+    start = datetime.datetime.now() - datetime.timedelta(days=30)
+    samples = packed_samples()
+    history = []
+    for i in range(count):
+        success = rng.random() < 0.9
+        history.append({
+            'job_id': f"job-{rng.randrange(job_count):08d}",
+            'timestamp': (start + datetime.timedelta(seconds=i * 2)).isoformat(),
+            'success': success,
+            **samples[success],
+            'arguments': '',
+        })
+    return history
+
+
+# Function to write the synthetic data files the same way save_data() does
+def write_dataset(workdir, size, rng):
+    data_dir = workdir / "data"
+    script_dir = workdir / "scripts"
+    data_dir.mkdir(exist_ok=True)
+    script_dir.mkdir(exist_ok=True)
+
+    script_path = script_dir / "bench.sh"
+    script_path.write_text(BENCH_SCRIPT)
+
+    jobs_file = data_dir / "jobs.json"
+    history_file = data_dir / "history.json"
+    with open(jobs_file, 'w') as f:
+        json.dump(generate_jobs(size, script_path, rng), f, indent=2)
+    with open(history_file, 'w') as f:
+        json.dump(generate_history(size, size, rng), f, indent=2)
+
+    return jobs_file, history_file, script_path
+
+
+# Function to run a callable several times and summarize the wall times
+def measure(func, repeat, setup=None):
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {
+        'repeat': repeat,
+        'min_s': min(timings),
+        'median_s': statistics.median(timings),
+        'max_s': max(timings),
+    }
+
+
+# Function to get the current commit so results can be tied to a version
+def git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True)
+        return result.stdout.strip() or None
+    except Exception:
+        return None
+
+
+# Function to benchmark every data path for one dataset size
+def bench_size(app, st, workdir, size, repeat, rng):
+    from shared_state import reset_shared_state
+    jobs_file, history_file, script_path = write_dataset(workdir, size, rng)
+    # The data files are read and written by core.py, app.py only binds the session to them
+    app.core.JOBS_FILE = jobs_file
+    app.core.HISTORY_FILE = history_file
+
+    def reset_browser_session():
+        for key in list(st.session_state.keys()):
+            del st.session_state[key]
+
+    def reset_session():
+        # Also drop the process-wide state, so the data files are read again
+        reset_browser_session()
+        reset_shared_state()
+
+    def ensure_loaded():
+        if 'jobs' not in st.session_state:
+            app.load_data()
+        app.get_job_history()
+
+    snapshot_file = history_file.with_suffix('.snapshot')
+
+    def reset_cold():
+        reset_session()
+        if snapshot_file.exists():
+            snapshot_file.unlink()
+
+    def load_history():
+        app.load_data()
+        app.get_job_history()
+
+    results = {
+        # Time until the page can start rendering (history keeps loading in the background)
+        'load_data': measure(app.load_data, repeat, setup=reset_session),
+        'load_history_json': measure(load_history, repeat, setup=reset_cold),
+    }
+    # The last JSON load left a fresh snapshot behind
+    results['load_history_snapshot'] = measure(load_history, repeat, setup=reset_session)
+    # Another browser session opening the app once the process has loaded the data
+    load_history()
+    results['load_data_new_session'] = measure(load_history, repeat, setup=reset_browser_session)
+
+    ensure_loaded()
+    results['save_data'] = measure(app.save_data, repeat)
+    results['check_scheduled_jobs'] = measure(app.check_scheduled_jobs, repeat)
+
+    # One job that is due on every call, so the run + history write path is timed too;
+    # scheduled runs finish in the background, so the call waits for the run to be recorded
+    due_job = st.session_state.jobs[0]
+    due_job['enabled'] = True
+    due_job['script_type'] = 'sh'
+
+    def make_due():
+        st.session_state.next_run_times[due_job['id']] = datetime.datetime.now() - datetime.timedelta(seconds=1)
+
+    def run_one_due():
+        app.check_scheduled_jobs()
+        app.core.get_state().wait_for_runs()
+
+    results['check_scheduled_jobs_one_due'] = measure(run_one_due, repeat, setup=make_due)
+
+    results['add_job'] = measure(
+        lambda: app.add_job("Benchmark job", BENCH_SCRIPT, "sh", 5, "minutes", False, ""),
+        repeat,
+    )
+
+    target = st.session_state.jobs[len(st.session_state.jobs) // 2]
+    results['update_job'] = measure(
+        lambda: app.update_job(target['id'], target['name'], BENCH_SCRIPT, target['script_type'],
+                               target['interval_value'], target['interval_unit'], target['enabled'],
+                               target.get('script_arguments', '')),
+        repeat,
+    )
+
+    # Home page: the 5 newest runs with their job names
+    def home_recent_runs():
+        job_history = st.session_state.job_history
+        job_names = {job['id']: job['name'] for job in st.session_state.jobs}
+        for row in job_history.latest(5):
+            job_names.get(job_history.job_id(row), 'Unknown')
+
+    results['home_recent_runs'] = measure(home_recent_runs, repeat)
+
+    # History page: all rows sorted newest first without building entry dicts
+    results['history_rows'] = measure(lambda: st.session_state.job_history.rows(), repeat)
+
+    # History page: job name and timestamp of every displayed row
+    job_history = st.session_state.job_history
+    sample = range(min(LOOKUP_SAMPLE_ROWS, len(job_history)))
+
+    def history_name_lookups():
+        job_names = {job['id']: job['name'] for job in st.session_state.jobs}
+        for row in sample:
+            job_names.get(job_history.job_id(row), 'Unknown')
+            job_history.timestamp_of(row)
+
+    lookup = measure(history_name_lookups, repeat)
+    lookup['rows'] = len(sample)
+    lookup['per_row_s'] = lookup['median_s'] / max(len(sample), 1)
+    lookup['projected_full_s'] = lookup['per_row_s'] * len(job_history)
+    results['history_name_lookups'] = lookup
+
+    # Memory held by the loaded history, measured on a load from the snapshot
+    import storage
+    tracemalloc.start()
+    history = storage.HistoryLoader(history_file).result()
+    history_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del history
+
+    reset_session()
+    return {
+        'size': size,
+        'jobs_file_bytes': jobs_file.stat().st_size,
+        'history_file_bytes': history_file.stat().st_size,
+        'history_memory_bytes': history_memory,
+        'operations': results,
+    }
+
+
+# Function to print a side by side comparison against an earlier results file
+def compare(results, baseline_path):
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+
+    base_index = {}
+    for entry in baseline.get('results', []):
+        for name, stats in entry['operations'].items():
+            base_index[(entry['size'], name)] = stats['median_s']
+
+    print(f"\nComparison against {baseline_path} ({baseline['meta'].get('git_commit')})")
+    print(f"{'size':>10}  {'operation':<30} {'before':>10} {'after':>10} {'ratio':>8}")
+    for entry in results:
+        for name, stats in entry['operations'].items():
+            before = base_index.get((entry['size'], name))
+            if before is None:
+                continue
+            ratio = stats['median_s'] / before if before else float('inf')
+            print(f"{entry['size']:>10}  {name:<30} {before:>10.4f} {stats['median_s']:>10.4f} {ratio:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the TaskFlow data paths at increasing scale.")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma-separated number of jobs and history entries to generate")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed repetitions per operation")
+    parser.add_argument("--output", default=str(DEFAULT_OUTPUT), help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--seed", type=int, default=1234, help="Seed for the synthetic data generator")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    output_path = Path(args.output).resolve()
+    baseline_path = Path(args.compare).resolve() if args.compare else None
+    original_cwd = os.getcwd()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory(prefix="taskflow-bench-") as tmp:
+        workdir = Path(tmp)
+        # app.py resolves data/ and scripts/ relative to the working directory
+        os.chdir(workdir)
+        sys.path.insert(0, str(REPO_DIR))
+        import streamlit as st
+        import app
+
+        results = []
+        for size in sizes:
+            print(f"Benchmarking {size} jobs / {size} history entries...", flush=True)
+            entry = bench_size(app, st, workdir, size, args.repeat, rng)
+            for name, stats in entry['operations'].items():
+                print(f"  {name:<30} median {stats['median_s']:.4f}s")
+            print(f"  {'history memory':<30} {entry['history_memory_bytes'] / max(size, 1):.0f} bytes per run")
+            results.append(entry)
+
+        os.chdir(original_cwd)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output_path}")
+
+    if baseline_path:
+        compare(results, baseline_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1011 @@
+"""Jobs, history, scheduling and runs without any user interface.
+
+Everything the web interface does with data lives here: loading and saving
+jobs.json and history.json, the scheduler, running scripts and recording their
+runs, and creating and changing jobs. Nothing in this module imports Streamlit
+or pandas, so the command line (scriptflow.py) starts in a few tens of
+milliseconds; app.py and the pages import from here and only add the pages.
+
+State is kept in the process-wide SharedState of shared_state.py. Errors are
+passed to report_error(), which prints them unless set_error_handler() was
+given another handler; the web interface shows them on the page.
+
+jobs.json can also be changed by another process, for example the command
+line while the web interface is running. load_data() compares the file with
+what this process last read or wrote and takes the jobs over when it changed.
+history.json is saved with the file locked, after merging the runs other
+processes added to it, see merge_history().
+"""
+import datetime
+import time
+import os
+import sys
+import uuid
+import subprocess
+import sqlite3
+import json
+import heapq
+from concurrent.futures import Future
+from pathlib import Path
+from profiling import timed, count_read
+from storage import HistoryLoader, GroupCommit, update_snapshot, write_atomic, set_aside, file_stamp, file_lock, iter_json_array
+from history_store import HistoryStore
+from shared_state import get_shared_state
+from run_queue import get_run_queue, DEFAULT_PRIORITY
+from retries import should_retry, retry_delay, normalize_retry_policy
+from output_store import pack_entry, collect_blobs
+from overlap import RunHandle, CANCELLED_MESSAGE, get_active_runs, overlap_action, normalize_overlap_policy
+from job_stats import empty_stats, update_stats, dump_stats, load_stats, stats_from_history
+# The result cache, search index, workers, sql jobs, file triggers, notifications and bulk import
+# are imported where they are used, so commands that never need them start faster
+
+# File paths for persistent storage
+DATA_DIR = Path("data")
+DATA_DIR.mkdir(exist_ok=True)
+JOBS_FILE = DATA_DIR / "jobs.json"
+HISTORY_FILE = DATA_DIR / "history.json"
+
+# Called with the message of every error; None prints it
+_error_handler = None
+
+# Function to set where errors are reported, e.g. st.error in the web interface
+def set_error_handler(handler):
+    global _error_handler
+    _error_handler = handler
+
+# Function to report an error to the user
+def report_error(message):
+    if _error_handler is not None:
+        _error_handler(message)
+    else:
+        print(message, file=sys.stderr)
+
+# Function to get the state shared by all sessions for the current data files
+def get_state():
+    return get_shared_state(JOBS_FILE, HISTORY_FILE)
+
+# Function to read the jobs from jobs.json
+def read_jobs():
+    count_read("jobs.json")
+    with open(JOBS_FILE, 'r') as f:
+        jobs = json.load(f)
+    # Convert string timestamps back to datetime objects
+    for job in jobs:
+        job['created_at'] = datetime.datetime.fromisoformat(job['created_at'])
+        if job['last_run']:
+            job['last_run'] = datetime.datetime.fromisoformat(job['last_run'])
+        job['stats'] = load_stats(job.get('stats'))
+    return jobs
+
+# Function to get the next run time of a job from its last run
+def next_run_time(job):
+    last_run = job['last_run'] or datetime.datetime.now()
+    return last_run + datetime.timedelta(seconds=job['interval_seconds'])
+
+# Function to start parsing the history in the background; get_job_history() waits for it
+def start_history_load(state):
+    with state.lock:
+        if state.history is not None or state.history_loader is not None:
+            return
+        if HISTORY_FILE.exists():
+            count_read("history.json")
+            state.history_loader = HistoryLoader(HISTORY_FILE, transform=pack_entry)
+        else:
+            state.history = HistoryStore()
+            state.recent_runs.seed(state.history, {})
+
+# Function to take over jobs.json after another process, such as the command line, changed it
+def reload_jobs(state):
+    try:
+        jobs = read_jobs()
+    except Exception:
+        # Possibly caught in the middle of a write by a process without atomic saves; tried again on the next load
+        return
+    
+    with state.lock:
+        # Jobs whose schedule did not change keep their next run time
+        previous = {job['id']: job for job in state.jobs}
+        next_run_times = state.next_run_times
+        for job in jobs:
+            old = previous.get(job['id'])
+            if not job['enabled']:
+                next_run_times.pop(job['id'], None)
+            elif old is None or not old['enabled'] or old['interval_seconds'] != job['interval_seconds'] or job['id'] not in next_run_times:
+                next_run_times[job['id']] = next_run_time(job)
+        for job_id in previous.keys() - {job['id'] for job in jobs}:
+            forget_schedule(state, job_id)
+        state.jobs = jobs
+        state.jobs_stamp = file_stamp(JOBS_FILE)
+        state.changed()
+
+# Load jobs and history from files
+@timed()
+def load_data(history=True):
+    """history=False only reads the jobs, for callers that never look at the history"""
+    state = get_state()
+    
+    # Only the first caller in the process reads the files, later ones reuse what it loaded
+    if state.jobs is None:
+        with state.lock:
+            if state.jobs is None:
+                jobs = []
+                if JOBS_FILE.exists():
+                    try:
+                        jobs = read_jobs()
+                        state.jobs_stamp = file_stamp(JOBS_FILE)
+                    except Exception as e:
+                        # Starting with no jobs would replace the file on the next save, so keep it for inspection
+                        try:
+                            broken = set_aside(JOBS_FILE)
+                            report_error(f"Error loading jobs: {str(e)}. The file was moved to {broken}.")
+                        except OSError:
+                            report_error(f"Error loading jobs: {str(e)}")
+                
+                # Recalculate next run times based on loaded jobs
+                state.next_run_times = {job['id']: next_run_time(job) for job in jobs if job['enabled']}
+                # Deferred retries of failed scheduled runs, kept off the regular timeline
+                state.retry_times = {}
+                state.jobs = jobs
+    
+    # Another process saved jobs.json since this one read or wrote it
+    elif state.jobs_stamp is not None:
+        try:
+            changed = file_stamp(JOBS_FILE) != state.jobs_stamp
+        except FileNotFoundError:
+            changed = False
+        if changed:
+            reload_jobs(state)
+    
+    # Parse the history in the background so pages can render first
+    if history:
+        start_history_load(state)
+    return state
+
+# Function to wait for the history to be loaded and return it as a HistoryStore
+def get_job_history():
+    state = get_state()
+    if state.history is None:
+        load_data()
+        loader = state.history_loader
+        
+        if loader is not None:
+            # Waited for outside the lock, so sessions that only need the jobs are not blocked
+            try:
+                history = loader.result()
+            except Exception as e:
+                report_error(f"Error loading history: {str(e)}")
+                history = HistoryStore()
+            with state.lock:
+                if state.history is None:
+                    state.history = history
+                    state.history_snapshot = loader.snapshot_state
+                    state.history_stamp = loader.stamp
+                    state.history_loader = None
+                    state.recent_runs.seed(history, {job['id']: job['name'] for job in state.jobs})
+                    # Jobs saved before they had stats get them from the history once
+                    missing = [job['id'] for job in state.jobs if job.get('stats') is None]
+                    if missing:
+                        for job_id, stats in stats_from_history(history, missing).items():
+                            state.find_job(job_id)['stats'] = stats
+    
+    return state.history
+
+# Function to get the timestamp of a history entry, parsing it on first use
+def get_timestamp(entry):
+    timestamp = entry['timestamp']
+    if isinstance(timestamp, str):
+        timestamp = datetime.datetime.fromisoformat(timestamp)
+        entry['timestamp'] = timestamp
+    return timestamp
+
+# Function to take over the runs another process, such as the command line, added to history.json
+# since this one read or wrote it; called with the file locked, so nobody writes it meanwhile
+def merge_history(state):
+    try:
+        if file_stamp(HISTORY_FILE) == state.history_stamp:
+            return 0
+    except FileNotFoundError:
+        return 0
+    
+    with state.lock:
+        history = state.history.frozen()
+        pruned_before = state.history_pruned_before
+    # Runs this process pruned are still in the file if the other process saved before the prune
+    added = [entry for entry in history.new_entries(iter_json_array(HISTORY_FILE))
+             if pruned_before is None or get_timestamp(entry) >= pruned_before]
+    
+    with state.lock:
+        for entry in sorted(added, key=get_timestamp):
+            state.history.append(entry)
+            job = state.find_job(entry['job_id'])
+            if job is not None:
+                job['stats'] = update_stats(job.get('stats'), entry)
+            state.recent_runs.add(entry, job['name'] if job is not None else 'Unknown')
+    return len(added)
+
+# Function to write jobs and history to their files; runs once for a group of saves
+def write_data(state):
+    # Other processes write history.json as well, so it is locked from merging their runs until it is replaced
+    with file_lock(HISTORY_FILE):
+        if state.history is not None:
+            merge_history(state)
+        write_files(state)
+
+# Function to write the jobs and the history, called by write_data() with history.json locked
+def write_files(state):
+    # Only copying happens under the lock, sessions and finishing runs are not held up by the writes
+    with state.lock:
+        # Convert datetime objects to strings for JSON serialization
+        jobs_data = []
+        for job in state.jobs:
+            job_copy = job.copy()
+            job_copy['created_at'] = job_copy['created_at'].isoformat()
+            if job_copy['last_run']:
+                job_copy['last_run'] = job_copy['last_run'].isoformat()
+            job_copy['stats'] = dump_stats(job_copy.get('stats'))
+            jobs_data.append(job_copy)
+        
+        # History that was never loaded cannot have changed
+        history = state.history.frozen() if state.history is not None else None
+        snapshot_state = state.history_snapshot
+    
+    # Written to a temporary file and renamed, so a crash never leaves a truncated file behind;
+    # GroupCommit runs one write at a time, so the files are never written concurrently
+    write_atomic(JOBS_FILE, lambda f: json.dump(jobs_data, f, indent=2))
+    state.jobs_stamp = file_stamp(JOBS_FILE)
+    
+    if history is not None:
+        write_atomic(HISTORY_FILE, lambda f: json.dump(list(history.records()), f, indent=2))
+        state.history_stamp = file_stamp(HISTORY_FILE)
+        
+        # Keep the binary snapshot in step for quick restarts
+        try:
+            state.history_snapshot = update_snapshot(HISTORY_FILE, history, snapshot_state)
+        except Exception:
+            state.history_snapshot = None
+    
+    state.changed()
+
+# Save jobs and history to files
+@timed()
+def save_data():
+    state = get_state()
+    try:
+        # Saves arriving within a few milliseconds of each other, from any session, share one durable write
+        with state.lock:
+            if state.commits is None:
+                state.commits = GroupCommit(lambda: write_data(state))
+        state.commits.commit()
+        return True
+    except Exception as e:
+        report_error(f"Error saving data: {str(e)}")
+        return False
+
+# Function to delete history entries older than the given number of days, returns the number deleted
+def prune_history(days):
+    job_history = get_job_history()
+    
+    state = get_state()
+    before = datetime.datetime.now() - datetime.timedelta(days=days)
+    with state.lock:
+        removed = job_history.prune(before)
+        # Kept so pruned runs that another process still has in history.json are not merged back
+        state.history_pruned_before = max(before, state.history_pruned_before or before)
+    if removed:
+        save_data()
+    
+    # Output blobs are shared between runs, so only those no remaining run uses can go
+    collect_blobs(job_history.referenced_hashes())
+    return removed
+
+# Function to check and execute scheduled jobs
+@timed()
+def check_scheduled_jobs():
+    # Load data if not already loaded
+    load_data()
+    
+    state = get_state()
+    active_runs = get_active_runs()
+    now = datetime.datetime.now()
+    next_run_times = state.next_run_times
+    retry_times = state.retry_times
+    queued_runs = state.queued_runs
+    
+    # Watch the paths of file-triggered jobs; changed files are collected in the background and
+    # start their runs from the watcher thread, so they don't wait for the next page rerun
+    from file_triggers import get_file_watcher, trigger_arguments
+    file_watcher = get_file_watcher()
+    file_watcher.on_fire = run_fired_triggers
+    file_watcher.sync(state.jobs)
+    
+    # Queue every due job first so they run concurrently within the queue limits; the schedule is
+    # shared by all sessions, so due jobs are claimed under the lock and only one session runs them
+    submitted = []
+    overlapped = []
+    with state.lock:
+        for job in state.jobs:
+            job_id = job['id']
+            
+            # Skip disabled jobs and drop their pending retries
+            if not job['enabled']:
+                retry_times.pop(job_id, None)
+                queued_runs.pop(job_id, None)
+                continue
+            
+            # File-triggered jobs fire once per changed file, with its path appended to the default arguments
+            if job.get('file_trigger'):
+                firings = [trigger_arguments(job, path) for path in file_watcher.take(job_id)]
+            
+            # Other jobs fire when it's time to run them
+            elif job_id in next_run_times and now >= next_run_times[job_id]:
+                # Schedule next run
+                next_run_times[job_id] = now + datetime.timedelta(seconds=job['interval_seconds'])
+                firings = [job.get('script_arguments', "")]
+            else:
+                firings = []
+            
+            for script_arguments in firings:
+                # Runs of the job that are still going decide whether this firing starts one
+                action = overlap_action(job.get('overlap_policy'), active_runs.count(job_id), job_id in queued_runs)
+                if action == 'queue':
+                    queued_runs[job_id] = script_arguments
+                    continue
+                if action in ('skip', 'coalesce'):
+                    overlapped.append((job, 'skipped' if action == 'skip' else 'coalesced', script_arguments))
+                    continue
+                if action == 'cancel':
+                    for _ in range(active_runs.cancel(job_id)):
+                        active_runs.record(job_id, 'cancelled')
+                
+                # A regular run supersedes a retry or a queued firing that is still waiting
+                retry_times.pop(job_id, None)
+                queued_runs.pop(job_id, None)
+                
+                # Queue the job with the firing's arguments
+                future = start_job_run(job, script_arguments)
+                submitted.append((job, script_arguments, future, 1, None))
+                
+                # Update last run time
+                job['last_run'] = now
+            
+            if firings:
+                continue
+            
+            # A firing that waited for the previous run starts once the job is idle
+            if job_id in queued_runs and active_runs.count(job_id) == 0:
+                script_arguments = queued_runs.pop(job_id)
+                future = start_job_run(job, script_arguments)
+                submitted.append((job, script_arguments, future, 1, None))
+                job['last_run'] = now
+            
+            # Check if a retry of a failed run is due
+            elif job_id in retry_times and now >= retry_times[job_id]['due']:
+                retry = retry_times.pop(job_id)
+                future = start_job_run(job, retry['arguments'])
+                submitted.append((job, retry['arguments'], future, retry['attempt'], retry['parent_run_id']))
+                job['last_run'] = now
+    
+    # Firings that were skipped or merged into a waiting one are kept in the history too
+    for job, outcome, script_arguments in overlapped:
+        record_overlap(job, outcome, script_arguments)
+    
+    # Runs are recorded as they finish, the check does not wait for them
+    for job, script_arguments, future, attempt, parent_run_id in submitted:
+        record_when_done(job['id'], script_arguments, future, attempt, parent_run_id)
+    
+    # Save the new last run times and the overlapping firings
+    if submitted or overlapped:
+        save_data()
+
+# Function to start the runs of file-triggered jobs once their files fire, called from the file watcher thread
+def run_fired_triggers():
+    try:
+        check_scheduled_jobs()
+    except Exception as e:
+        report_error(f"Error starting file-triggered runs: {str(e)}")
+
+# Function to record a scheduled run in the history once it finishes, from the thread that finishes it
+def record_when_done(job_id, arguments, future, attempt=1, parent_run_id=None):
+    state = get_state()
+    with state.lock:
+        state.unrecorded_runs.add(future)
+    
+    def record(future):
+        try:
+            finish_run(job_id, arguments, future, attempt=attempt, parent_run_id=parent_run_id, retry=True)
+        except Exception as e:
+            report_error(f"Error recording a run: {str(e)}")
+        finally:
+            state.run_recorded(future)
+    
+    # Runs at once for cached results, which are finished already
+    future.add_done_callback(record)
+
+# Function to schedule the next attempt of a failed run if the job's retry policy allows it
+def schedule_retry(job_id, arguments, returncode, attempt, parent_run_id):
+    state = get_state()
+    job = state.find_job(job_id)
+    if job is None:
+        return None
+    
+    policy = job.get('retry_policy')
+    if not should_retry(policy, attempt, returncode):
+        return None
+    
+    due = datetime.datetime.now() + datetime.timedelta(seconds=retry_delay(policy, attempt, job['interval_seconds']))
+    # Called from the thread that finished the run, while the scheduler may be reading the retries
+    with state.lock:
+        state.retry_times[job_id] = {
+            'due': due,
+            'attempt': attempt + 1,
+            'parent_run_id': parent_run_id,
+            'arguments': arguments
+        }
+    return due
+
+# Commands used to run each script type, the script path and arguments are appended
+SCRIPT_COMMANDS = {
+    'py': ['python'],
+    'sh': ['bash'],
+    'php': ['php'],
+    'js': ['node'],
+    'rb': ['ruby'],
+    'pl': ['perl'],
+    'ps1': ['powershell', '-File'],
+    'bat': [],
+    'cmd': [],
+    'r': ['Rscript'],
+    'lua': ['lua'],
+    'go': ['go', 'run'],
+}
+
+# Function to run a script in a subprocess and return its result
+def run_script(script_path, script_type, arguments="", sql_target=None, handle=None):
+    # SQL scripts run in-process on a pooled connection to their target database
+    if script_type == 'sql':
+        from sql_runner import run_sql
+        return run_sql(script_path, arguments, sql_target, handle)
+    
+    started = time.monotonic()
+    try:
+        if script_type not in SCRIPT_COMMANDS:
+            raise ValueError(f"Unsupported script type: {script_type}")
+        if handle is not None and handle.cancelled:
+            raise RuntimeError(CANCELLED_MESSAGE)
+        
+        from job_io import split_arguments
+        command = SCRIPT_COMMANDS[script_type] + [script_path] + split_arguments(arguments)
+        
+        # Cancellable runs get a process group of their own, see RunHandle
+        process = subprocess.Popen(command, shell=script_type in ('bat', 'cmd'), stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                   start_new_session=handle is not None and os.name == 'posix')
+        if handle is not None:
+            # Lets a newer run of a job with the cancel overlap policy stop this one
+            handle.attach(process)
+        stdout, stderr = process.communicate()
+        result = {
+            'success': process.returncode == 0,
+            'returncode': process.returncode,
+            'output': stdout,
+            'error': stderr,
+            'duration': time.monotonic() - started,
+        }
+        if handle is not None and handle.cancelled:
+            result['success'] = False
+            result['error'] += ("\n" if result['error'] and not result['error'].endswith("\n") else "") + CANCELLED_MESSAGE
+            result['cancelled'] = True
+        return result
+    except Exception as e:
+        return {
+            'success': False,
+            'returncode': None,
+            'output': '',
+            'error': str(e),
+            'duration': time.monotonic() - started,
+            'cancelled': handle is not None and handle.cancelled,
+        }
+
+# Function to queue a script run, returns a future for the result of run_script()
+def submit_run(script_path, script_type, arguments="", priority=None, sql_target=None, handle=None):
+    return get_run_queue().submit(
+        script_type,
+        lambda: run_script(script_path, script_type, arguments, sql_target, handle),
+        priority or DEFAULT_PRIORITY
+    )
+
+# Function to start a run of a job, reusing a cached result when the job allows it
+def start_job_run(job, arguments, priority=None, use_cache=True):
+    policy = job.get('result_cache')
+    key = None
+    
+    if policy and use_cache:
+        from result_cache import get_result_cache, cache_key
+        key = cache_key(get_script_content(job['script_path']), job['script_type'], arguments, policy)
+        cached = get_result_cache().get(key)
+        if cached is not None:
+            # Hand back an already finished future so callers treat it like any other run
+            future = Future()
+            future.queue_wait = 0.0
+            future.set_result(dict(cached, duration=0.0, cached=True))
+            return future
+    
+    if job.get('worker_label'):
+        # Jobs pinned to workers run in a `scriptflow worker` process instead of this one
+        from work_queue import submit_remote
+        future = submit_remote(job['worker_label'], job['script_path'], job['script_type'], arguments, priority or job.get('priority'), job.get('sql_target'))
+        get_active_runs().add(job['id'], future, name=job['name'])
+    else:
+        handle = RunHandle()
+        future = submit_run(job['script_path'], job['script_type'], arguments, priority or job.get('priority'), job.get('sql_target'), handle)
+        get_active_runs().add(job['id'], future, handle, job['name'])
+    future.cache_key = key
+    future.cache_ttl = policy['ttl_seconds'] if policy else 0
+    return future
+
+# Function to add an entry to the history and the search index
+def record_entry(entry):
+    job_history = get_job_history()
+    state = get_state()
+    # Sessions finish runs concurrently, and a row must not interleave with another
+    event = None
+    with state.lock:
+        job_history.append(entry)
+        job = state.find_job(entry['job_id'])
+        if job is not None:
+            previous_status = (job.get('stats') or {}).get('last_status')
+            job['stats'] = update_stats(job.get('stats'), entry)
+            if job.get('notifications') and not entry.get('overlap'):
+                from notifications import run_events, run_event
+                event = run_event(job, entry, run_events(entry, previous_status))
+        state.recent_runs.add(entry, job['name'] if job is not None else 'Unknown')
+    
+    # Only queues the notifications; they are delivered in the background
+    if event is not None:
+        from notifications import get_notifier
+        get_notifier().publish(job['notifications'], event)
+    
+    # Keep the search index current; if it is busy it catches up on the next search
+    from search_index import index_runs
+    try:
+        index_runs([entry], timeout=1)
+    except sqlite3.Error:
+        pass
+
+# Function to record a scheduled firing that did not start a run because the job was still running
+def record_overlap(job, outcome, arguments):
+    get_active_runs().record(job['id'], outcome)
+    reason = "skipped" if outcome == 'skipped' else "merged into the firing already waiting"
+    record_entry(pack_entry({
+        'job_id': job['id'],
+        'run_id': str(uuid.uuid4()),
+        'timestamp': datetime.datetime.now(),
+        'success': False,
+        'output': '',
+        'error': f"Not run: the previous run was still going, so this firing was {reason}",
+        'arguments': arguments,
+        'overlap': outcome
+    }))
+
+# Function to wait for a queued run and record it in the history
+def finish_run(job_id, arguments, future, save=True, attempt=1, parent_run_id=None, retry=False, return_entry=False):
+    """Return (success, output or error), with the recorded history entry appended when return_entry is set"""
+    result = future.result()
+    run_id = str(uuid.uuid4())
+    
+    # Record the execution in history, with the output and error text stored as deduplicated blobs
+    entry = pack_entry({
+        'job_id': job_id,
+        'run_id': run_id,
+        'timestamp': datetime.datetime.now(),
+        'success': result['success'],
+        'output': result['output'],
+        'error': result['error'],
+        'arguments': arguments,  # Store the arguments that were used
+        'duration': result['duration'],
+        'queue_wait': future.queue_wait,  # Seconds spent waiting for a free slot
+        'attempt': attempt,
+        'parent_run_id': parent_run_id,  # First attempt of the run this one retries
+        'cached': result.get('cached', False)  # Output reused from the result cache
+    })
+    # Row counts of sql runs, other runs have none
+    for field in ('rows_returned', 'rows_changed'):
+        if result.get(field) is not None:
+            entry[field] = result[field]
+    if result.get('cancelled'):
+        entry['overlap'] = 'cancelled'
+    record_entry(entry)
+    
+    # Keep successful results of cacheable jobs for later runs with the same inputs
+    if result['success'] and getattr(future, 'cache_key', None):
+        from result_cache import get_result_cache
+        get_result_cache().put(future.cache_key, {
+            'success': True,
+            'returncode': result['returncode'],
+            'output': result['output'],
+            'error': result['error']
+        }, future.cache_ttl)
+    
+    # Scheduled runs that failed may be tried again according to the job's retry policy
+    if retry and not result['success'] and not result.get('cancelled'):
+        schedule_retry(job_id, arguments, result['returncode'], attempt, parent_run_id or run_id)
+    
+    # Save history data unless the caller saves once for a whole batch
+    if save:
+        save_data()
+    
+    if return_entry:
+        return result['success'], result['output'] if result['success'] else result['error'], entry
+    return result['success'], result['output'] if result['success'] else result['error']
+
+# Function to execute a script
+@timed()
+def execute_script(job_id, script_path, script_type, arguments=None, save=True, priority=None, use_cache=True, return_entry=False):
+    # Build command with arguments if provided
+    if arguments is None:
+        arguments = ""
+    
+    if script_type != 'sql' and script_type not in SCRIPT_COMMANDS:
+        error = f"Unsupported script type: {script_type}"
+        return (False, error, None) if return_entry else (False, error)
+    
+    job = get_state().find_job(job_id)
+    if job is not None and job['script_path'] == script_path:
+        # Runs of known jobs use the job's priority and result cache
+        future = start_job_run(job, arguments, priority, use_cache)
+    else:
+        future = submit_run(script_path, script_type, arguments, priority)
+    
+    return finish_run(job_id, arguments, future, save, return_entry=return_entry)
+
+# Function to create a temporary script file
+def create_script_file(content, script_type):
+    # Create a scripts directory if it doesn't exist
+    script_dir = Path("scripts")
+    script_dir.mkdir(exist_ok=True)
+    
+    # Generate a unique filename
+    script_id = str(uuid.uuid4())
+    filename = script_dir / f"{script_id}.{script_type}"
+    
+    # Write content to the file
+    with open(filename, 'w') as f:
+        f.write(content)
+    
+    # Make the file executable for script types that require it
+    if script_type in ['sh', 'pl', 'rb', 'py', 'php', 'js', 'lua', 'r', 'bat', 'cmd']:
+        os.chmod(filename, 0o755)
+    
+    return filename
+
+# Function to get script content
+@timed()
+def get_script_content(script_path):
+    count_read("get_script_content")
+    try:
+        with open(script_path, 'r') as f:
+            return f.read()
+    except:
+        return "Error reading script content."
+
+# Function to convert an interval to seconds
+def interval_to_seconds(interval_value, interval_unit):
+    interval_seconds = interval_value
+    if interval_unit == "minutes":
+        interval_seconds *= 60
+    elif interval_unit == "hours":
+        interval_seconds *= 3600
+    elif interval_unit == "days":
+        interval_seconds *= 86400
+    return interval_seconds
+
+# Function to create a job and its script file without saving
+def create_job(name, script_content, script_type, interval_value, interval_unit, enabled=True, script_arguments="", priority=DEFAULT_PRIORITY, retry_policy=None, result_cache=None, worker_label=None, sql_target=None, overlap_policy=None, file_trigger=None, notifications=None):
+    # Convert interval to seconds
+    interval_seconds = interval_to_seconds(interval_value, interval_unit)
+    
+    from job_io import normalize_arguments
+    script_arguments = normalize_arguments(script_arguments)
+    
+    # Create the script file
+    script_path = create_script_file(script_content, script_type)
+    
+    from result_cache import normalize_cache_policy
+    from work_queue import normalize_worker_label
+    from sql_runner import normalize_sql_target
+    from file_triggers import normalize_file_trigger
+    from notifications import normalize_notifications
+    
+    # Generate a unique ID for the job
+    job_id = str(uuid.uuid4())
+    
+    # Create the job object with ALL fields for consistency
+    job = {
+        'id': job_id,
+        'name': name,
+        'script_path': str(script_path),
+        'script_type': script_type,
+        'interval_value': interval_value,
+        'interval_unit': interval_unit,
+        'interval_seconds': interval_seconds,
+        'created_at': datetime.datetime.now(),
+        'last_run': None,
+        'enabled': enabled,
+        'script_arguments': script_arguments,  # Add default arguments field
+        'priority': priority,  # Priority class in the run queue
+        'retry_policy': normalize_retry_policy(retry_policy),  # None when failed runs are not retried
+        'result_cache': normalize_cache_policy(result_cache),  # None when results are never reused
+        'worker_label': normalize_worker_label(worker_label),  # None when runs execute in this process
+        'sql_target': normalize_sql_target(sql_target),  # Database of sql jobs, None for an in-memory database
+        'overlap_policy': normalize_overlap_policy(overlap_policy),  # None when every firing starts a run
+        'file_trigger': normalize_file_trigger(file_trigger),  # None when the job runs on its interval
+        'notifications': normalize_notifications(notifications),  # None when runs are not reported anywhere
+        'stats': empty_stats()  # Run counts and last result, updated as runs are recorded
+    }
+    
+    # Add the job to the shared state
+    state = get_state()
+    with state.lock:
+        state.jobs.append(job)
+        
+        # Schedule the next run if the job is enabled
+        if enabled:
+            state.next_run_times[job_id] = datetime.datetime.now() + datetime.timedelta(seconds=interval_seconds)
+    
+    return job_id
+
+# Function to add a new job
+def add_job(name, script_content, script_type, interval_value, interval_unit, enabled=True, script_arguments="", priority=DEFAULT_PRIORITY, retry_policy=None, result_cache=None, worker_label=None, sql_target=None, overlap_policy=None, file_trigger=None, notifications=None):
+    job_id = create_job(name, script_content, script_type, interval_value, interval_unit, enabled, script_arguments, priority, retry_policy, result_cache, worker_label, sql_target, overlap_policy, file_trigger, notifications)
+    
+    # Save the updated jobs data
+    save_data()
+    
+    return job_id
+
+# Function to add many jobs at once with a single save
+def add_jobs(job_specs):
+    load_data()
+    
+    # Write all script files first, then persist the jobs in one go
+    job_ids = []
+    for spec in job_specs:
+        job_ids.append(create_job(
+            spec['name'],
+            spec['script_content'],
+            spec['script_type'],
+            spec['interval_value'],
+            spec['interval_unit'],
+            spec.get('enabled', True),
+            spec.get('script_arguments', ""),
+            spec.get('priority', DEFAULT_PRIORITY),
+            spec.get('retry_policy'),
+            spec.get('result_cache'),
+            spec.get('worker_label'),
+            spec.get('sql_target'),
+            spec.get('overlap_policy'),
+            spec.get('file_trigger'),
+            spec.get('notifications')
+        ))
+    
+    if job_ids:
+        save_data()
+    
+    return job_ids
+
+# Function to import jobs from JSONL or CSV text
+def import_jobs(text, fmt):
+    from job_io import parse_jobs
+    job_specs, errors = parse_jobs(text, fmt)
+    return add_jobs(job_specs), errors
+
+# Function to export jobs, including their script content, as JSONL or CSV text
+def export_jobs(fmt, job_ids=None):
+    from job_io import export_record, dump_records
+    load_data()
+    
+    records = []
+    for job in get_state().jobs:
+        if job_ids is not None and job['id'] not in job_ids:
+            continue
+        records.append(export_record(job, get_script_content(job['script_path'])))
+    
+    return dump_records(records, fmt)
+
+# Function to update an existing job
+def update_job(job_id, name, script_content, script_type, interval_value, interval_unit, enabled, script_arguments="", priority=None, retry_policy=False, result_cache=False, worker_label=False, sql_target=False, overlap_policy=False, file_trigger=False, notifications=False):
+    state = get_state()
+    try:
+        # Find the job to update
+        job = state.find_job(job_id)
+        if job is None:
+            return False
+        
+        # Convert interval to seconds
+        interval_seconds = interval_to_seconds(interval_value, interval_unit)
+        
+        from result_cache import normalize_cache_policy
+        from work_queue import normalize_worker_label
+        from sql_runner import normalize_sql_target
+        from file_triggers import normalize_file_trigger
+        from notifications import normalize_notifications
+        from job_io import normalize_arguments
+        
+        # Validated before anything changes, so an invalid option leaves the job as it was;
+        # False keeps the current option, None turns it off
+        script_arguments = normalize_arguments(script_arguments)
+        options = {}
+        if retry_policy is not False:
+            options['retry_policy'] = normalize_retry_policy(retry_policy)
+        if result_cache is not False:
+            options['result_cache'] = normalize_cache_policy(result_cache)
+        if worker_label is not False:
+            options['worker_label'] = normalize_worker_label(worker_label)
+        if sql_target is not False:
+            options['sql_target'] = normalize_sql_target(sql_target)
+        if overlap_policy is not False:
+            options['overlap_policy'] = normalize_overlap_policy(overlap_policy)
+        if file_trigger is not False:
+            options['file_trigger'] = normalize_file_trigger(file_trigger)
+        if notifications is not False:
+            options['notifications'] = normalize_notifications(notifications)
+        
+        # Create a new script file if the content has changed
+        old_script_path = job['script_path']
+        old_script_content = get_script_content(old_script_path)
+        
+        if script_content != old_script_content or script_type != job['script_type']:
+            # Create a new script file
+            script_path = create_script_file(script_content, script_type)
+            
+            # Remove the old script file
+            try:
+                os.remove(old_script_path)
+            except:
+                pass
+        else:
+            # Keep the existing script file
+            script_path = old_script_path
+        
+        # Sessions and the scheduler read the job while it changes
+        with state.lock:
+            # Looked up again, another session may have deleted the job meanwhile
+            job = state.find_job(job_id)
+            if job is None:
+                return False
+            
+            # Update the job
+            job['name'] = name
+            job['script_path'] = str(script_path)
+            job['script_type'] = script_type
+            job['interval_value'] = interval_value
+            job['interval_unit'] = interval_unit
+            job['interval_seconds'] = interval_seconds
+            job['enabled'] = enabled
+            job['script_arguments'] = script_arguments  # Add default arguments
+            if priority is not None:
+                job['priority'] = priority
+            job.update(options)
+            
+            # Update next run time if enabled
+            if enabled:
+                last_run = job['last_run'] or datetime.datetime.now()
+                state.next_run_times[job_id] = last_run + datetime.timedelta(seconds=interval_seconds)
+            else:
+                forget_schedule(state, job_id)
+        
+        # Save data
+        save_data()
+        
+        return True
+    except Exception as e:
+        report_error(f"Error updating job: {str(e)}")
+        return False
+
+# Function to drop everything scheduled for a job; called with the state lock held
+def forget_schedule(state, job_id):
+    state.next_run_times.pop(job_id, None)
+    state.retry_times.pop(job_id, None)
+    state.queued_runs.pop(job_id, None)
+
+# Function to enable or disable several jobs with a single save
+def set_jobs_enabled(job_ids, enabled):
+    job_ids = set(job_ids)
+    state = get_state()
+    
+    with state.lock:
+        for job in state.jobs:
+            if job['id'] not in job_ids:
+                continue
+            
+            job['enabled'] = enabled
+            if enabled:
+                state.next_run_times[job['id']] = next_run_time(job)
+            else:
+                forget_schedule(state, job['id'])
+    
+    save_data()
+
+# Function to enable a disabled job or disable an enabled one, returns False if the job does not exist
+def toggle_job(job_id):
+    state = get_state()
+    with state.lock:
+        job = state.find_job(job_id)
+        if job is None:
+            return False
+        enabled = not job['enabled']
+    
+    set_jobs_enabled([job_id], enabled)
+    return True
+
+# Function to delete several jobs and their script files with a single save, returns the number deleted
+def delete_jobs(job_ids):
+    job_ids = set(job_ids)
+    from file_triggers import get_file_watcher
+    state = get_state()
+    
+    with state.lock:
+        deleted = [job for job in state.jobs if job['id'] in job_ids]
+        if not deleted:
+            return 0
+        # Replaced in place, sessions hold a reference to the list
+        state.jobs[:] = [job for job in state.jobs if job['id'] not in job_ids]
+        for job in deleted:
+            # A pending retry, queued firing or file change must not start a run of the deleted job
+            forget_schedule(state, job['id'])
+            get_file_watcher().take(job['id'])
+    
+    for job in deleted:
+        try:
+            os.remove(job['script_path'])
+        except OSError:
+            pass
+    
+    save_data()
+    return len(deleted)
+
+# Function to delete a job and its script file, returns False if the job does not exist
+def delete_job(job_id):
+    return delete_jobs([job_id]) > 0
+
+
+# Function to format the time until a run, e.g. "in 2m 05s"
+def format_countdown(seconds):
+    if seconds is None:
+        return ""
+    if seconds <= 0:
+        return "due"
+    seconds = int(seconds)
+    if seconds >= 86400:
+        return f"in {seconds // 86400}d {seconds % 86400 // 3600}h"
+    if seconds >= 3600:
+        return f"in {seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    return f"in {seconds // 60}m {seconds % 60:02d}s"
+
+# Function to collect what the live status panels show, from memory only
+def live_snapshot(job_ids=None, upcoming=5):
+    """Status of the given jobs, or of the next jobs to run when job_ids is None"""
+    state = get_state()
+    active = get_active_runs().states()
+    now = datetime.datetime.now()
+    with state.lock:
+        if job_ids is None:
+            scheduled = []
+            for job_id, due in state.next_run_times.items():
+                job = state.find_job(job_id)
+                if job is not None and job['enabled'] and not job.get('file_trigger'):
+                    scheduled.append((due, job_id))
+            job_ids = [job_id for due, job_id in heapq.nsmallest(upcoming, scheduled)]
+        
+        jobs = []
+        for job_id in job_ids:
+            job = state.find_job(job_id)
+            if job is None:
+                continue
+            next_run = state.next_run_times.get(job_id) if job['enabled'] and not job.get('file_trigger') else None
+            jobs.append({
+                'name': job['name'],
+                'state': active.get(job_id),
+                'last_status': (job.get('stats') or {}).get('last_status'),
+                'next_run_in': (next_run - now).total_seconds() if next_run else None,
+            })
+    return {'time': now, 'jobs': jobs}
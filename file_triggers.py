@@ -0,0 +1,334 @@
+"""File-watch triggers that start jobs when files change.
+
+A job with a file_trigger is started when files in the watched paths change
+instead of on its interval:
+
+    {"paths": ["/srv/incoming"], "patterns": ["*.csv"], "events": ["create", "move"], "debounce_seconds": 2}
+
+paths are directories, or single files whose directory is watched. patterns
+are glob patterns matched against file names (all files when empty). events
+are any of "create" (a new file), "modify" (a file written and closed) and
+"move" (a file moved or renamed into the directory). Subdirectories are not
+watched. A file has to be quiet for debounce_seconds before the job fires, so
+a file that is still being written fires once. The changed path is appended
+to the job's arguments, shell-quoted so paths with spaces stay one argument
+(bound to :path for sql jobs). A trigger without paths is rejected.
+
+Changes are read from inotify on Linux, so watching costs nothing while no
+file changes. Elsewhere the directories are scanned every POLL_SECONDS.
+FileWatcher collects the changed paths and calls its on_fire callback from
+the watcher thread once some fire; check_scheduled_jobs() takes them with
+take() and starts the runs like scheduled ones, so a file event starts its
+job even while no page is open.
+"""
+import ctypes
+import ctypes.util
+import fnmatch
+import os
+import select
+import shlex
+import struct
+import threading
+import time
+
+TRIGGER_EVENTS = ["create", "modify", "move"]
+DEFAULT_DEBOUNCE_SECONDS = 2.0
+# Scan interval where inotify is not available
+POLL_SECONDS = 2.0
+# Changed paths kept per job until check_scheduled_jobs() takes them
+MAX_PENDING_PATHS = 1000
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+EVENT_MASKS = {"create": IN_CREATE, "modify": IN_CLOSE_WRITE, "move": IN_MOVED_TO}
+EVENT_HEADER = struct.Struct("iIII")
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+# Function to validate the file_trigger option of a job, returns None for jobs that run on their interval
+def normalize_file_trigger(trigger):
+    if not trigger:
+        return None
+
+    paths = trigger.get('paths') or []
+    if isinstance(paths, str):
+        paths = [line.strip() for line in paths.splitlines() if line.strip()]
+    if not paths:
+        raise ValueError("A file trigger needs at least one path")
+
+    patterns = trigger.get('patterns') or []
+    if isinstance(patterns, str):
+        patterns = [pattern.strip() for pattern in patterns.replace("\n", ",").split(",") if pattern.strip()]
+
+    events = trigger.get('events') or TRIGGER_EVENTS
+    unknown = [event for event in events if event not in TRIGGER_EVENTS]
+    if unknown:
+        raise ValueError(f"Unknown file trigger event '{unknown[0]}'")
+
+    return {
+        'paths': [os.path.abspath(os.path.expanduser(str(path))) for path in paths],
+        'patterns': [str(pattern) for pattern in patterns],
+        'events': [event for event in TRIGGER_EVENTS if event in events],
+        'debounce_seconds': max(float(trigger.get('debounce_seconds', DEFAULT_DEBOUNCE_SECONDS) or 0), 0.0),
+    }
+
+
+# Function to turn the paths of a trigger into the watched directories and the file names wanted in each
+def trigger_directories(trigger):
+    """Return {directory: set of file names or None for any file}"""
+    directories = {}
+    for path in trigger['paths']:
+        if os.path.isdir(path):
+            directories[path] = None
+        else:
+            directory, name = os.path.split(path)
+            names = directories.setdefault(directory, set())
+            if names is not None:
+                names.add(name)
+    return directories
+
+
+# Function to append the changed path to a job's default arguments
+def trigger_arguments(job, path):
+    # SQL jobs take name=value pairs, so the path is bound to the :path parameter; quoted since arguments are split like a shell does
+    argument = shlex.quote(f"path={path}" if job['script_type'] == 'sql' else path)
+    return f"{job.get('script_arguments', '')} {argument}".strip()
+
+
+# Function to tell whether a changed file matches a trigger's names and patterns
+def matches(trigger, names, name):
+    if names is not None and name not in names:
+        return False
+    return not trigger['patterns'] or any(fnmatch.fnmatch(name, pattern) for pattern in trigger['patterns'])
+
+
+class Inotify:
+    """Minimal ctypes binding of the Linux inotify API"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path, mask):
+        wd = self._add_watch(self.fd, os.fsencode(path), mask | IN_ONLYDIR)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"Cannot watch {path}")
+        return wd
+
+    def rm_watch(self, wd):
+        self._rm_watch(self.fd, wd)
+
+    def read_events(self, timeout):
+        """Wait up to timeout seconds and return a list of (wd, mask, name)"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+
+class FileWatcher:
+    """Watches the paths of all file-triggered jobs and collects debounced changes per job"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._triggers = {}
+        # Directory -> list of (job id, trigger, file names, event mask) interested in it
+        self._directories = {}
+        self._watches = {}
+        self._wd_directories = {}
+        # Directory -> {name: (size, mtime)} for scanning without inotify
+        self._snapshots = {}
+        # (job id, path) -> monotonic time the path has been quiet long enough
+        self._pending = {}
+        self._fired = {}
+        self._thread = None
+        # Called from the watcher thread, without the lock held, when paths fire their jobs
+        self.on_fire = None
+        try:
+            self._inotify = Inotify()
+        except (OSError, AttributeError, TypeError):
+            self._inotify = None
+
+    def sync(self, jobs):
+        """Bring the watches in line with the enabled file-triggered jobs"""
+        triggers = {
+            job['id']: job['file_trigger']
+            for job in jobs
+            if job['enabled'] and job.get('file_trigger')
+        }
+        with self._lock:
+            if triggers == self._triggers and all(directory in self._watches for directory in self._directories):
+                return
+
+            self._triggers = triggers
+            directories = {}
+            for job_id, trigger in triggers.items():
+                mask = 0
+                for event in trigger['events']:
+                    mask |= EVENT_MASKS[event]
+                for directory, names in trigger_directories(trigger).items():
+                    directories.setdefault(directory, []).append((job_id, trigger, names, mask))
+            self._directories = directories
+
+            for directory in list(self._watches):
+                if directory not in directories:
+                    self._unwatch(directory)
+            for directory, interested in directories.items():
+                mask = 0
+                for _, _, _, job_mask in interested:
+                    mask |= job_mask
+                self._watch(directory, mask)
+
+            self._pending = {key: due for key, due in self._pending.items() if key[0] in triggers}
+            self._fired = {job_id: paths for job_id, paths in self._fired.items() if job_id in triggers}
+
+            if directories and (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run, name="file-watcher", daemon=True)
+                self._thread.start()
+
+    def _watch(self, directory, mask):
+        # Called with the lock held; directories that do not exist yet are tried again on the next sync
+        if self._inotify is None:
+            if directory not in self._snapshots and os.path.isdir(directory):
+                self._snapshots[directory] = self._scan(directory)
+                self._watches[directory] = None
+            return
+        try:
+            wd = self._inotify.add_watch(directory, mask)
+        except OSError:
+            return
+        self._watches[directory] = wd
+        self._wd_directories[wd] = directory
+
+    def _unwatch(self, directory):
+        wd = self._watches.pop(directory)
+        self._snapshots.pop(directory, None)
+        if wd is not None:
+            self._wd_directories.pop(wd, None)
+            self._inotify.rm_watch(wd)
+
+    def _changed(self, directory, name, event):
+        # Called with the lock held
+        now = time.monotonic()
+        for job_id, trigger, names, mask in self._directories.get(directory, ()):
+            if event in trigger['events'] and matches(trigger, names, name):
+                self._pending[(job_id, os.path.join(directory, name))] = now + trigger['debounce_seconds']
+
+    def _scan(self, directory):
+        snapshot = {}
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            pass
+        return snapshot
+
+    def _poll(self):
+        for directory in list(self._snapshots):
+            current = self._scan(directory)
+            with self._lock:
+                previous = self._snapshots.get(directory)
+                if previous is None:
+                    continue
+                for name, stamp in current.items():
+                    if name not in previous:
+                        self._changed(directory, name, "create")
+                        self._changed(directory, name, "move")
+                    elif previous[name] != stamp:
+                        self._changed(directory, name, "modify")
+                self._snapshots[directory] = current
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._directories:
+                    self._thread = None
+                    return
+                next_due = min(self._pending.values(), default=None)
+            timeout = POLL_SECONDS if next_due is None else min(max(next_due - time.monotonic(), 0), POLL_SECONDS)
+
+            if self._inotify is not None:
+                for wd, mask, name in self._inotify.read_events(timeout):
+                    with self._lock:
+                        directory = self._wd_directories.get(wd)
+                        if mask & IN_IGNORED:
+                            # The directory was deleted, it is watched again once it is back
+                            if directory is not None:
+                                self._wd_directories.pop(wd, None)
+                                self._watches.pop(directory, None)
+                            continue
+                        if directory is None or mask & IN_ISDIR or not name:
+                            continue
+                        for event, event_mask in EVENT_MASKS.items():
+                            if mask & event_mask:
+                                self._changed(directory, name, event)
+            else:
+                time.sleep(timeout)
+                self._poll()
+
+            # Paths that stayed quiet for their debounce time fire their job
+            now = time.monotonic()
+            fired = False
+            with self._lock:
+                for key, due in list(self._pending.items()):
+                    if due <= now:
+                        del self._pending[key]
+                        job_id, path = key
+                        paths = self._fired.setdefault(job_id, [])
+                        if path not in paths and len(paths) < MAX_PENDING_PATHS:
+                            paths.append(path)
+                            fired = True
+            on_fire = self.on_fire
+            if fired and on_fire is not None:
+                try:
+                    on_fire()
+                except Exception:
+                    # The paths stay collected, the next check_scheduled_jobs() starts their runs
+                    pass
+
+    def take(self, job_id):
+        """Return and forget the changed paths that fired a job"""
+        with self._lock:
+            return self._fired.pop(job_id, [])
+
+    def uses_inotify(self):
+        return self._inotify is not None
+
+
+# Function to get the process-wide file watcher
+def get_file_watcher():
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = FileWatcher()
+    return _watcher
@@ -0,0 +1,244 @@
+"""Export of the run history to Parquet files for offline analysis.
+
+history.json is one large indented JSON array, which is slow to query with
+anything but TaskFlow itself. sync_history() streams it item by item and
+appends the runs that were not exported yet to a Parquet dataset partitioned
+the Hive way by day and job:
+
+    data/history_parquet/date=2026-10-19/job_id=<job id>/part-<sync>-0.parquet
+
+Every run is one row with the columns of SCHEMA; the partition columns date
+and job_id are part of the directory names, so read the directory with Hive
+partitioning, e.g. pyarrow.dataset.dataset(path, partitioning="hive") or
+DuckDB's read_parquet('.../**/*.parquet', hive_partitioning = true).
+output_bytes and error_bytes are the UTF-8 size of the run's output and error
+text; the text itself stays in the blob store.
+
+Runs are converted in batches of CHUNK_ROWS, so memory stays bounded however
+long the history is. _sync.json in the dataset directory remembers the time
+of the newest exported run and the ids of the runs exported within
+LATE_SECONDS before it. Runs do not always reach history.json in time order,
+for example when the runs another process saved are merged in after this
+one's, so the next sync writes every run that is newer than the newest one
+or that falls within the window and was not exported yet. Pruning old runs
+from history.json does not change what counts as new. The sync being
+written is noted in _sync.json first and its files are removed again by the
+next sync if it did not finish, so an interrupted sync never leaves
+duplicates behind.
+"""
+import datetime
+import json
+import shutil
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from output_store import entry_text
+from recent_runs import run_status
+from storage import iter_json_array, write_atomic
+
+EXPORT_DIR = Path("data") / "history_parquet"
+HISTORY_FILE = Path("data") / "history.json"
+JOBS_FILE = Path("data") / "jobs.json"
+SYNC_FILE = "_sync.json"
+# Bumped when the columns change; datasets of another version need a full export
+SCHEMA_VERSION = 1
+CHUNK_ROWS = 50000
+# Output sizes remembered per blob hash, so repeated output is only decompressed once
+MAX_CACHED_SIZES = 100000
+# Runs reaching history.json up to this much later than newer ones are still exported
+LATE_SECONDS = 3600
+
+SCHEMA = pa.schema([
+    ('run_id', pa.string()),
+    ('job_id', pa.string()),
+    ('job_name', pa.string()),
+    ('timestamp', pa.timestamp('us')),
+    ('date', pa.string()),
+    ('status', pa.string()),
+    ('success', pa.bool_()),
+    ('duration', pa.float64()),
+    ('queue_wait', pa.float64()),
+    ('attempt', pa.int32()),
+    ('parent_run_id', pa.string()),
+    ('arguments', pa.string()),
+    ('output_bytes', pa.int64()),
+    ('error_bytes', pa.int64()),
+])
+PARTITIONING = ds.partitioning(pa.schema([('date', pa.string()), ('job_id', pa.string())]), flavor='hive')
+
+
+# Function to read the job names from jobs.json; runs of deleted jobs get no name
+def job_names(jobs_file=JOBS_FILE):
+    try:
+        with open(jobs_file, 'r') as f:
+            return {job['id']: job['name'] for job in json.load(f)}
+    except (OSError, ValueError):
+        return {}
+
+
+# Function to get the UTF-8 size of the output or error text of a history entry
+def text_bytes(entry, field, sizes):
+    digest = entry.get(field + '_hash')
+    if not digest:
+        # Entries without a blob keep their text in the entry, or have none
+        return len(entry_text(entry, field).encode('utf-8'))
+
+    size = sizes.get(digest)
+    if size is None:
+        if len(sizes) >= MAX_CACHED_SIZES:
+            sizes.clear()
+        size = sizes[digest] = len(entry_text(entry, field).encode('utf-8'))
+    return size
+
+
+# Function to remember an exported run in the sync progress, keeping only the runs within LATE_SECONDS of the newest
+def remember_run(progress, run_id, timestamp):
+    if progress['newest'] is None or timestamp > progress['newest']:
+        progress['newest'] = timestamp
+    if run_id:
+        recent = progress['recent']
+        recent[run_id] = timestamp
+        if len(recent) >= 2 * CHUNK_ROWS:
+            horizon = progress['newest'] - datetime.timedelta(seconds=LATE_SECONDS)
+            progress['recent'] = {key: value for key, value in recent.items() if value >= horizon}
+
+
+# Function to convert history entries into record batches of at most CHUNK_ROWS rows
+def record_batches(entries, names, progress):
+    """progress['runs'] is set to the number of runs converted, see remember_run() for the rest"""
+    sizes = {}
+    columns = {field.name: [] for field in SCHEMA}
+    for entry in entries:
+        timestamp = entry['timestamp']
+        if isinstance(timestamp, str):
+            timestamp = datetime.datetime.fromisoformat(timestamp)
+
+        columns['run_id'].append(entry.get('run_id'))
+        columns['job_id'].append(entry['job_id'])
+        columns['job_name'].append(names.get(entry['job_id']))
+        columns['timestamp'].append(timestamp)
+        columns['date'].append(timestamp.date().isoformat())
+        columns['status'].append(run_status(entry))
+        columns['success'].append(bool(entry.get('success')))
+        columns['duration'].append(entry.get('duration'))
+        columns['queue_wait'].append(entry.get('queue_wait'))
+        columns['attempt'].append(entry.get('attempt') or 1)
+        columns['parent_run_id'].append(entry.get('parent_run_id'))
+        columns['arguments'].append(entry.get('arguments') or '')
+        columns['output_bytes'].append(text_bytes(entry, 'output', sizes))
+        columns['error_bytes'].append(text_bytes(entry, 'error', sizes))
+
+        remember_run(progress, entry.get('run_id'), timestamp)
+        progress['runs'] += 1
+        if len(columns['run_id']) >= CHUNK_ROWS:
+            yield pa.RecordBatch.from_pydict(columns, schema=SCHEMA)
+            columns = {field.name: [] for field in SCHEMA}
+
+    if columns['run_id']:
+        yield pa.RecordBatch.from_pydict(columns, schema=SCHEMA)
+
+
+# Function to get the time of the newest exported run and the recently exported runs from the sync state
+def exported_runs(sync):
+    """Return (newest, {run_id: timestamp}); newest is None before the first sync"""
+    newest = sync.get('last_timestamp')
+    if newest is None:
+        return None, {}
+    newest = datetime.datetime.fromisoformat(newest)
+    if 'recent_runs' not in sync:
+        # Written by a version that only kept the last exported run, so nothing older than it is looked at
+        return newest, {sync['last_run_id']: newest} if sync.get('last_run_id') else {}
+    return newest, {run_id: datetime.datetime.fromisoformat(timestamp) for run_id, timestamp in sync['recent_runs'].items()}
+
+
+# Function to iterate over the runs of history.json that were not exported yet
+def new_entries(history_file, sync):
+    newest, recent = exported_runs(sync)
+    if newest is None:
+        yield from iter_json_array(history_file)
+        return
+
+    # Older runs are taken as exported; within the window the run ids tell
+    horizon = newest - datetime.timedelta(seconds=LATE_SECONDS) if 'recent_runs' in sync else newest
+    for entry in iter_json_array(history_file):
+        timestamp = datetime.datetime.fromisoformat(entry['timestamp'])
+        run_id = entry.get('run_id')
+        if timestamp > newest or (timestamp >= horizon and run_id and run_id not in recent):
+            yield entry
+
+
+# Function to read the sync state of a dataset directory
+def read_sync(directory):
+    try:
+        with open(Path(directory) / SYNC_FILE, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+# Function to save the sync state of a dataset directory
+def write_sync(directory, sync):
+    write_atomic(Path(directory) / SYNC_FILE, lambda f: json.dump(sync, f, indent=2))
+
+
+# Function to remove the Parquet files of one sync
+def remove_sync_files(directory, stamp):
+    for path in Path(directory).glob(f"date=*/job_id=*/part-{stamp}-*.parquet"):
+        path.unlink()
+
+
+# Function to append the runs not exported yet to a Parquet dataset
+def sync_history(directory=EXPORT_DIR, history_file=HISTORY_FILE, jobs_file=JOBS_FILE, full=False):
+    """Return a dict with the number of runs written, the total exported and the seconds taken"""
+    started = datetime.datetime.now()
+    directory = Path(directory)
+
+    if full and directory.exists():
+        for partition in directory.glob("date=*"):
+            shutil.rmtree(partition)
+        (directory / SYNC_FILE).unlink(missing_ok=True)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    sync = read_sync(directory)
+    if sync and sync.get('schema_version') != SCHEMA_VERSION:
+        raise ValueError(f"{directory} was written with another schema version, export it again in full")
+    if sync.get('pending'):
+        # A sync that did not finish; its runs are exported again below
+        remove_sync_files(directory, sync['pending'])
+
+    if not Path(history_file).exists():
+        return {'runs': 0, 'total': sync.get('total', 0), 'seconds': 0.0}
+
+    # Noted before writing, so the files can be found again if the sync is interrupted
+    stamp = started.strftime('%Y%m%dT%H%M%S%f')
+    sync.update(schema_version=SCHEMA_VERSION, pending=stamp)
+    write_sync(directory, sync)
+
+    newest, recent = exported_runs(sync)
+    progress = {'runs': 0, 'newest': newest, 'recent': recent}
+    batches = record_batches(new_entries(history_file, sync), job_names(jobs_file), progress)
+    ds.write_dataset(
+        pa.RecordBatchReader.from_batches(SCHEMA, batches),
+        directory,
+        format='parquet',
+        partitioning=PARTITIONING,
+        basename_template=f"part-{stamp}-{{i}}.parquet",
+        existing_data_behavior='overwrite_or_ignore',
+        max_rows_per_group=CHUNK_ROWS,
+        file_options=ds.ParquetFileFormat().make_write_options(compression='zstd'),
+    )
+
+    newest = progress['newest']
+    if newest is not None:
+        horizon = newest - datetime.timedelta(seconds=LATE_SECONDS)
+        sync.pop('last_run_id', None)
+        sync['last_timestamp'] = newest.isoformat()
+        sync['recent_runs'] = {run_id: timestamp.isoformat() for run_id, timestamp in progress['recent'].items() if timestamp >= horizon}
+    sync['total'] = sync.get('total', 0) + progress['runs']
+    sync['synced_at'] = started.isoformat()
+    sync['pending'] = None
+    write_sync(directory, sync)
+
+    return {'runs': progress['runs'], 'total': sync['total'], 'seconds': (datetime.datetime.now() - started).total_seconds()}
@@ -0,0 +1,288 @@
+"""Compact columnar in-memory representation of the run history.
+
+A list of dicts costs several hundred bytes per run in object overhead alone.
+HistoryStore keeps one typed array per field instead: job ids, output and
+error hashes and arguments are interned and stored as small integers,
+timestamps as integer microseconds, flags in bytearrays and run ids as 16
+raw bytes. Pages filter and sort row numbers with rows() and latest() and only
+build dicts, with row(), for the runs they actually show.
+
+Row dicts have the same keys as the history entries written to history.json,
+with the timestamp as a datetime.
+"""
+import datetime
+import heapq
+import math
+import uuid
+from array import array
+
+from output_store import pack_entry
+
+EPOCH = datetime.datetime(1970, 1, 1)
+ONE_MICROSECOND = datetime.timedelta(microseconds=1)
+NO_RUN_ID = bytes(16)
+# Fields that have a column; anything else is kept per row in a side table
+COLUMNS = ('job_id', 'run_id', 'timestamp', 'success', 'output_hash', 'error_hash', 'arguments',
+           'duration', 'queue_wait', 'attempt', 'parent_run_id', 'cached')
+
+
+# Function to convert a naive datetime or ISO string into integer microseconds
+def to_micros(timestamp):
+    if isinstance(timestamp, str):
+        timestamp = datetime.datetime.fromisoformat(timestamp)
+    return (timestamp - EPOCH) // ONE_MICROSECOND
+
+
+# Function to convert integer microseconds back into a datetime
+def from_micros(micros):
+    return EPOCH + datetime.timedelta(microseconds=micros)
+
+
+class Interner:
+    """Maps repeated strings to small integers; 0 stands for None"""
+
+    def __init__(self):
+        self.values = [None]
+        self.index = {None: 0}
+
+    def add(self, value):
+        number = self.index.get(value)
+        if number is None:
+            number = len(self.values)
+            self.values.append(value)
+            self.index[value] = number
+        return number
+
+    def __getstate__(self):
+        # Only the values are pickled, as a copy, so a store can be pickled while another thread adds to it
+        return list(self.values)
+
+    def __setstate__(self, values):
+        self.values = values
+        self.index = {value: number for number, value in enumerate(values)}
+
+
+class HistoryStore:
+    """Run history held in typed arrays, one element per run"""
+
+    def __init__(self, entries=()):
+        self.job_ids = Interner()
+        self.texts = Interner()
+        self.argument_values = Interner()
+
+        self.job = array('I')
+        self.timestamp = array('q')
+        self.success = bytearray()
+        self.cached = bytearray()
+        self.output = array('I')
+        self.error = array('I')
+        self.arguments = array('I')
+        # NaN when not recorded
+        self.duration = array('d')
+        self.queue_wait = array('d')
+        self.attempt = array('H')
+        self.run_ids = bytearray()
+        # Sparse side tables keyed by row number
+        self.other_run_ids = {}
+        self.parent_run_ids = {}
+        self.extra = {}
+        # Rows are counted once all their columns are written, so readers in other threads never see half a row
+        self.count = 0
+        # Bumped whenever rows are removed, so copies of the store can tell their rows moved
+        self.generation = 0
+
+        for entry in entries:
+            self.append(entry)
+
+    def __len__(self):
+        return self.count
+
+    def __bool__(self):
+        return self.count > 0
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history row out of range")
+        return self.row(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.row(index)
+
+    def append(self, entry):
+        """Add a history entry dict; its output and error text is moved into blobs first"""
+        if 'output_hash' not in entry or 'error_hash' not in entry:
+            entry = pack_entry(dict(entry))
+        row = len(self)
+
+        self.job.append(self.job_ids.add(entry['job_id']))
+        self.timestamp.append(to_micros(entry['timestamp']))
+        self.success.append(1 if entry.get('success') else 0)
+        self.cached.append(1 if entry.get('cached') else 0)
+        self.output.append(self.texts.add(entry.get('output_hash')))
+        self.error.append(self.texts.add(entry.get('error_hash')))
+        self.arguments.append(self.argument_values.add(entry.get('arguments') or None))
+        duration = entry.get('duration')
+        self.duration.append(math.nan if duration is None else duration)
+        queue_wait = entry.get('queue_wait')
+        self.queue_wait.append(math.nan if queue_wait is None else queue_wait)
+        self.attempt.append(entry.get('attempt') or 1)
+
+        run_id = entry.get('run_id')
+        try:
+            self.run_ids += uuid.UUID(run_id).bytes if run_id else NO_RUN_ID
+        except ValueError:
+            self.run_ids += NO_RUN_ID
+            self.other_run_ids[row] = run_id
+        if entry.get('parent_run_id'):
+            self.parent_run_ids[row] = entry['parent_run_id']
+
+        extra = {key: value for key, value in entry.items() if key not in COLUMNS}
+        if extra:
+            self.extra[row] = extra
+        self.count += 1
+
+    def job_id(self, row):
+        return self.job_ids.values[self.job[row]]
+
+    def run_id(self, row):
+        raw = bytes(self.run_ids[row * 16:row * 16 + 16])
+        if raw == NO_RUN_ID:
+            return self.other_run_ids.get(row)
+        return str(uuid.UUID(bytes=raw))
+
+    def timestamp_of(self, row):
+        return from_micros(self.timestamp[row])
+
+    def output_hash(self, row):
+        return self.texts.values[self.output[row]]
+
+    def row(self, row):
+        """Build the history entry dict of one row"""
+        duration = self.duration[row]
+        queue_wait = self.queue_wait[row]
+        entry = {
+            'job_id': self.job_id(row),
+            'run_id': self.run_id(row),
+            'timestamp': self.timestamp_of(row),
+            'success': bool(self.success[row]),
+            'output_hash': self.texts.values[self.output[row]],
+            'error_hash': self.texts.values[self.error[row]],
+            'arguments': self.argument_values.values[self.arguments[row]] or '',
+            'duration': None if math.isnan(duration) else duration,
+            'queue_wait': None if math.isnan(queue_wait) else queue_wait,
+            'attempt': self.attempt[row],
+            'parent_run_id': self.parent_run_ids.get(row),
+            'cached': bool(self.cached[row]),
+        }
+        entry.update(self.extra.get(row, ()))
+        return entry
+
+    def records(self):
+        """Yield the entries in the on-disk format of history.json"""
+        for row in range(len(self)):
+            entry = self.row(row)
+            entry['timestamp'] = entry['timestamp'].isoformat()
+            yield entry
+
+    def rows(self, job_ids=None, start=None, end=None, newest_first=True):
+        """Row numbers of the runs of some jobs within [start, end), sorted by time"""
+        selected = range(len(self))
+        if job_ids is not None:
+            wanted = {self.job_ids.index[job_id] for job_id in job_ids if job_id in self.job_ids.index}
+            job = self.job
+            selected = [row for row in selected if job[row] in wanted]
+        if start is not None or end is not None:
+            low = to_micros(start) if start is not None else -math.inf
+            high = to_micros(end) if end is not None else math.inf
+            timestamp = self.timestamp
+            selected = [row for row in selected if low <= timestamp[row] < high]
+        # Runs are appended in time order, so this sort is close to linear
+        return sorted(selected, key=self.timestamp.__getitem__, reverse=newest_first)
+
+    def latest(self, count):
+        """Row numbers of the newest runs, newest first"""
+        return heapq.nlargest(count, range(len(self)), key=self.timestamp.__getitem__)
+
+    def output_changed(self, rows):
+        """Set of the given rows whose output differs from the previous run of the same job"""
+        changed = set()
+        previous = {}
+        job = self.job
+        output = self.output
+        for row in sorted(rows, key=self.timestamp.__getitem__):
+            last = previous.get(job[row])
+            if last is not None and last != output[row]:
+                changed.add(row)
+            previous[job[row]] = output[row]
+        return changed
+
+    def attempts(self, run_id):
+        """Row numbers of the run with run_id and of all its retries"""
+        if not run_id:
+            return []
+        rows = [row for row, parent in self.parent_run_ids.items() if parent == run_id]
+        try:
+            raw = uuid.UUID(run_id).bytes
+            position = self.run_ids.find(raw)
+            while position != -1 and position % 16:
+                position = self.run_ids.find(raw, position + 1)
+            if position != -1:
+                rows.append(position // 16)
+        except ValueError:
+            rows.extend(row for row, other in self.other_run_ids.items() if other == run_id)
+        return sorted(set(rows))
+
+    def new_entries(self, entries):
+        """Yield the entries with a run id that no row has, e.g. runs another process added to history.json"""
+        known = {bytes(self.run_ids[offset:offset + 16]) for offset in range(0, len(self) * 16, 16)}
+        known.update(self.other_run_ids.values())
+        for entry in entries:
+            run_id = entry.get('run_id')
+            if not run_id:
+                continue
+            try:
+                key = uuid.UUID(run_id).bytes
+            except ValueError:
+                key = run_id
+            if key not in known:
+                known.add(key)
+                yield entry
+
+    def referenced_hashes(self):
+        """Output and error blob hashes used by at least one run"""
+        used = set(self.output) | set(self.error)
+        return {self.texts.values[number] for number in used if number}
+
+    def frozen(self):
+        """A copy of the current rows that later appends and prunes leave alone, for writing out without a lock"""
+        count = len(self)
+        frozen = HistoryStore()
+        # Interners only ever grow, so the copy can share them
+        frozen.job_ids = self.job_ids
+        frozen.texts = self.texts
+        frozen.argument_values = self.argument_values
+        for name in ('job', 'timestamp', 'success', 'cached', 'output', 'error', 'arguments', 'duration', 'queue_wait', 'attempt'):
+            setattr(frozen, name, getattr(self, name)[:count])
+        frozen.run_ids = self.run_ids[:count * 16]
+        frozen.other_run_ids = {row: value for row, value in self.other_run_ids.items() if row < count}
+        frozen.parent_run_ids = {row: value for row, value in self.parent_run_ids.items() if row < count}
+        frozen.extra = {row: value for row, value in self.extra.items() if row < count}
+        frozen.count = count
+        frozen.generation = self.generation
+        return frozen
+
+    def prune(self, before):
+        """Drop the runs older than the given datetime, returns the number dropped"""
+        cutoff = to_micros(before)
+        kept = [row for row in range(len(self)) if self.timestamp[row] >= cutoff]
+        removed = len(self) - len(kept)
+        if removed:
+            pruned = HistoryStore()
+            for row in kept:
+                pruned.append(self.row(row))
+            pruned.generation = self.generation + 1
+            self.__dict__.update(pruned.__dict__)
+        return removed
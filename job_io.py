@@ -0,0 +1,210 @@
+"""Bulk import and export of jobs as JSONL or CSV.
+
+Each record carries everything needed to recreate a job on another instance:
+name, script type, script content, interval, enabled flag and default
+arguments. Template style keys ("script-type", "script-content", ...) are
+accepted on import as well.
+"""
+import csv
+import io
+import json
+import shlex
+
+from run_queue import PRIORITIES, DEFAULT_PRIORITY
+
+SCRIPT_TYPES = ["py", "sh", "php", "js", "rb", "pl", "ps1", "bat", "cmd", "r", "lua", "go", "sql"]
+INTERVAL_UNITS = ["minutes", "hours", "days"]
+# Structured job settings; nested objects in JSONL and JSON encoded strings in CSV
+OPTION_FIELDS = ["retry_policy", "result_cache", "sql_target", "overlap_policy", "file_trigger", "notifications"]
+EXPORT_FIELDS = ["name", "script_type", "interval_value", "interval_unit", "enabled", "script_arguments", "priority", "worker_label"] + OPTION_FIELDS + ["script_content"]
+FORMATS = ["jsonl", "csv"]
+
+# Alternative spellings accepted on import, mapped to the export field names
+FIELD_ALIASES = {
+    "script-type": "script_type",
+    "script-content": "script_content",
+    "interval": "interval_value",
+    "interval-unit": "interval_unit",
+    "default-arguments": "script_arguments",
+    "script-arguments": "script_arguments",
+    "worker-label": "worker_label",
+}
+
+
+# Function to validate the default arguments of a job, quoted the way a shell quotes them
+def normalize_arguments(arguments):
+    arguments = str(arguments or "")
+    try:
+        shlex.split(arguments)
+    except ValueError as e:
+        raise ValueError(f"Invalid arguments ({e}), quote an apostrophe as \"O'Brien\" or O\\'Brien")
+    return arguments
+
+
+# Function to split arguments into a list; saved before they were validated, unbalanced quotes split on spaces
+def split_arguments(arguments):
+    try:
+        return shlex.split(arguments or "")
+    except ValueError:
+        return (arguments or "").split()
+
+
+# Function to guess the file format from a file name
+def detect_format(filename, default="jsonl"):
+    lowered = str(filename).lower()
+    if lowered.endswith(".csv"):
+        return "csv"
+    if lowered.endswith(".jsonl") or lowered.endswith(".ndjson") or lowered.endswith(".json"):
+        return "jsonl"
+    return default
+
+
+# Function to parse a boolean from CSV or JSON input
+def _parse_bool(value, default=True):
+    if value is None or value == "":
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "y", "on")
+
+
+# Function to turn one raw import record into a validated job spec
+def normalize_record(record):
+    """Return (spec, error) for one imported record"""
+    # Imported here, the command line loads this module for its option lists and rarely imports jobs
+    from retries import normalize_retry_policy
+    from result_cache import normalize_cache_policy
+    from work_queue import normalize_worker_label
+    from sql_runner import normalize_sql_target
+    from overlap import normalize_overlap_policy
+    from file_triggers import normalize_file_trigger
+    from notifications import normalize_notifications
+
+    record = {FIELD_ALIASES.get(key, key): value for key, value in record.items()}
+
+    name = str(record.get("name") or "").strip()
+    script_content = record.get("script_content") or ""
+    script_type = str(record.get("script_type") or "py").strip()
+    interval_unit = str(record.get("interval_unit") or "minutes").strip()
+    priority = str(record.get("priority") or DEFAULT_PRIORITY).strip().lower()
+
+    if not name:
+        return None, "missing name"
+    if not script_content:
+        return None, f"job '{name}' has no script content"
+    if script_type not in SCRIPT_TYPES:
+        return None, f"job '{name}' has unsupported script type '{script_type}'"
+    if interval_unit not in INTERVAL_UNITS:
+        return None, f"job '{name}' has unsupported interval unit '{interval_unit}'"
+    if priority not in PRIORITIES:
+        return None, f"job '{name}' has unknown priority '{priority}'"
+
+    try:
+        interval_value = int(record.get("interval_value") or 1)
+    except (TypeError, ValueError):
+        return None, f"job '{name}' has an invalid interval value"
+    if interval_value < 1:
+        return None, f"job '{name}' needs an interval of at least 1"
+
+    try:
+        worker_label = normalize_worker_label(record.get("worker_label"))
+        script_arguments = normalize_arguments(record.get("script_arguments"))
+    except ValueError as e:
+        return None, f"job '{name}': {e}"
+
+    options = {}
+    for field in OPTION_FIELDS:
+        value = record.get(field)
+        try:
+            if isinstance(value, str):
+                value = json.loads(value) if value.strip() else None
+            if field == "retry_policy":
+                value = normalize_retry_policy(value)
+            elif field == "result_cache":
+                value = normalize_cache_policy(value)
+            elif field == "sql_target":
+                value = normalize_sql_target(value)
+            elif field == "overlap_policy":
+                value = normalize_overlap_policy(value)
+            elif field == "file_trigger":
+                value = normalize_file_trigger(value)
+            elif field == "notifications":
+                value = normalize_notifications(value)
+        except (TypeError, ValueError, AttributeError):
+            return None, f"job '{name}' has an invalid {field}"
+        options[field] = value
+
+    return {
+        "name": name,
+        "script_type": script_type,
+        "script_content": script_content,
+        "interval_value": interval_value,
+        "interval_unit": interval_unit,
+        "enabled": _parse_bool(record.get("enabled")),
+        "script_arguments": script_arguments,
+        "priority": priority,
+        "worker_label": worker_label,
+        **options,
+    }, None
+
+
+# Function to read raw records from JSONL or CSV text
+def read_records(text, fmt):
+    if fmt == "csv":
+        return list(csv.DictReader(io.StringIO(text)))
+
+    records = []
+    for line_number, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"line {line_number}: {e}")
+    return records
+
+
+# Function to parse an import file into job specs and a list of errors
+def parse_jobs(text, fmt):
+    specs = []
+    errors = []
+    for index, record in enumerate(read_records(text, fmt), start=1):
+        spec, error = normalize_record(record)
+        if error:
+            errors.append(f"record {index}: {error}")
+        else:
+            specs.append(spec)
+    return specs, errors
+
+
+# Function to build the export record of a job
+def export_record(job, script_content):
+    return {
+        "name": job['name'],
+        "script_type": job['script_type'],
+        "interval_value": job['interval_value'],
+        "interval_unit": job['interval_unit'],
+        "enabled": job['enabled'],
+        "script_arguments": job.get('script_arguments', ''),
+        "priority": job.get('priority', DEFAULT_PRIORITY),
+        "worker_label": job.get('worker_label'),
+        **{field: job.get(field) for field in OPTION_FIELDS},
+        "script_content": script_content,
+    }
+
+
+# Function to serialize export records as JSONL or CSV text
+def dump_records(records, fmt):
+    if fmt == "csv":
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        for record in records:
+            writer.writerow({
+                key: json.dumps(value) if key in OPTION_FIELDS and value is not None else value
+                for key, value in record.items()
+            })
+        return output.getvalue()
+
+    return "".join(json.dumps(record) + "\n" for record in records)
@@ -0,0 +1,108 @@
+"""Per-job run statistics kept up to date as runs are recorded.
+
+Every job carries a stats record that record_entry() updates in constant time
+for each finished run, so pages can show run counts, success rates and the
+last result without going through the history:
+
+    {"runs": 120, "failures": 3, "consecutive_failures": 0, "last_status": "success",
+     "last_success": datetime, "average_duration": 1.7}
+
+average_duration is a moving average that weighs recent runs more
+(DURATION_WEIGHT per run); cached runs do not count towards it. Firings that
+did not run because of an overlap policy, and runs cancelled by one, are not
+counted at all. The record is saved in jobs.json with the job; jobs saved
+before it existed get theirs computed once from the history.
+"""
+import datetime
+import math
+
+# Weight of the newest run in the moving average of the duration
+DURATION_WEIGHT = 0.2
+
+
+# Function to get the stats record of a job that has not run yet
+def empty_stats():
+    return {
+        'runs': 0,
+        'failures': 0,
+        'consecutive_failures': 0,
+        'last_status': None,
+        'last_success': None,
+        'average_duration': None,
+    }
+
+
+# Function to add a recorded run to a stats record, returns the updated record
+def update_stats(stats, entry):
+    if entry.get('overlap'):
+        return stats
+    if stats is None:
+        stats = empty_stats()
+
+    stats['runs'] += 1
+    if entry.get('success'):
+        stats['consecutive_failures'] = 0
+        stats['last_status'] = 'success'
+        timestamp = entry['timestamp']
+        stats['last_success'] = datetime.datetime.fromisoformat(timestamp) if isinstance(timestamp, str) else timestamp
+    else:
+        stats['failures'] += 1
+        stats['consecutive_failures'] += 1
+        stats['last_status'] = 'failed'
+
+    duration = entry.get('duration')
+    if duration is not None and not math.isnan(duration) and not entry.get('cached'):
+        average = stats['average_duration']
+        stats['average_duration'] = duration if average is None else average + DURATION_WEIGHT * (duration - average)
+    return stats
+
+
+# Function to get the share of successful runs, None before the first run
+def success_rate(stats):
+    if not stats or not stats['runs']:
+        return None
+    return (stats['runs'] - stats['failures']) / stats['runs']
+
+
+# Function to convert a stats record for jobs.json
+def dump_stats(stats):
+    if stats is None:
+        return None
+    record = dict(stats)
+    if record['last_success'] is not None:
+        record['last_success'] = record['last_success'].isoformat()
+    return record
+
+
+# Function to read a stats record from jobs.json
+def load_stats(record):
+    if record is None:
+        return None
+    stats = empty_stats()
+    stats.update(record)
+    if stats['last_success'] is not None:
+        stats['last_success'] = datetime.datetime.fromisoformat(stats['last_success'])
+    return stats
+
+
+# Function to compute the stats of jobs from a HistoryStore, for jobs saved without them
+def stats_from_history(history, job_ids):
+    wanted = {history.job_ids.index[job_id]: job_id for job_id in job_ids if job_id in history.job_ids.index}
+    stats = {job_id: empty_stats() for job_id in job_ids}
+    if not wanted:
+        return stats
+
+    # Rows are appended in time order, so replaying them in order gives the same result as live updates
+    for row in range(len(history)):
+        job_id = wanted.get(history.job[row])
+        if job_id is None:
+            continue
+        extra = history.extra.get(row)
+        update_stats(stats[job_id], {
+            'success': history.success[row],
+            'timestamp': history.timestamp_of(row),
+            'duration': history.duration[row],
+            'cached': history.cached[row],
+            'overlap': extra.get('overlap') if extra else None,
+        })
+    return stats
@@ -0,0 +1,321 @@
+"""Notifications about finished runs, delivered in the background.
+
+A job's notifications option lists where its runs are reported:
+
+    [{"type": "webhook", "target": "https://hooks.example.com/taskflow", "on": ["failure", "change"]},
+     {"type": "command", "target": "/usr/local/bin/page-oncall --team ops", "on": ["failure"]},
+     {"type": "file", "target": "/var/log/taskflow-runs.jsonl", "on": ["success", "failure"]}]
+
+"on" picks the runs that are reported: successful ones, failed ones, and ones
+whose result differs from the previous run of the job ("change").
+
+Recording a run only puts a message on the Notifier's queue, so a slow or
+unreachable endpoint never delays a run or the scheduler. A delivery thread
+collects messages for up to BATCH_SECONDS and sends all messages for the same
+sink in one delivery: one POST with the JSON body {"events": [...]} for
+webhooks, the same JSON on the standard input of commands, and one JSON line
+per event appended to files. Deliveries run on a few threads, so one slow
+sink does not hold up the others. Failed deliveries are retried with
+exponential backoff; after MAX_ATTEMPTS they are appended to the dead letter
+file. Notifier.stats() reports the backlog, the delivery counts and latency.
+"""
+import heapq
+import itertools
+import json
+import queue
+import shlex
+import subprocess
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+SINK_TYPES = ["webhook", "command", "file"]
+NOTIFY_EVENTS = ["success", "failure", "change"]
+DEFAULT_EVENTS = ["failure"]
+# Seconds messages are collected before a delivery, and the most sent in one
+BATCH_SECONDS = 0.5
+MAX_BATCH = 100
+MAX_ATTEMPTS = 5
+# Delay before the first retry, doubled for every further attempt
+RETRY_SECONDS = 2.0
+DELIVERY_TIMEOUT_SECONDS = 10
+DELIVERY_THREADS = 4
+# Messages waiting beyond this go straight to the dead letter file
+MAX_BACKLOG = 10000
+DEAD_LETTER_FILE = Path("data") / "notifications.dead.jsonl"
+
+_notifier = None
+_notifier_lock = threading.Lock()
+
+
+# Function to validate the notifications option of a job, returns None for jobs without notifications
+def normalize_notifications(sinks):
+    if not sinks:
+        return None
+    if isinstance(sinks, dict):
+        sinks = [sinks]
+
+    normalized = []
+    for sink in sinks:
+        sink_type = str(sink.get('type') or '').strip().lower()
+        if sink_type not in SINK_TYPES:
+            raise ValueError(f"Unknown notification type '{sink_type}'")
+        target = str(sink.get('target') or '').strip()
+        if not target:
+            raise ValueError(f"The {sink_type} notification has no target")
+        if sink_type == 'webhook' and not target.startswith(('http://', 'https://')):
+            raise ValueError(f"Webhook URLs must start with http:// or https://, got '{target}'")
+
+        events = sink.get('on') or DEFAULT_EVENTS
+        if isinstance(events, str):
+            events = [event.strip() for event in events.split(",") if event.strip()]
+        unknown = [event for event in events if event not in NOTIFY_EVENTS]
+        if unknown:
+            raise ValueError(f"Unknown notification event '{unknown[0]}'")
+
+        normalized.append({'type': sink_type, 'target': target, 'on': [event for event in NOTIFY_EVENTS if event in events]})
+    return normalized or None
+
+
+# Function to parse notification lines of the job forms: "<type> <target> [<events>]"
+def parse_notification_lines(text):
+    sinks = []
+    for line in (text or "").splitlines():
+        parts = line.split()
+        if not parts:
+            continue
+        sink = {'type': parts[0]}
+        # The last word is the event list when it only names events, the rest is the target
+        if len(parts) > 2 and all(event in NOTIFY_EVENTS for event in parts[-1].split(",")):
+            sink['on'] = parts[-1]
+            parts = parts[:-1]
+        sink['target'] = " ".join(parts[1:])
+        sinks.append(sink)
+    return normalize_notifications(sinks)
+
+
+# Function to show notifications as lines for the job forms
+def format_notification_lines(sinks):
+    return "\n".join(f"{sink['type']} {sink['target']} {','.join(sink['on'])}" for sink in sinks or [])
+
+
+# Function to get the events of a recorded run, given the status of the job's previous run
+def run_events(entry, previous_status):
+    status = 'success' if entry.get('success') else 'failed'
+    events = ['success' if entry.get('success') else 'failure']
+    if previous_status is not None and previous_status != status:
+        events.append('change')
+    return events
+
+
+# Function to build the message body of a run
+def run_event(job, entry, events):
+    timestamp = entry['timestamp']
+    return {
+        'events': events,
+        'job_id': job['id'],
+        'job_name': job['name'],
+        'run_id': entry.get('run_id'),
+        'timestamp': timestamp if isinstance(timestamp, str) else timestamp.isoformat(),
+        'status': 'success' if entry.get('success') else 'failed',
+        'duration': entry.get('duration'),
+        'arguments': entry.get('arguments') or "",
+        'attempt': entry.get('attempt') or 1,
+    }
+
+
+# Function to POST events to a webhook; responses other than 2xx raise
+def deliver_webhook(url, events):
+    # Imported here, it is slow to import and only needed once a webhook fires
+    import urllib.request
+    
+    request = urllib.request.Request(
+        url,
+        data=json.dumps({'events': events}).encode(),
+        headers={'Content-Type': 'application/json', 'User-Agent': 'TaskFlow'},
+        method='POST'
+    )
+    with urllib.request.urlopen(request, timeout=DELIVERY_TIMEOUT_SECONDS) as response:
+        response.read()
+
+
+# Function to pass events to a command on its standard input; a non-zero exit code raises
+def deliver_command(command, events):
+    subprocess.run(shlex.split(command), input=json.dumps({'events': events}), text=True,
+                   capture_output=True, timeout=DELIVERY_TIMEOUT_SECONDS, check=True)
+
+
+# Function to append events to a file as JSON lines
+def deliver_file(path, events):
+    with open(path, 'a') as f:
+        for event in events:
+            f.write(json.dumps(event) + "\n")
+
+
+DELIVERERS = {
+    'webhook': deliver_webhook,
+    'command': deliver_command,
+    'file': deliver_file,
+}
+
+
+class Notifier:
+    """Queue of notifications with batched, retried delivery on background threads"""
+
+    def __init__(self, dead_letter_file=DEAD_LETTER_FILE, batch_seconds=BATCH_SECONDS, retry_seconds=RETRY_SECONDS):
+        self.dead_letter_file = Path(dead_letter_file)
+        self.batch_seconds = batch_seconds
+        self.retry_seconds = retry_seconds
+        self._queue = queue.Queue(MAX_BACKLOG)
+        self._lock = threading.Lock()
+        # Heap of (due, sequence, sink, messages, attempt) waiting to be delivered again
+        self._retries = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        # None items in the queue that only wake the delivery thread, not part of the backlog
+        self._wakeups = 0
+        self._counts = {'delivered': 0, 'retried': 0, 'dead': 0}
+        # Seconds from publishing to delivery of the latest delivered events
+        self._latencies = deque(maxlen=500)
+        self._pool = ThreadPoolExecutor(DELIVERY_THREADS, thread_name_prefix="notify")
+        self._thread = None
+
+    def publish(self, sinks, event):
+        """Queue an event for every sink that wants one of its events; never blocks"""
+        for sink in sinks:
+            events = [name for name in event['events'] if name in sink['on']]
+            if not events:
+                continue
+            message = {'event': dict(event, events=events), 'published': time.monotonic()}
+            try:
+                self._queue.put_nowait((sink, message))
+            except queue.Full:
+                self._dead_letter(sink, [message], 0, "Notification backlog is full")
+                continue
+            self._start()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="notifier", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                next_retry = self._retries[0][0] if self._retries else None
+            timeout = None if next_retry is None else max(next_retry - time.monotonic(), 0)
+
+            # Wait for the first message, then collect more for the batch window
+            batches = {}
+            try:
+                item = self._queue.get(timeout=timeout)
+                deadline = time.monotonic() + self.batch_seconds
+                count = 0
+                while True:
+                    if item is None:
+                        with self._lock:
+                            self._wakeups -= 1
+                    else:
+                        sink, message = item
+                        batches.setdefault((sink['type'], sink['target']), (sink, []))[1].append(message)
+                        count += 1
+                    remaining = deadline - time.monotonic()
+                    if count >= MAX_BATCH or remaining <= 0:
+                        break
+                    item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                pass
+
+            for sink, messages in batches.values():
+                self._submit(sink, messages, 1)
+
+            # Deliveries that failed before and are due again
+            now = time.monotonic()
+            while True:
+                with self._lock:
+                    if not self._retries or self._retries[0][0] > now:
+                        break
+                    due, sequence, sink, messages, attempt = heapq.heappop(self._retries)
+                self._submit(sink, messages, attempt)
+
+    def _submit(self, sink, messages, attempt):
+        with self._lock:
+            self._in_flight += len(messages)
+        self._pool.submit(self._deliver, sink, messages, attempt)
+
+    def _deliver(self, sink, messages, attempt):
+        try:
+            DELIVERERS[sink['type']](sink['target'], [message['event'] for message in messages])
+        except Exception as e:
+            with self._lock:
+                self._in_flight -= len(messages)
+                if attempt < MAX_ATTEMPTS:
+                    due = time.monotonic() + self.retry_seconds * 2 ** (attempt - 1)
+                    heapq.heappush(self._retries, (due, next(self._sequence), sink, messages, attempt + 1))
+                    self._counts['retried'] += len(messages)
+                    retry = True
+                else:
+                    retry = False
+            if retry:
+                self._wake()
+            else:
+                self._dead_letter(sink, messages, attempt, str(e) or type(e).__name__)
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            self._in_flight -= len(messages)
+            self._counts['delivered'] += len(messages)
+            self._latencies.extend(now - message['published'] for message in messages)
+
+    def _wake(self):
+        """Wake the delivery thread so it waits for the new retry; never blocks"""
+        with self._lock:
+            self._wakeups += 1
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            # The thread has plenty of messages to wake it
+            with self._lock:
+                self._wakeups -= 1
+
+    def _dead_letter(self, sink, messages, attempts, error):
+        record = {
+            'sink': sink,
+            'events': [message['event'] for message in messages],
+            'attempts': attempts,
+            'error': error,
+            'failed_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        with self._lock:
+            self._counts['dead'] += len(messages)
+            try:
+                self.dead_letter_file.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.dead_letter_file, 'a') as f:
+                    f.write(json.dumps(record) + "\n")
+            except OSError:
+                pass
+
+    def stats(self):
+        """Backlog, delivery counts and latency in seconds of the latest deliveries"""
+        with self._lock:
+            latencies = list(self._latencies)
+            return {
+                'backlog': max(self._queue.qsize() - self._wakeups, 0) + self._in_flight + sum(len(retry[3]) for retry in self._retries),
+                'retrying': sum(len(retry[3]) for retry in self._retries),
+                **self._counts,
+                'latency_average': sum(latencies) / len(latencies) if latencies else None,
+                'latency_max': max(latencies) if latencies else None,
+            }
+
+
+# Function to get the process-wide notifier
+def get_notifier():
+    global _notifier
+    with _notifier_lock:
+        if _notifier is None:
+            _notifier = Notifier()
+    return _notifier
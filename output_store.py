@@ -0,0 +1,280 @@
+"""Deduplicated, compressed storage of the output and error text of runs.
+
+Run output is stored once per distinct text as a content-addressed blob in
+data/output_blobs.jsonl, and history entries only keep the blob hashes in
+output_hash and error_hash. A job that prints the same thing thousands of
+times therefore costs one blob, and comparing the hashes of two runs tells
+whether their output changed without decompressing anything.
+
+Blobs are zlib compressed with a preset dictionary built from the first
+output of their job, since script output tends to repeat itself from run to
+run (ping statistics, log lines). Dictionaries are appended to
+data/output_dicts.jsonl and never change once written; their id is derived
+from their content, so blobs stay readable even if several processes create
+a dictionary for the same job.
+
+Older history entries keep their text in plain output and error fields or as
+per-entry compressed output_z and error_z fields; pack_entry() moves both into
+blobs. Blobs that no history entry refers to any more are removed by
+collect_blobs() after old history is pruned.
+
+Several processes (the web interface, the command line, workers) add blobs to
+the same file. Appends and the rewrite of collect_blobs() hold the file's
+lock, and each process reads only the lines added since it last looked. Blobs
+added less than COLLECT_GRACE_SECONDS ago are never collected, as the run
+using them may not be saved to history.json yet by the process that ran it.
+"""
+import base64
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+
+DICTS_FILE = Path("data") / "output_dicts.jsonl"
+BLOBS_FILE = Path("data") / "output_blobs.jsonl"
+TEXT_FIELDS = ("output", "error")
+COMPRESSION_LEVEL = 6
+# zlib only looks back 32 KB, a longer dictionary would be wasted
+MAX_DICT_BYTES = 32 * 1024
+COLLECT_GRACE_SECONDS = 3600
+
+_lock = threading.Lock()
+_dicts = None
+_job_dicts = None
+# Blob hash -> (dictionary id, compressed bytes)
+_blobs = None
+# Blob hash -> time it was added, for blobs written with one
+_blob_added = {}
+# Inode of the blob file and the offset up to which it was read into _blobs
+_blobs_read = None
+
+
+# Function to load the dictionaries from disk
+def _load_dicts():
+    global _dicts, _job_dicts
+    _dicts = {}
+    _job_dicts = {}
+    if not DICTS_FILE.exists():
+        return
+    with open(DICTS_FILE, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line cut off by a crash, the entries using it were never saved
+                continue
+            _dicts[record['key']] = base64.b64decode(record['dict'])
+            _job_dicts.setdefault(record['job_id'], record['key'])
+
+
+# Function to add a dictionary to the file; appending keeps creating dictionaries cheap
+def _append_dict(job_id, key, zdict):
+    DICTS_FILE.parent.mkdir(exist_ok=True)
+    with open(DICTS_FILE, 'a') as f:
+        f.write(json.dumps({'job_id': job_id, 'key': key, 'dict': base64.b64encode(zdict).decode('ascii')}) + "\n")
+
+
+# Function to get the id and content of a job's dictionary, creating it from sample text
+def job_dictionary(job_id, sample=None):
+    with _lock:
+        if _dicts is None:
+            _load_dicts()
+
+        key = _job_dicts.get(job_id)
+        if key is None and sample:
+            # The end of the dictionary is what zlib matches most cheaply, so keep the tail
+            zdict = sample.encode('utf-8')[-MAX_DICT_BYTES:]
+            key = hashlib.sha1(zdict).hexdigest()[:16]
+            _dicts[key] = zdict
+            _job_dicts[job_id] = key
+            _append_dict(job_id, key, zdict)
+
+        return key, _dicts.get(key)
+
+
+# Function to look up a dictionary by id, re-reading the file for ids written by other processes
+def get_dictionary(key):
+    with _lock:
+        if _dicts is None or key not in _dicts:
+            _load_dicts()
+        return _dicts.get(key)
+
+
+# Function to compress text with an optional preset dictionary
+def compress_text(text, zdict=None):
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=zdict) if zdict else zlib.compressobj(COMPRESSION_LEVEL)
+    return compressor.compress(text.encode('utf-8')) + compressor.flush()
+
+
+# Function to decompress text written by compress_text
+def decompress_text(packed, zdict=None):
+    decompressor = zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()
+    return (decompressor.decompress(packed) + decompressor.flush()).decode('utf-8')
+
+
+# Function to read the blobs added to the file since the last call, or all of them after the file was replaced
+def _load_blobs():
+    global _blobs, _blobs_read
+    try:
+        f = open(BLOBS_FILE, 'rb')
+    except FileNotFoundError:
+        if _blobs is None:
+            _blobs = {}
+        return
+
+    with f:
+        inode = os.fstat(f.fileno()).st_ino
+        if _blobs is None or _blobs_read is None or _blobs_read[0] != inode:
+            # First read, or collect_blobs() in some process rewrote the file
+            _blobs = {}
+            _blob_added.clear()
+            offset = 0
+        else:
+            offset = _blobs_read[1]
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                # Still being appended; read again next time
+                break
+            offset += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            digest = sys.intern(record['hash'])
+            _blobs[digest] = (record.get('zdict'), base64.b64decode(record['data']))
+            if record.get('added'):
+                _blob_added[digest] = record['added']
+    _blobs_read = (inode, offset)
+
+
+# Function to format one blob as a line of the blob file
+def _blob_line(digest, key, packed, added=None):
+    record = {'hash': digest, 'zdict': key, 'data': base64.b64encode(packed).decode('ascii')}
+    if added:
+        record['added'] = added
+    return json.dumps(record) + "\n"
+
+
+# Function to get the content hash of a text
+def text_hash(text):
+    # Interned so the many entries with the same output share one string
+    return sys.intern(hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest())
+
+
+# Function to store a text as a blob unless it is stored already, returns its hash
+def put_blob(text, job_id=None):
+    # Imported here, storage imports this module through history_store
+    from storage import file_lock
+
+    digest = text_hash(text)
+    with _lock:
+        # Only reads what was added since the last look, or everything after collect_blobs() rewrote the file
+        _load_blobs()
+        if digest in _blobs:
+            return digest
+
+    key, zdict = job_dictionary(job_id, text) if job_id else (None, None)
+    packed = compress_text(text, zdict)
+
+    # The file lock keeps a collect_blobs() in another process from replacing the file under this append
+    with _lock, file_lock(BLOBS_FILE):
+        _load_blobs()
+        if digest not in _blobs:
+            _blobs[digest] = (key, packed)
+            _blob_added[digest] = added = round(time.time())
+            with open(BLOBS_FILE, 'a') as f:
+                f.write(_blob_line(digest, key, packed, added))
+                f.flush()
+                # The history entry referring to the blob is saved after this returns
+                os.fsync(f.fileno())
+    return digest
+
+
+# Function to get the text of a blob, reading the blobs other processes added since the last look
+def get_blob(digest):
+    with _lock:
+        if _blobs is None or digest not in _blobs:
+            _load_blobs()
+        key, packed = _blobs[digest]
+    return decompress_text(packed, get_dictionary(key) if key else None)
+
+
+# Function to remove the blobs that are not in the given set of hashes, returns the number removed
+def collect_blobs(live):
+    global _blobs_read
+    from storage import file_lock, write_atomic
+
+    with _lock, file_lock(BLOBS_FILE):
+        # Include what other processes appended, so the rewrite below keeps it
+        _load_blobs()
+        recent = time.time() - COLLECT_GRACE_SECONDS
+        dead = [digest for digest in _blobs if digest not in live and _blob_added.get(digest, 0) < recent]
+        if not dead:
+            return 0
+        for digest in dead:
+            del _blobs[digest]
+            _blob_added.pop(digest, None)
+
+        def write(f):
+            for digest, (key, packed) in _blobs.items():
+                f.write(_blob_line(digest, key, packed, _blob_added.get(digest)))
+        write_atomic(BLOBS_FILE, write)
+        # The new file holds exactly _blobs, so the next read starts at its end
+        stat = os.stat(BLOBS_FILE)
+        _blobs_read = (stat.st_ino, stat.st_size)
+    return len(dead)
+
+
+# Function to get the number and compressed size of the stored blobs
+def blob_stats():
+    with _lock:
+        if _blobs is None:
+            _load_blobs()
+        return {'blobs': len(_blobs), 'bytes': sum(len(packed) for key, packed in _blobs.values())}
+
+
+# Function to move the output and error text of a history entry into blobs, in place
+def pack_entry(entry):
+    for field in TEXT_FIELDS:
+        if field + '_hash' in entry:
+            continue
+        text = entry_text(entry, field)
+        entry.pop(field, None)
+        entry.pop(field + '_z', None)
+        entry[field + '_hash'] = put_blob(text, entry.get('job_id')) if text else None
+    entry.pop('zdict', None)
+    return entry
+
+
+# Function to get one text field of a history entry, decompressing it if needed
+def entry_text(entry, field):
+    try:
+        if field + '_hash' in entry:
+            digest = entry[field + '_hash']
+            return get_blob(digest) if digest else ''
+
+        # Entries written before output was deduplicated
+        packed = entry.get(field + '_z')
+        if packed is None:
+            return entry.get(field) or ''
+        key = entry.get('zdict')
+        return decompress_text(base64.b64decode(packed), get_dictionary(key) if key else None)
+    except KeyError:
+        return f"[{field} is missing from {BLOBS_FILE}]"
+    except (zlib.error, ValueError):
+        return f"[{field} cannot be decompressed, its dictionary is missing from {DICTS_FILE}]"
+
+
+# Function to get the output of a history entry
+def entry_output(entry):
+    return entry_text(entry, 'output')
+
+
+# Function to get the error text of a history entry
+def entry_error(entry):
+    return entry_text(entry, 'error')
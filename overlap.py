@@ -0,0 +1,182 @@
+"""Overlap policies for scheduled runs that fire while earlier runs still go.
+
+A job's overlap_policy decides what happens when it is due while runs of it
+are still queued or running:
+
+    {"mode": "skip"}                        the firing is skipped
+    {"mode": "queue"}                       one firing waits and starts when the job is idle;
+                                            further firings are coalesced into it
+    {"mode": "parallel", "max_parallel": 3} up to 3 runs at once, further firings are skipped
+    {"mode": "cancel"}                      the runs still going are cancelled first
+
+Jobs without a policy start every firing, as before. Skipped, coalesced and
+cancelled firings are recorded in the history with an overlap field and
+counted per job in ActiveRuns.
+"""
+import datetime
+import os
+import signal
+import threading
+from collections import Counter
+
+OVERLAP_MODES = ["allow", "skip", "queue", "parallel", "cancel"]
+# How the modes are offered in the job forms
+OVERLAP_LABELS = {
+    "allow": "Start another run",
+    "skip": "Skip the new run",
+    "queue": "Queue one run for later",
+    "parallel": "Run in parallel up to a limit",
+    "cancel": "Cancel the running one",
+}
+# Outcomes of a firing that did not simply start a run
+OVERLAP_OUTCOMES = ["skipped", "coalesced", "cancelled"]
+CANCELLED_MESSAGE = "Cancelled because a newer run of the job started"
+
+_active_runs = None
+_active_runs_lock = threading.Lock()
+
+
+# Function to validate an overlap policy, returns None when every firing starts a run
+def normalize_overlap_policy(policy):
+    if not policy:
+        return None
+    if isinstance(policy, str):
+        policy = {'mode': policy}
+
+    mode = str(policy.get('mode') or 'allow').strip().lower()
+    if mode not in OVERLAP_MODES:
+        raise ValueError(f"Unknown overlap mode '{mode}'")
+    if mode == 'allow':
+        return None
+
+    normalized = {'mode': mode}
+    if mode == 'parallel':
+        normalized['max_parallel'] = max(int(policy.get('max_parallel', 1) or 1), 1)
+    return normalized
+
+
+# Function to decide what a due firing does: 'start', 'cancel', 'skip', 'queue' or 'coalesce'
+def overlap_action(policy, active, queued=False):
+    """active is the number of runs of the job still going, queued whether a firing already waits"""
+    if not policy or not active:
+        return 'start'
+    mode = policy['mode']
+    if mode == 'cancel':
+        return 'cancel'
+    if mode == 'queue':
+        return 'coalesce' if queued else 'queue'
+    if mode == 'parallel' and active < policy['max_parallel']:
+        return 'start'
+    return 'skip'
+
+
+class RunHandle:
+    """Lets a queued or running script be cancelled.
+
+    On POSIX systems scripts with a handle run in their own process group, so
+    cancelling also stops the processes the script started, such as a sleep in
+    a shell script, which would otherwise keep the run's output open.
+    """
+
+    def __init__(self):
+        self.process = None
+        self.cancelled = False
+        self._lock = threading.Lock()
+
+    def attach(self, process):
+        """Called once the script's process is started"""
+        with self._lock:
+            self.process = process
+            if self.cancelled:
+                self._terminate()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            if self.process is not None and self.process.poll() is None:
+                self._terminate()
+
+    def _terminate(self):
+        if os.name == 'posix':
+            try:
+                os.killpg(self.process.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        else:
+            self.process.terminate()
+
+
+class ActiveRuns:
+    """Runs of each job that are queued or running, and counts of overlapping firings"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs = {}
+        # Future -> job id, job name and start time, in the order the runs were started
+        self._started = {}
+        self._outcomes = {}
+
+    def add(self, job_id, future, handle=None, name=None):
+        """Track a run until its future is done; handle is None for runs that cannot be cancelled"""
+        with self._lock:
+            self._runs.setdefault(job_id, {})[future] = handle
+            self._started[future] = (job_id, name, datetime.datetime.now())
+        future.add_done_callback(lambda future: self._remove(job_id, future))
+
+    def _remove(self, job_id, future):
+        with self._lock:
+            self._started.pop(future, None)
+            runs = self._runs.get(job_id)
+            if runs is not None:
+                runs.pop(future, None)
+                if not runs:
+                    del self._runs[job_id]
+
+    def count(self, job_id):
+        with self._lock:
+            return len(self._runs.get(job_id, ()))
+
+    def cancel(self, job_id):
+        """Cancel the runs of a job that can be cancelled, returns how many were"""
+        with self._lock:
+            handles = [handle for handle in self._runs.get(job_id, {}).values() if handle is not None and not handle.cancelled]
+        for handle in handles:
+            handle.cancel()
+        return len(handles)
+
+    def running(self, count):
+        """The newest runs still queued or running, newest first"""
+        runs = []
+        with self._lock:
+            for future in reversed(self._started):
+                if len(runs) == count:
+                    break
+                job_id, name, since = self._started[future]
+                runs.append({'job_id': job_id, 'name': name, 'since': since, 'running': future.running()})
+        return runs
+
+    def states(self):
+        """{job id: 'running' or 'queued'} for every job with runs still going"""
+        with self._lock:
+            return {
+                job_id: 'running' if any(future.running() for future in runs) else 'queued'
+                for job_id, runs in self._runs.items()
+            }
+
+    def record(self, job_id, outcome):
+        with self._lock:
+            self._outcomes.setdefault(job_id, Counter())[outcome] += 1
+
+    def outcomes(self, job_id):
+        """Skipped, coalesced and cancelled firings of a job since TaskFlow started"""
+        with self._lock:
+            return dict(self._outcomes.get(job_id, {}))
+
+
+# Function to get the process-wide registry of active runs
+def get_active_runs():
+    global _active_runs
+    with _active_runs_lock:
+        if _active_runs is None:
+            _active_runs = ActiveRuns()
+    return _active_runs
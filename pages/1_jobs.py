@@ -7,7 +7,16 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import functions from main app
-from app import status_indicator, save_data, get_script_content, execute_script, check_scheduled_jobs
+from app import get_state, status_indicator, save_data, get_script_content, check_scheduled_jobs, export_jobs, start_job_run, finish_run, live_job_status, set_jobs_enabled, toggle_job, delete_job, delete_jobs
+from job_io import FORMATS, SCRIPT_TYPES
+from run_queue import PRIORITIES, DEFAULT_PRIORITY
+from retries import DEFAULT_BACKOFF_SECONDS, DEFAULT_JITTER, parse_exit_codes
+from sql_runner import DEFAULT_TIMEOUT_SECONDS as DEFAULT_SQL_TIMEOUT_SECONDS
+from overlap import OVERLAP_MODES, OVERLAP_LABELS, get_active_runs
+from file_triggers import TRIGGER_EVENTS, DEFAULT_DEBOUNCE_SECONDS
+from job_stats import success_rate
+from notifications import parse_notification_lines, format_notification_lines, get_notifier
+from profiling import profile_page
 
 # Set page configuration
 st.set_page_config(
@@ -17,51 +26,193 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Function to toggle job status
-def toggle_job_status(job_id):
-    for i, job in enumerate(st.session_state.jobs):
-        if job['id'] == job_id:
-            # Toggle the enabled status
-            new_status = not job['enabled']
-            st.session_state.jobs[i]['enabled'] = new_status
+# Page sizes offered for the jobs table
+PAGE_SIZES = [25, 50, 100, 250]
+# Last result column of the jobs table
+LAST_STATUS = {'success': "✅ Success", 'failed': "❌ Failed"}
+
+# Function to run several jobs with their default arguments and a single save
+def run_jobs(jobs):
+    # Queue all runs first so they execute concurrently within the queue limits
+    submitted = []
+    for job in jobs:
+        arguments = job.get('script_arguments', "")
+        submitted.append((job, arguments, start_job_run(job, arguments)))
+    
+    results = []
+    state = get_state()
+    for job, arguments, future in submitted:
+        success, output = finish_run(job['id'], arguments, future, save=False)
+        # The scheduler and other sessions read the job meanwhile
+        with state.lock:
+            job['last_run'] = datetime.datetime.now()
+        results.append((job['name'], success))
+    
+    # Saved outside the lock, like the job changes in core.py
+    save_data()
+    return results
+
+# Function to filter jobs by name, status and script type
+def filter_jobs(jobs, search, status_filter, type_filter):
+    search = search.strip().lower()
+    type_filter = set(type_filter)
+    
+    filtered_jobs = []
+    for job in jobs:
+        if search and search not in job['name'].lower():
+            continue
+        if status_filter == "Enabled" and not job['enabled']:
+            continue
+        if status_filter == "Disabled" and job['enabled']:
+            continue
+        if type_filter and job['script_type'] not in type_filter:
+            continue
+        filtered_jobs.append(job)
+    
+    return filtered_jobs
+
+# Function to build the table row of a job
+def job_row(job):
+    next_run = st.session_state.next_run_times.get(job['id']) if job['enabled'] else None
+    rate = success_rate(job.get('stats'))
+    if job.get('file_trigger'):
+        interval = "On file change"
+        next_run = "On file change" if job['enabled'] else "Disabled"
+    else:
+        interval = f"Every {job['interval_value']} {job['interval_unit']}"
+        next_run = next_run.strftime('%Y-%m-%d %H:%M:%S') if next_run else "Disabled"
+    return {
+        "Status": status_indicator(job['enabled'], use_emoji=True).strip(),
+        "Name": job['name'],
+        "Type": job['script_type'],
+        "Interval": interval,
+        "Last Run": job['last_run'].strftime('%Y-%m-%d %H:%M:%S') if job['last_run'] else "Never",
+        "Next Run": next_run,
+        "Priority": job.get('priority', DEFAULT_PRIORITY),
+        "Last Result": LAST_STATUS.get((job.get('stats') or {}).get('last_status'), "Never run"),
+        "Success Rate": f"{rate:.0%}" if rate is not None else "",
+        "Arguments": job.get('script_arguments', ''),
+    }
+
+# Function to show the detail view of a single job
+def show_job_details(job):
+    with st.container(border=True):
+        st.subheader(f"{status_indicator(job['enabled'], use_emoji=True)}{job['name']} ({job['script_type']})")
+        
+        col1, col2 = st.columns([3, 1])
+        
+        with col1:
+            file_trigger = job.get('file_trigger')
+            if file_trigger:
+                patterns = ", ".join(file_trigger['patterns']) or "any file"
+                st.write(f"**Runs When:** {', '.join(file_trigger['events'])} of {patterns} in " + ", ".join(f"`{path}`" for path in file_trigger['paths']))
+            else:
+                st.write(f"**Interval:** Every {job['interval_value']} {job['interval_unit']}")
+            st.write(f"**Priority:** {job.get('priority', DEFAULT_PRIORITY)}")
             
-            # Update next run time if the job is now enabled
-            if new_status:
-                last_run = job['last_run'] or datetime.datetime.now()
-                st.session_state.next_run_times[job_id] = last_run + datetime.timedelta(seconds=job['interval_seconds'])
+            stats = job.get('stats')
+            if stats and stats['runs']:
+                line = f"**Runs:** {stats['runs']}, {success_rate(stats):.0%} successful"
+                if stats['consecutive_failures']:
+                    line += f", failed {stats['consecutive_failures']} times in a row"
+                if stats['last_success']:
+                    line += f", last success {stats['last_success'].strftime('%Y-%m-%d %H:%M:%S')}"
+                if stats['average_duration'] is not None:
+                    line += f", usually takes {stats['average_duration']:.2f}s"
+                st.write(line)
             
-            # Save data
-            save_data()
+            retry_policy = job.get('retry_policy')
+            if retry_policy:
+                exit_codes = ", ".join(str(code) for code in retry_policy['retry_exit_codes']) or "any failure"
+                st.write(f"**Retries:** up to {retry_policy['max_retries']}, first after {retry_policy['backoff_seconds']:.0f}s, on {exit_codes}")
             
-            return True
-    
-    return False
-
-# Function to delete a job
-def delete_job(job_id):
-    for i, job in enumerate(st.session_state.jobs):
-        if job['id'] == job_id:
-            # Remove the script file
-            try:
-                os.remove(job['script_path'])
-            except:
-                pass
+            sql_target = job.get('sql_target')
+            if sql_target and job['script_type'] == 'sql':
+                st.write(f"**Database:** `{sql_target['database']}`, timeout {sql_target['timeout_seconds']:.0f}s")
             
-            # Remove the job from session state
-            st.session_state.jobs.pop(i)
+            if job.get('worker_label'):
+                st.write(f"**Runs On:** workers labelled `{job['worker_label']}`")
             
-            # Remove the job from next run times
-            if job_id in st.session_state.next_run_times:
-                del st.session_state.next_run_times[job_id]
+            for sink in job.get('notifications') or []:
+                st.write(f"**Notifies:** {sink['type']} `{sink['target']}` on {', '.join(sink['on'])}")
             
-            # Save data
-            save_data()
+            overlap_policy = job.get('overlap_policy')
+            if overlap_policy:
+                limit = f" (at most {overlap_policy['max_parallel']})" if overlap_policy['mode'] == 'parallel' else ""
+                st.write(f"**If Still Running:** {OVERLAP_LABELS[overlap_policy['mode']]}{limit}")
+            overlaps = get_active_runs().outcomes(job['id'])
+            if overlaps:
+                st.write("**Overlapping Runs Since Start:** " + ", ".join(f"{count} {outcome}" for outcome, count in sorted(overlaps.items())))
             
-            return True
-    
-    return False
+            result_cache = job.get('result_cache')
+            if result_cache:
+                expiry = f"expires after {result_cache['ttl_seconds']}s" if result_cache['ttl_seconds'] else "kept until inputs change"
+                inputs = ", ".join(result_cache['input_files']) or "no input files"
+                st.write(f"**Result Cache:** {expiry}, watching {inputs}")
+            
+            pending_retry = st.session_state.retry_times.get(job['id'])
+            if pending_retry:
+                st.write(f"**Next Retry:** attempt {pending_retry['attempt']} at {pending_retry['due'].strftime('%Y-%m-%d %H:%M:%S')}")
+            
+            if job['last_run']:
+                st.write(f"**Last Run:** {job['last_run'].strftime('%Y-%m-%d %H:%M:%S')}")
+            else:
+                st.write("**Last Run:** Never")
+            
+            if job['enabled'] and job['id'] in st.session_state.next_run_times:
+                st.write(f"**Next Run:** {st.session_state.next_run_times[job['id']].strftime('%Y-%m-%d %H:%M:%S')}")
+            else:
+                st.write("**Next Run:** Disabled")
+            
+            # Show default arguments if they exist
+            if 'script_arguments' in job and job['script_arguments']:
+                st.write(f"**Default Arguments:** `{job['script_arguments']}`")
+        
+        with col2:
+            # Use 4-column layout for buttons
+            button_cols = st.columns(4)
+            
+            with button_cols[0]:
+                if st.button("Run", key=f"run_{job['id']}", use_container_width=True):
+                    # Store job info in session state for the run page
+                    st.session_state.run_job_id = job['id']
+                    # Redirect to the run page
+                    st.switch_page("pages/5_run.py")
+            
+            with button_cols[1]:
+                status_btn_text = "Disable" if job['enabled'] else "Enable"
+                if st.button(status_btn_text, key=f"toggle_{job['id']}", use_container_width=True):
+                    if toggle_job(job['id']):
+                        st.success(f"Job {status_btn_text.lower()}d successfully!")
+                        st.rerun()
+            
+            with button_cols[2]:
+                if st.button("History", key=f"history_{job['id']}", use_container_width=True):
+                    st.switch_page("pages/3_history.py")
+                    st.rerun()
+            
+            with button_cols[3]:
+                if st.button("Edit", key=f"edit_{job['id']}", use_container_width=True):
+                    st.session_state.edit_job_id = job['id']
+                    st.session_state.edit_job_content = get_script_content(job['script_path'])
+                    st.session_state.show_edit_form = True
+                    st.rerun()
+            
+            # Use the same column for delete button
+            with button_cols[3]:
+                if st.button("Delete", key=f"delete_{job['id']}", use_container_width=True):
+                    if delete_job(job['id']):
+                        st.success("Job deleted successfully!")
+                        st.rerun()
+        
+        # Show script content, read only for the job that is opened
+        st.markdown("---")
+        st.subheader("Script Content")
+        script_content = get_script_content(job['script_path'])
+        st.code(script_content, language=job['script_type'])
 
 # Main function for the jobs page
+@profile_page("jobs")
 def main():
     # Hide the deploy button/text with custom CSS
     hide_deploy_text = """
@@ -125,15 +276,89 @@ def main():
                                 index=["minutes", "hours", "days"].index(edit_job['interval_unit']) if edit_job['interval_unit'] in ["minutes", "hours", "days"] else 0
                             )
                         
+                        # Runs started by changed files instead of the interval
+                        edit_trigger = edit_job.get('file_trigger') or {}
+                        with st.expander("Run on File Changes", expanded=bool(edit_trigger)):
+                            trigger_enabled = st.checkbox("Run When Files Change", value=bool(edit_trigger), help="Replaces the interval; the changed path is passed as the last argument")
+                            trigger_paths = st.text_area("Watched Paths", value="\n".join(edit_trigger.get('paths', [])), help="One directory or file per line; subdirectories are not watched")
+                            trigger_cols = st.columns(3)
+                            with trigger_cols[0]:
+                                trigger_patterns = st.text_input("File Patterns", value=", ".join(edit_trigger.get('patterns', [])), help="Comma-separated glob patterns such as *.csv, leave empty for any file")
+                            with trigger_cols[1]:
+                                trigger_events = st.multiselect("Events", options=TRIGGER_EVENTS, default=edit_trigger.get('events', TRIGGER_EVENTS))
+                            with trigger_cols[2]:
+                                trigger_debounce = st.number_input("Quiet For (seconds)", min_value=0.0, value=float(edit_trigger.get('debounce_seconds', DEFAULT_DEBOUNCE_SECONDS)), help="A file fires the job once it has not changed for this long")
+                        
                         enabled = st.checkbox("Enabled", value=edit_job['enabled'])
                         
                         # Add default arguments field
                         script_arguments = st.text_input(
                             "Default Arguments", 
                             value=edit_job.get('script_arguments', ''),
-                            help="Space-separated arguments to pass to the script when executed"
+                            help="Arguments to pass to the script when executed, separated by spaces; quote arguments with spaces or apostrophes as in a shell, e.g. \"O'Brien\" or 'two words'"
+                        )
+                        
+                        priority_options = list(PRIORITIES)
+                        edit_priority = edit_job.get('priority', DEFAULT_PRIORITY)
+                        priority = st.selectbox(
+                            "Priority",
+                            options=priority_options,
+                            index=priority_options.index(edit_priority) if edit_priority in priority_options else 1
                         )
                         
+                        worker_label = st.text_input(
+                            "Worker Label",
+                            value=edit_job.get('worker_label') or '',
+                            help="Run the job on `scriptflow worker` processes with this label, or on any worker with \"any\"; leave empty to run it here"
+                        )
+                        
+                        # What a firing does while earlier runs of the job still go
+                        edit_overlap = edit_job.get('overlap_policy') or {}
+                        overlap_cols = st.columns(2)
+                        with overlap_cols[0]:
+                            overlap_mode = st.selectbox(
+                                "If Still Running",
+                                options=OVERLAP_MODES,
+                                index=OVERLAP_MODES.index(edit_overlap.get('mode', 'allow')),
+                                format_func=OVERLAP_LABELS.get,
+                                help="What a scheduled run does when the previous run of the job has not finished"
+                            )
+                        with overlap_cols[1]:
+                            max_parallel = st.number_input("Max Parallel Runs", min_value=1, value=int(edit_overlap.get('max_parallel', 2)), help="Only used when running in parallel up to a limit")
+                        
+                        # Retries of failed scheduled runs
+                        edit_retry = edit_job.get('retry_policy') or {}
+                        with st.expander("Retry on Failure", expanded=bool(edit_retry)):
+                            retry_cols = st.columns(3)
+                            with retry_cols[0]:
+                                max_retries = st.number_input("Max Retries", min_value=0, max_value=10, value=edit_retry.get('max_retries', 0), help="0 disables retries")
+                            with retry_cols[1]:
+                                backoff_seconds = st.number_input("First Retry After (seconds)", min_value=1, value=int(edit_retry.get('backoff_seconds', DEFAULT_BACKOFF_SECONDS)), help="Doubled for every further attempt")
+                            with retry_cols[2]:
+                                retry_exit_codes = st.text_input("Retry on Exit Codes", value=", ".join(str(code) for code in edit_retry.get('retry_exit_codes', [])), help="Comma-separated exit codes, leave empty to retry any failure")
+                        
+                        # Reuse of results of identical runs
+                        edit_cache = edit_job.get('result_cache') or {}
+                        with st.expander("Result Cache", expanded=bool(edit_cache)):
+                            cache_enabled = st.checkbox("Reuse Results of Identical Runs", value=bool(edit_cache), help="Only for idempotent scripts")
+                            cache_ttl = st.number_input("Expire After (seconds)", min_value=0, value=int(edit_cache.get('ttl_seconds', 0)), help="0 keeps results until the inputs change")
+                            cache_input_files = st.text_area("Input Files", value="\n".join(edit_cache.get('input_files', [])), help="One path or glob pattern per line; a change to any of them invalidates cached results")
+                        
+                        # Database that sql scripts run against
+                        edit_sql = edit_job.get('sql_target') or {}
+                        with st.expander("SQL Database", expanded=bool(edit_sql)):
+                            sql_database = st.text_input("Database File", value=edit_sql.get('database', ''), help="SQLite database file the script runs against; leave empty for a fresh in-memory database. Only used by sql jobs")
+                            sql_timeout = st.number_input("Timeout (seconds)", min_value=1, value=int(edit_sql.get('timeout_seconds', DEFAULT_SQL_TIMEOUT_SECONDS)), help="Runs taking longer are interrupted")
+                        
+                        # Where finished runs are reported
+                        edit_notifications = edit_job.get('notifications')
+                        with st.expander("Notifications", expanded=bool(edit_notifications)):
+                            notification_lines = st.text_area(
+                                "Notify",
+                                value=format_notification_lines(edit_notifications),
+                                help="One per line: webhook, command or file, then the URL, command or path, then the events (success, failure, change; default failure), e.g. `webhook https://hooks.example.com/jobs failure,change`"
+                            )
+                        
                         col1, col2 = st.columns(2)
                         with col1:
                             submit = st.form_submit_button("Update Job", use_container_width=True)
@@ -147,22 +372,49 @@ def main():
                             # Import update_job function
                             from app import update_job
                             
-                            if update_job(
-                                st.session_state.edit_job_id,
-                                name,
-                                script_content,
-                                script_type,
-                                interval_value,
-                                interval_unit,
-                                enabled,
-                                script_arguments
-                            ):
-                                # Set a flag to show success message outside the form
-                                st.session_state.job_updated = name
-                                st.session_state.show_edit_form = False
-                                st.rerun()
+                            try:
+                                retry_policy = {
+                                    'max_retries': max_retries,
+                                    'backoff_seconds': backoff_seconds,
+                                    'jitter': edit_retry.get('jitter', DEFAULT_JITTER),
+                                    'retry_exit_codes': parse_exit_codes(retry_exit_codes)
+                                }
+                            except ValueError:
+                                st.error("Retry exit codes must be a comma-separated list of numbers.")
                             else:
-                                st.error("Failed to update job.")
+                                try:
+                                    notifications = parse_notification_lines(notification_lines)
+                                except ValueError as e:
+                                    st.error(f"Invalid notifications: {e}")
+                                else:
+                                    if "," in worker_label:
+                                        st.error("A job has a single worker label.")
+                                    elif trigger_enabled and not trigger_paths.strip():
+                                        st.error("List at least one watched path, or turn off Run When Files Change.")
+                                    elif update_job(
+                                        st.session_state.edit_job_id,
+                                        name,
+                                        script_content,
+                                        script_type,
+                                        interval_value,
+                                        interval_unit,
+                                        enabled,
+                                        script_arguments,
+                                        priority,
+                                        retry_policy,
+                                        {'ttl_seconds': cache_ttl, 'input_files': cache_input_files} if cache_enabled else None,
+                                        worker_label,
+                                        {'database': sql_database, 'timeout_seconds': sql_timeout},
+                                        {'mode': overlap_mode, 'max_parallel': max_parallel},
+                                        {'paths': trigger_paths, 'patterns': trigger_patterns, 'events': trigger_events, 'debounce_seconds': trigger_debounce} if trigger_enabled else None,
+                                        notifications
+                                    ):
+                                        # Set a flag to show success message outside the form
+                                        st.session_state.job_updated = name
+                                        st.session_state.show_edit_form = False
+                                        st.rerun()
+                                    else:
+                                        st.error("Failed to update job.")
         
         # Only show the job list if not in edit mode
         if 'show_edit_form' not in st.session_state or not st.session_state.show_edit_form:
@@ -175,6 +427,35 @@ def main():
                 if st.button("➕ Create new Job", use_container_width=True):
                     st.switch_page("pages/2_add_job.py")
             
+            # Export all jobs including their script content
+            with st.expander("Export Jobs"):
+                export_format = st.radio("Format", options=FORMATS, horizontal=True, key="export_format")
+                
+                # Reading every script file is only done on request, not on every rerun
+                if st.button("Prepare Export", use_container_width=True):
+                    st.session_state.jobs_export = (export_format, export_jobs(export_format))
+                
+                if 'jobs_export' in st.session_state and st.session_state.jobs_export[0] == export_format:
+                    st.download_button(
+                        f"Download jobs.{export_format}",
+                        data=st.session_state.jobs_export[1],
+                        file_name=f"jobs.{export_format}",
+                        mime="text/csv" if export_format == "csv" else "application/x-ndjson",
+                        use_container_width=True
+                    )
+
+            # Delivery of run notifications, which happens in the background
+            if any(job.get('notifications') for job in st.session_state.jobs):
+                with st.expander("Notification Delivery"):
+                    delivery = get_notifier().stats()
+                    delivery_cols = st.columns(5)
+                    delivery_cols[0].metric("Backlog", delivery['backlog'], help="Queued, being delivered or waiting for a retry")
+                    delivery_cols[1].metric("Delivered", delivery['delivered'])
+                    delivery_cols[2].metric("Retried", delivery['retried'])
+                    delivery_cols[3].metric("Dead Letters", delivery['dead'], help="Given up on and written to data/notifications.dead.jsonl")
+                    latency = delivery['latency_average']
+                    delivery_cols[4].metric("Latency", f"{latency:.2f}s" if latency is not None else "-", help="Average time from a finished run to its delivery")
+
             # Show success message after job update
             if 'job_updated' in st.session_state:
                 st.success(f"Job '{st.session_state.job_updated}' updated successfully!")
@@ -197,82 +478,89 @@ def main():
                 del st.session_state.run_success
                 del st.session_state.run_output
             
-            # Jobs list container
-            jobs_container = st.container()
+            # Filters for the jobs table
+            filter_cols = st.columns([3, 1, 2])
+            with filter_cols[0]:
+                search = st.text_input("Search", placeholder="Filter by job name...", key="jobs_search")
+            with filter_cols[1]:
+                status_filter = st.selectbox("Status", options=["All", "Enabled", "Disabled"], key="jobs_status_filter")
+            with filter_cols[2]:
+                type_filter = st.multiselect("Script Type", options=SCRIPT_TYPES, key="jobs_type_filter")
             
-            # Create a container for each job
-            for job in st.session_state.jobs:
-                # Check if this is the newly added job to auto-expand it
-                default_expanded = 'newly_added_job' in st.session_state and job['id'] == st.session_state.newly_added_job
-                
-                # Create a container for each job with status emoji in the title
-                with st.expander(f"{status_indicator(job['enabled'], use_emoji=True)}{job['name']} ({job['script_type']})", expanded=default_expanded):
-                    # If this was a newly added job, clear the flag after expanding it
-                    if default_expanded:
-                        # Clear the flag after this render cycle
-                        del st.session_state.newly_added_job
-                    
-                    col1, col2 = st.columns([3, 1])
-                    
-                    with col1:
-                        st.write(f"**Interval:** Every {job['interval_value']} {job['interval_unit']}")
-                        
-                        if job['last_run']:
-                            st.write(f"**Last Run:** {job['last_run'].strftime('%Y-%m-%d %H:%M:%S')}")
-                        else:
-                            st.write("**Last Run:** Never")
-                        
-                        if job['enabled'] and job['id'] in st.session_state.next_run_times:
-                            st.write(f"**Next Run:** {st.session_state.next_run_times[job['id']].strftime('%Y-%m-%d %H:%M:%S')}")
-                        else:
-                            st.write("**Next Run:** Disabled")
-                        
-                        # Show default arguments if they exist
-                        if 'script_arguments' in job and job['script_arguments']:
-                            st.write(f"**Default Arguments:** `{job['script_arguments']}`")
-                    
-                    with col2:
-                        # Use 4-column layout for buttons
-                        button_cols = st.columns(4)
-                        
-                        with button_cols[0]:
-                            if st.button("Run", key=f"run_{job['id']}", use_container_width=True):
-                                # Store job info in session state for the run page
-                                st.session_state.run_job_id = job['id']
-                                # Redirect to the run page
-                                st.switch_page("pages/5_run.py")
-                        
-                        with button_cols[1]:
-                            status_btn_text = "Disable" if job['enabled'] else "Enable"
-                            if st.button(status_btn_text, key=f"toggle_{job['id']}", use_container_width=True):
-                                if toggle_job_status(job['id']):
-                                    st.success(f"Job {status_btn_text.lower()}d successfully!")
-                                    st.rerun()
-                        
-                        with button_cols[2]:
-                            if st.button("History", key=f"history_{job['id']}", use_container_width=True):
-                                st.switch_page("pages/3_history.py")
-                                st.rerun()
-                        
-                        with button_cols[3]:
-                            if st.button("Edit", key=f"edit_{job['id']}", use_container_width=True):
-                                st.session_state.edit_job_id = job['id']
-                                st.session_state.edit_job_content = get_script_content(job['script_path'])
-                                st.session_state.show_edit_form = True
-                                st.rerun()
-                        
-                        # Use the same column for delete button
-                        with button_cols[3]:
-                            if st.button("Delete", key=f"delete_{job['id']}", use_container_width=True):
-                                if delete_job(job['id']):
-                                    st.success("Job deleted successfully!")
-                                    st.rerun()
-                    
-                    # Show script content
-                    st.markdown("---")
-                    st.subheader("Script Content")
-                    script_content = get_script_content(job['script_path'])
-                    st.code(script_content, language=job['script_type'])
+            filtered_jobs = filter_jobs(st.session_state.jobs, search, status_filter, type_filter)
+            
+            # Pagination so only one page of jobs is rendered per rerun
+            page_cols = st.columns([1, 1, 2])
+            with page_cols[0]:
+                page_size = st.selectbox("Jobs per page", options=PAGE_SIZES, index=1, key="jobs_page_size")
+            page_count = max(1, -(-len(filtered_jobs) // page_size))
+            with page_cols[1]:
+                page = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1, key="jobs_page")
+            with page_cols[2]:
+                st.write("")
+                st.caption(f"{len(filtered_jobs)} of {len(st.session_state.jobs)} jobs · page {page} of {page_count}")
+            
+            page_jobs = filtered_jobs[(page - 1) * page_size:page * page_size]
+            
+            if not page_jobs:
+                st.info("No jobs match the current filters.")
+                return
+            
+            # A new table key for every filter/page combination resets the selection,
+            # so bulk actions never apply to rows that are no longer shown
+            table_key = f"jobs_table_{hash((search, status_filter, tuple(type_filter), page_size, page))}"
+            table_event = st.dataframe(
+                [job_row(job) for job in page_jobs],
+                use_container_width=True,
+                hide_index=True,
+                on_select="rerun",
+                selection_mode="multi-row",
+                key=table_key
+            )
+            
+            selected_jobs = [page_jobs[i] for i in table_event.selection.rows if i < len(page_jobs)]
+            
+            # Running state, last result and next run of the jobs on this page, refreshed on a timer
+            live_job_status([job['id'] for job in page_jobs])
+            selected_ids = [job['id'] for job in selected_jobs]
+            
+            # Bulk actions on the selected jobs, each persisted with a single write
+            action_cols = st.columns(4)
+            with action_cols[0]:
+                if st.button(f"Enable ({len(selected_ids)})", disabled=not selected_ids, use_container_width=True):
+                    set_jobs_enabled(selected_ids, True)
+                    st.rerun()
+            with action_cols[1]:
+                if st.button(f"Disable ({len(selected_ids)})", disabled=not selected_ids, use_container_width=True):
+                    set_jobs_enabled(selected_ids, False)
+                    st.rerun()
+            with action_cols[2]:
+                if st.button(f"Run ({len(selected_ids)})", disabled=not selected_ids, use_container_width=True):
+                    results = run_jobs(selected_jobs)
+                    failed = [name for name, success in results if not success]
+                    st.session_state.run_success = not failed
+                    st.session_state.run_output = (
+                        f"{len(results) - len(failed)} of {len(results)} jobs succeeded."
+                        + (f" Failed: {', '.join(failed)}" if failed else "")
+                    )
+                    st.rerun()
+            with action_cols[3]:
+                if st.button(f"Delete ({len(selected_ids)})", disabled=not selected_ids, use_container_width=True):
+                    delete_jobs(selected_ids)
+                    st.rerun()
+            
+            # Open the detail view of a newly added job, or of a single selected row
+            detail_job = None
+            if 'newly_added_job' in st.session_state:
+                detail_job = next((job for job in st.session_state.jobs if job['id'] == st.session_state.newly_added_job), None)
+                del st.session_state.newly_added_job
+            elif len(selected_jobs) == 1:
+                detail_job = selected_jobs[0]
+            
+            if detail_job:
+                show_job_details(detail_job)
+            else:
+                st.caption("Select a single job to see its details.")
 
 # Run the page
 if __name__ == "__main__":
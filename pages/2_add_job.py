@@ -11,8 +11,6 @@ st.set_page_config(
 # Only import other modules after st.set_page_config()
 import sys
 import os
-import datetime
-import uuid
 import json
 from pathlib import Path
 
@@ -20,7 +18,15 @@ from pathlib import Path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import specific functions from app instead of the whole module
-from app import add_job, check_scheduled_jobs, create_script_file
+from app import add_job, add_jobs, check_scheduled_jobs
+from job_io import detect_format, parse_jobs, normalize_arguments
+from run_queue import PRIORITIES, DEFAULT_PRIORITY
+from retries import DEFAULT_BACKOFF_SECONDS, parse_exit_codes
+from sql_runner import DEFAULT_TIMEOUT_SECONDS as DEFAULT_SQL_TIMEOUT_SECONDS
+from overlap import OVERLAP_MODES, OVERLAP_LABELS
+from file_triggers import TRIGGER_EVENTS, DEFAULT_DEBOUNCE_SECONDS
+from notifications import parse_notification_lines, format_notification_lines, normalize_notifications
+from profiling import profile_page, count_read
 
 # Function to load templates
 def load_templates():
@@ -31,6 +37,7 @@ def load_templates():
     if templates_dir.exists():
         for template_file in templates_dir.glob("*.json"):
             try:
+                count_read("template")
                 with open(template_file, "r") as f:
                     template_data = json.load(f)
                     # Use the filename without extension as template name if not specified in the JSON
@@ -42,6 +49,7 @@ def load_templates():
     return templates
 
 # Main function for the add job page
+@profile_page("add_job")
 def main():
     # Hide the deploy button/text with custom CSS
     hide_deploy_text = """
@@ -82,6 +90,49 @@ def main():
     # Add default arguments session state
     if 'script_arguments' not in st.session_state:
         st.session_state.script_arguments = ""
+    if 'job_priority' not in st.session_state:
+        st.session_state.job_priority = DEFAULT_PRIORITY
+    if 'worker_label' not in st.session_state:
+        st.session_state.worker_label = ""
+    # File trigger session state
+    if 'trigger_enabled' not in st.session_state:
+        st.session_state.trigger_enabled = False
+    if 'trigger_paths' not in st.session_state:
+        st.session_state.trigger_paths = ""
+    if 'trigger_patterns' not in st.session_state:
+        st.session_state.trigger_patterns = ""
+    if 'trigger_events' not in st.session_state:
+        st.session_state.trigger_events = list(TRIGGER_EVENTS)
+    if 'trigger_debounce' not in st.session_state:
+        st.session_state.trigger_debounce = DEFAULT_DEBOUNCE_SECONDS
+    
+    # Notifications session state, one notification per line
+    if 'notification_lines' not in st.session_state:
+        st.session_state.notification_lines = ""
+    # Overlap policy session state
+    if 'overlap_mode' not in st.session_state:
+        st.session_state.overlap_mode = "allow"
+    if 'overlap_max_parallel' not in st.session_state:
+        st.session_state.overlap_max_parallel = 2
+    # Retry policy session state
+    if 'retry_max' not in st.session_state:
+        st.session_state.retry_max = 0
+    if 'retry_backoff' not in st.session_state:
+        st.session_state.retry_backoff = DEFAULT_BACKOFF_SECONDS
+    if 'retry_exit_codes' not in st.session_state:
+        st.session_state.retry_exit_codes = ""
+    # Result cache session state
+    if 'cache_enabled' not in st.session_state:
+        st.session_state.cache_enabled = False
+    if 'cache_ttl' not in st.session_state:
+        st.session_state.cache_ttl = 0
+    if 'cache_input_files' not in st.session_state:
+        st.session_state.cache_input_files = ""
+    # SQL database session state
+    if 'sql_database' not in st.session_state:
+        st.session_state.sql_database = ""
+    if 'sql_timeout' not in st.session_state:
+        st.session_state.sql_timeout = DEFAULT_SQL_TIMEOUT_SECONDS
 
     # Check if we should show the form or success message
     if not st.session_state.job_just_created:
@@ -102,6 +153,32 @@ def main():
                 st.session_state.job_enabled = template.get("enabled", True)
                 # Add support for default arguments in templates
                 st.session_state.script_arguments = template.get("default-arguments", "")
+                st.session_state.job_priority = template.get("priority", DEFAULT_PRIORITY)
+                st.session_state.worker_label = template.get("worker-label") or ""
+                file_trigger = template.get("file-trigger") or {}
+                st.session_state.trigger_enabled = bool(file_trigger)
+                st.session_state.trigger_paths = "\n".join(file_trigger.get("paths", []))
+                st.session_state.trigger_patterns = ", ".join(file_trigger.get("patterns", []))
+                st.session_state.trigger_events = file_trigger.get("events", list(TRIGGER_EVENTS))
+                st.session_state.trigger_debounce = float(file_trigger.get("debounce_seconds", DEFAULT_DEBOUNCE_SECONDS))
+                overlap_policy = template.get("overlap-policy") or {}
+                st.session_state.overlap_mode = overlap_policy.get("mode", "allow")
+                st.session_state.overlap_max_parallel = overlap_policy.get("max_parallel", 2)
+                retry_policy = template.get("retry-policy") or {}
+                st.session_state.retry_max = retry_policy.get("max_retries", 0)
+                st.session_state.retry_backoff = retry_policy.get("backoff_seconds", DEFAULT_BACKOFF_SECONDS)
+                st.session_state.retry_exit_codes = ", ".join(str(code) for code in retry_policy.get("retry_exit_codes", []))
+                result_cache = template.get("result-cache") or {}
+                st.session_state.cache_enabled = bool(result_cache)
+                st.session_state.cache_ttl = result_cache.get("ttl_seconds", 0)
+                try:
+                    st.session_state.notification_lines = format_notification_lines(normalize_notifications(template.get("notifications")))
+                except (TypeError, ValueError, AttributeError):
+                    st.session_state.notification_lines = ""
+                st.session_state.cache_input_files = "\n".join(result_cache.get("input_files", []))
+                sql_target = template.get("sql-target") or {}
+                st.session_state.sql_database = sql_target.get("database", "")
+                st.session_state.sql_timeout = sql_target.get("timeout_seconds", DEFAULT_SQL_TIMEOUT_SECONDS)
         
         # Template selector outside the form
         st.selectbox(
@@ -150,6 +227,18 @@ def main():
                     key="interval_unit"
                 )
             
+            # Jobs can run when files land in a directory instead of on the interval
+            with st.expander("Run on File Changes"):
+                trigger_enabled = st.checkbox("Run When Files Change", value=st.session_state.trigger_enabled, help="Replaces the interval; the changed path is passed as the last argument", key="trigger_enabled")
+                trigger_paths = st.text_area("Watched Paths", value=st.session_state.trigger_paths, help="One directory or file per line; subdirectories are not watched", key="trigger_paths")
+                trigger_cols = st.columns(3)
+                with trigger_cols[0]:
+                    trigger_patterns = st.text_input("File Patterns", value=st.session_state.trigger_patterns, help="Comma-separated glob patterns such as *.csv, leave empty for any file", key="trigger_patterns")
+                with trigger_cols[1]:
+                    trigger_events = st.multiselect("Events", options=TRIGGER_EVENTS, default=st.session_state.trigger_events, key="trigger_events")
+                with trigger_cols[2]:
+                    trigger_debounce = st.number_input("Quiet For (seconds)", min_value=0.0, value=float(st.session_state.trigger_debounce), help="A file fires the job once it has not changed for this long", key="trigger_debounce")
+            
             # Add the enabled/disabled toggle
             enabled = st.toggle(
                 "Enabled", 
@@ -162,14 +251,99 @@ def main():
             script_arguments = st.text_input(
                 "Default Arguments",
                 value=st.session_state.script_arguments,
-                help="Space-separated arguments to pass to the script when executed",
+                help="Arguments to pass to the script when executed, separated by spaces; quote arguments with spaces or apostrophes as in a shell, e.g. \"O'Brien\" or 'two words'",
                 key="script_arguments"
             )
             
+            # Priority in the run queue when several jobs are waiting for a slot
+            priority_options = list(PRIORITIES)
+            priority = st.selectbox(
+                "Priority",
+                options=priority_options,
+                index=priority_options.index(st.session_state.job_priority) if st.session_state.job_priority in priority_options else 1,
+                help="Runs with a higher priority start first when the concurrency limit of their script type is reached",
+                key="job_priority"
+            )
+            
+            # Jobs with a label run on `scriptflow worker` processes instead of this one
+            worker_label = st.text_input(
+                "Worker Label",
+                value=st.session_state.worker_label,
+                help="Run the job on `scriptflow worker` processes with this label, or on any worker with \"any\"; leave empty to run it here",
+                key="worker_label"
+            )
+            
+            # What a scheduled run does while the previous run of the job is still going
+            overlap_cols = st.columns(2)
+            with overlap_cols[0]:
+                overlap_mode = st.selectbox(
+                    "If Still Running",
+                    options=OVERLAP_MODES,
+                    index=OVERLAP_MODES.index(st.session_state.overlap_mode) if st.session_state.overlap_mode in OVERLAP_MODES else 0,
+                    format_func=OVERLAP_LABELS.get,
+                    help="What a scheduled run does when the previous run of the job has not finished",
+                    key="overlap_mode"
+                )
+            with overlap_cols[1]:
+                max_parallel = st.number_input("Max Parallel Runs", min_value=1, value=int(st.session_state.overlap_max_parallel), help="Only used when running in parallel up to a limit", key="overlap_max_parallel")
+            
+            # Retries of failed scheduled runs, scheduled with exponential backoff
+            with st.expander("Retry on Failure"):
+                retry_cols = st.columns(3)
+                with retry_cols[0]:
+                    max_retries = st.number_input("Max Retries", min_value=0, max_value=10, value=st.session_state.retry_max, help="0 disables retries", key="retry_max")
+                with retry_cols[1]:
+                    backoff_seconds = st.number_input("First Retry After (seconds)", min_value=1, value=int(st.session_state.retry_backoff), help="Doubled for every further attempt", key="retry_backoff")
+                with retry_cols[2]:
+                    retry_exit_codes = st.text_input("Retry on Exit Codes", value=st.session_state.retry_exit_codes, help="Comma-separated exit codes, leave empty to retry any failure", key="retry_exit_codes")
+            
+            # Reuse the output of earlier runs with the same script, arguments and inputs
+            with st.expander("Result Cache"):
+                cache_enabled = st.checkbox("Reuse Results of Identical Runs", value=st.session_state.cache_enabled, help="Only for idempotent scripts", key="cache_enabled")
+                cache_ttl = st.number_input("Expire After (seconds)", min_value=0, value=int(st.session_state.cache_ttl), help="0 keeps results until the inputs change", key="cache_ttl")
+                cache_input_files = st.text_area("Input Files", value=st.session_state.cache_input_files, help="One path or glob pattern per line; a change to any of them invalidates cached results", key="cache_input_files")
+            
+            # Database that sql scripts run against, in-process on a pooled connection
+            with st.expander("SQL Database"):
+                sql_database = st.text_input("Database File", value=st.session_state.sql_database, help="SQLite database file the script runs against; leave empty for a fresh in-memory database. Only used by sql jobs", key="sql_database")
+                sql_timeout = st.number_input("Timeout (seconds)", min_value=1, value=int(st.session_state.sql_timeout), help="Runs taking longer are interrupted", key="sql_timeout")
+            
+            # Webhooks, commands or files told about finished runs, delivered in the background
+            with st.expander("Notifications"):
+                notification_lines = st.text_area(
+                    "Notify",
+                    value=st.session_state.notification_lines,
+                    help="One per line: webhook, command or file, then the URL, command or path, then the events (success, failure, change; default failure), e.g. `webhook https://hooks.example.com/jobs failure,change`",
+                    key="notification_lines"
+                )
+            
             # Submit button
             submit = st.form_submit_button("Create Job", use_container_width=True)
             
             if submit:
+                try:
+                    retry_policy = {'max_retries': max_retries, 'backoff_seconds': backoff_seconds, 'retry_exit_codes': parse_exit_codes(retry_exit_codes)}
+                except ValueError:
+                    retry_policy = None
+                    st.error("Retry exit codes must be a comma-separated list of numbers.")
+                    name = None
+                if "," in worker_label:
+                    st.error("A job has a single worker label.")
+                    name = None
+                try:
+                    normalize_arguments(script_arguments)
+                except ValueError as e:
+                    st.error(str(e))
+                    name = None
+                try:
+                    notifications = parse_notification_lines(notification_lines)
+                except ValueError as e:
+                    st.error(f"Invalid notifications: {e}")
+                    name = None
+                if trigger_enabled and not trigger_paths.strip():
+                    st.error("List at least one watched path, or turn off Run When Files Change.")
+                    name = None
+                
                 if name and script_content:
                     # Add the job and get its ID with the new arguments parameter
                     job_id = add_job(
@@ -179,7 +353,15 @@ def main():
                         interval_value, 
                         interval_unit, 
                         enabled,
-                        script_arguments  # Pass the arguments to add_job
+                        script_arguments,  # Pass the arguments to add_job
+                        priority,
+                        retry_policy,
+                        {'ttl_seconds': cache_ttl, 'input_files': cache_input_files} if cache_enabled else None,
+                        worker_label,
+                        {'database': sql_database, 'timeout_seconds': sql_timeout},
+                        {'mode': overlap_mode, 'max_parallel': max_parallel},
+                        {'paths': trigger_paths, 'patterns': trigger_patterns, 'events': trigger_events, 'debounce_seconds': trigger_debounce} if trigger_enabled else None,
+                        notifications
                     )
                     
                     # Store the ID of the newly created job to auto-expand it on the jobs page
@@ -196,8 +378,38 @@ def main():
                     
                     # Rerun the app to show the success message instead of the form
                     st.rerun()
-                else:
+                elif name is not None:
                     st.error("Provide a name and script content to create a job.")
+        
+        # Bulk import of many jobs from a JSONL or CSV file, saved in a single write
+        with st.expander("Bulk Import"):
+            if 'bulk_imported' in st.session_state:
+                st.success(f"Imported {st.session_state.bulk_imported} jobs successfully!")
+                del st.session_state.bulk_imported
+            
+            st.caption("One job per line (JSONL) or row (CSV) with the columns name, script_type, script_content, interval_value, interval_unit, enabled, script_arguments, priority and worker_label.")
+            
+            # Changing the key after an import clears the uploader
+            uploaded_file = st.file_uploader(
+                "Jobs File",
+                type=["jsonl", "ndjson", "json", "csv"],
+                key=f"bulk_import_file_{st.session_state.get('bulk_import_round', 0)}"
+            )
+            
+            if uploaded_file is not None:
+                try:
+                    job_specs, errors = parse_jobs(uploaded_file.getvalue().decode("utf-8"), detect_format(uploaded_file.name))
+                except (ValueError, UnicodeDecodeError) as e:
+                    st.error(f"Error reading {uploaded_file.name}: {e}")
+                else:
+                    for error in errors:
+                        st.warning(f"Skipped {error}")
+                    
+                    st.write(f"Found **{len(job_specs)}** valid jobs in `{uploaded_file.name}`.")
+                    if job_specs and st.button(f"Import {len(job_specs)} Jobs", use_container_width=True):
+                        st.session_state.bulk_imported = len(add_jobs(job_specs))
+                        st.session_state.bulk_import_round = st.session_state.get('bulk_import_round', 0) + 1
+                        st.rerun()
     else:
         # Show success message and button when job was created
         st.success(f"Job '{st.session_state.created_job_name}' created successfully!")
@@ -215,7 +427,11 @@ def main():
                     # Use the del operator to remove session state keys instead of setting them to empty
                     # This allows the default values to be applied when widgets are recreated
                     for key in ['job_name', 'script_type', 'script_content', 'interval_value', 
-                               'interval_unit', 'job_enabled', 'script_arguments']:
+                               'interval_unit', 'job_enabled', 'script_arguments', 'job_priority', 'worker_label',
+                               'retry_max', 'retry_backoff', 'retry_exit_codes',
+                               'cache_enabled', 'cache_ttl', 'cache_input_files', 'sql_database', 'sql_timeout',
+                               'overlap_mode', 'overlap_max_parallel', 'trigger_enabled', 'trigger_paths',
+                               'trigger_patterns', 'trigger_events', 'trigger_debounce', 'notification_lines']:
                         if key in st.session_state:
                             del st.session_state[key]
                     
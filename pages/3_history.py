@@ -1,5 +1,7 @@
 import streamlit as st
 import pandas as pd
+import datetime
+import re
 import sys
 import os
 
@@ -7,7 +9,10 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import functions from main app
-from app import check_scheduled_jobs
+from app import check_scheduled_jobs, get_job_history, get_timestamp, prune_history
+from profiling import profile_page
+from output_store import entry_output, entry_error, blob_stats
+from search_index import search, sync_in_background, syncing
 
 # Import st_aggrid
 from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, DataReturnMode
@@ -20,7 +25,24 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# Status shown for firings that overlapped with a run of the same job
+OVERLAP_STATUS = {
+    'skipped': "⏭️ Skipped",
+    'coalesced': "🔗 Coalesced",
+    'cancelled': "⛔ Cancelled",
+}
+
+# Function to escape text shown with st.markdown
+def escape_markdown(text):
+    return re.sub(r"([\\`*_{}\[\]()#+\-.!|<>~$])", r"\\\1", text)
+
+# Function to render a search snippet on one line with the matches in bold
+def highlight_snippet(snippet):
+    text = escape_markdown(" ".join(snippet.split()))
+    return text.replace("\x02", "**").replace("\x03", "**")
+
 # Main function for the history page
+@profile_page("history")
 def main():
     # Hide the deploy button/text with custom CSS
     hide_deploy_text = """
@@ -40,43 +62,77 @@ def main():
     # Check and execute scheduled jobs
     check_scheduled_jobs()
     
-    if not st.session_state.job_history:
+    with st.spinner("Loading execution history..."):
+        job_history = get_job_history()
+    
+    if 'history_pruned' in st.session_state:
+        removed, retention_days = st.session_state.pop('history_pruned')
+        st.success(f"Deleted {removed} runs older than {retention_days} days.")
+    
+    if not job_history:
         st.info("No job execution history yet.")
     else:
         # Create a filter for job names
         job_names = ["All"] + sorted(list(set([job['name'] for job in st.session_state.jobs])))
         selected_job = st.selectbox("Filter by Job", options=job_names)
         
-        # Sort history by timestamp (newest first)
-        sorted_history = sorted(st.session_state.job_history, key=lambda x: x['timestamp'], reverse=True)
+        job_lookup = {job['id']: job['name'] for job in st.session_state.jobs}
+        
+        # Full-text search over output, errors and arguments, limited by the job filter
+        sync_in_background(job_history)
+        search_cols = st.columns([3, 2])
+        with search_cols[0]:
+            search_query = st.text_input("Search Output", placeholder="Text printed by a run, e.g. Unknown host")
+        with search_cols[1]:
+            search_dates = st.date_input("Between", value=(), help="Leave empty to search all runs")
+        
+        if search_query:
+            job_ids = None
+            if selected_job != "All":
+                job_ids = [job['id'] for job in st.session_state.jobs if job['name'] == selected_job]
+            start = search_dates[0].isoformat() if len(search_dates) > 0 else None
+            end = (search_dates[1] + datetime.timedelta(days=1)).isoformat() if len(search_dates) > 1 else None
+            
+            results = search(search_query, job_ids, start, end, highlight=("\x02", "\x03"))
+            if syncing():
+                st.caption("The search index is still catching up with older runs, results may be incomplete.")
+            if not results:
+                st.info("No runs match the search.")
+            for result in results:
+                job_name = job_lookup.get(result['job_id'], 'Unknown')
+                timestamp = datetime.datetime.fromisoformat(result['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
+                st.markdown(f"`{timestamp}` **{escape_markdown(job_name)}** · {result['field']}  \n{highlight_snippet(result['snippet'])}")
+            st.divider()
         
-        # Filter by selected job if not "All"
+        # Rows of the selected job, newest first, straight from the history columns
         if selected_job != "All":
-            filtered_history = []
-            for history in sorted_history:
-                for job in st.session_state.jobs:
-                    if job['id'] == history['job_id'] and job['name'] == selected_job:
-                        filtered_history.append(history)
-                        break
-            display_history = filtered_history
+            display_rows = job_history.rows(job_ids=[job_id for job_id, name in job_lookup.items() if name == selected_job])
         else:
-            display_history = sorted_history
+            display_rows = job_history.rows()
+        
+        # Compare every run with the previous run of the same job by output hash
+        output_changed = job_history.output_changed(display_rows)
         
         # Display history entries in a table format
         history_data = []
-        for i, history in enumerate(display_history):
-            job_name = next((job['name'] for job in st.session_state.jobs if job['id'] == history['job_id']), 'Unknown')
-            timestamp = history['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
-            status = "✅ Success" if history['success'] else "❌ Failed"
+        for i, row in enumerate(display_rows):
+            status = "✅ Success" if job_history.success[row] else "❌ Failed"
+            if job_history.cached[row]:
+                status += " (cached)"
+            overlap = job_history.extra.get(row, {}).get('overlap')
+            if overlap:
+                status = OVERLAP_STATUS.get(overlap, overlap)
             
             # Get arguments if they exist, otherwise show empty string
-            arguments = history.get('arguments', '')
+            arguments = job_history.argument_values.values[job_history.arguments[row]] or ''
             
             history_data.append({
                 "id": i,  # Add an ID for reference
-                "Job Name": job_name,
-                "Timestamp": timestamp,
+                "Job Name": job_lookup.get(job_history.job_id(row), 'Unknown'),
+                "Timestamp": job_history.timestamp_of(row).strftime('%Y-%m-%d %H:%M:%S'),
                 "Status": status,
+                "Attempt": job_history.attempt[row],
+                "Output": "🔄 Changed" if row in output_changed else "",
                 # Add arguments to history display (truncated if too long)
                 "Arguments": arguments[:30] + ('...' if len(arguments) > 30 else '')
             })
@@ -122,8 +178,9 @@ def main():
             else:
                 selected_index = selected_rows[0]["id"]
                 
-            selected_history = display_history[selected_index]
-            job_name = next((job['name'] for job in st.session_state.jobs if job['id'] == selected_history['job_id']), 'Unknown')
+            selected_row = display_rows[selected_index]
+            selected_history = job_history.row(selected_row)
+            job_name = job_lookup.get(selected_history['job_id'], 'Unknown')
             
             # Display execution details
             st.subheader("Execution Details")
@@ -137,12 +194,16 @@ def main():
             
             with col2:
                 st.markdown("**Execution Time**")
-                st.markdown(f"{selected_history['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}")
+                st.markdown(f"{get_timestamp(selected_history).strftime('%Y-%m-%d %H:%M:%S')}")
             
             with col3:
                 st.markdown("**Status**")
                 status_color = "green" if selected_history['success'] else "red"
                 status_text = "Success" if selected_history['success'] else "Failed"
+                if selected_history.get('cached'):
+                    status_text += " (cached result)"
+                if selected_history.get('overlap'):
+                    status_text = OVERLAP_STATUS.get(selected_history['overlap'], selected_history['overlap'])
                 st.markdown(f"<span style='color:{status_color};'>{status_text}</span>", unsafe_allow_html=True)
             
             # Add a column for arguments
@@ -151,20 +212,69 @@ def main():
                 arguments = selected_history.get('arguments', '')
                 st.markdown(f"`{arguments}`" if arguments else "No arguments")
             
+            # Timing of the run, recorded since runs go through the run queue
+            if selected_history.get('duration') is not None or selected_history.get('queue_wait') is not None:
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.markdown("**Duration**")
+                    duration = selected_history.get('duration')
+                    st.markdown(f"{duration:.2f} s" if duration is not None else "Not recorded")
+                with col2:
+                    st.markdown("**Queue Wait**")
+                    queue_wait = selected_history.get('queue_wait')
+                    st.markdown(f"{queue_wait:.2f} s" if queue_wait is not None else "Not recorded")
+            
+            # Row counts recorded by sql runs
+            if selected_history.get('rows_changed') is not None:
+                st.markdown("**Rows**")
+                st.markdown(f"{selected_history.get('rows_returned', 0)} returned, {selected_history['rows_changed']} changed")
+            
+            # Link retries to the run they belong to
+            root_run_id = selected_history.get('parent_run_id') or selected_history.get('run_id')
+            attempts = [job_history.row(row) for row in job_history.attempts(root_run_id)]
+            if len(attempts) > 1:
+                st.markdown("**Attempts**")
+                st.dataframe(
+                    [
+                        {
+                            "Attempt": entry.get('attempt', 1),
+                            "Timestamp": get_timestamp(entry).strftime('%Y-%m-%d %H:%M:%S'),
+                            "Status": "✅ Success" if entry['success'] else "❌ Failed",
+                        }
+                        for entry in sorted(attempts, key=lambda entry: entry.get('attempt', 1))
+                    ],
+                    use_container_width=True,
+                    hide_index=True
+                )
+            
+            if selected_row in output_changed:
+                st.info("The output changed since the previous run of this job.")
+            
             # Create tabs for output and error
             tab1, tab2 = st.tabs(["Output", "Error"])
             
             with tab1:
-                if selected_history['output']:
-                    st.code(selected_history['output'])
+                output = entry_output(selected_history)
+                if output:
+                    st.code(output)
                 else:
                     st.info("No output recorded")
             
             with tab2:
-                if selected_history['error']:
-                    st.code(selected_history['error'])
+                error = entry_error(selected_history)
+                if error:
+                    st.code(error)
                 else:
                     st.info("No errors recorded")
+        
+        # Old runs are deleted together with the output no remaining run shares
+        with st.expander("History Retention"):
+            stats = blob_stats()
+            st.caption(f"{len(job_history)} runs, {stats['blobs']} distinct outputs stored in {stats['bytes'] / 1024:.1f} KB")
+            retention_days = st.number_input("Keep Runs of the Last (days)", min_value=1, value=30)
+            if st.button("Delete Older Runs"):
+                st.session_state.history_pruned = (prune_history(retention_days), retention_days)
+                st.rerun()
 
 # Run the page
 if __name__ == "__main__":
@@ -3,6 +3,12 @@ import os
 import json
 from pathlib import Path
 import re
+import sys
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from profiling import profile_page, count_read
 
 # Set page configuration - this must be the first Streamlit command
 st.set_page_config(
@@ -27,6 +33,7 @@ def load_templates():
     if templates_dir.exists():
         for template_file in templates_dir.glob("*.json"):
             try:
+                count_read("template")
                 with open(template_file, "r") as f:
                     template_data = json.load(f)
                     # Use the filename without extension as template name if not specified in the JSON
@@ -66,6 +73,7 @@ def delete_template(file_path):
         st.error(f"Error deleting template: {e}")
         return False
 
+@profile_page("templates")
 def main():
     # Hide the deploy button/text with custom CSS
     hide_deploy_text = """
@@ -218,7 +226,7 @@ def main():
             arguments = st.text_input(
                 "Script Arguments",
                 value=st.session_state.template_arguments,
-                help="Space-separated arguments to pass to the script when executed",
+                help="Arguments to pass to the script when executed, separated by spaces; quote arguments with spaces or apostrophes as in a shell",
                 key="template_arguments"
             )
             
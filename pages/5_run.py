@@ -7,7 +7,8 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import functions from main app
-from app import status_indicator, save_data, get_script_content, execute_script, check_scheduled_jobs
+from app import get_state, save_data, get_script_content, execute_script, check_scheduled_jobs
+from profiling import profile_page
 
 # Set page configuration
 st.set_page_config(
@@ -17,6 +18,7 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+@profile_page("run")
 def main():
     # Hide the deploy button/text with custom CSS
     hide_deploy_text = """
@@ -96,28 +98,38 @@ def main():
     run_args = st.text_input(
         "Arguments", 
         value=default_args,
-        help="Space-separated arguments to pass to the script"
+        help="Arguments to pass to the script, separated by spaces; quote arguments with spaces or apostrophes as in a shell"
     )
     
+    # Jobs with a result cache can be forced to start a fresh process
+    use_cache = True
+    if selected_job.get('result_cache'):
+        use_cache = not st.checkbox("Bypass Result Cache", help="Run the script even if an identical run has a cached result")
+    
     # Run button
     if st.button("Run Job Now", use_container_width=True, type="primary"):
         # Execute the script with provided arguments
-        success, output = execute_script(
+        success, output, entry = execute_script(
             selected_job['id'], 
             selected_job['script_path'], 
             selected_job['script_type'],
-            run_args
+            run_args,
+            save=False,  # Saved below together with the new last run time
+            use_cache=use_cache,
+            return_entry=True  # This run's entry, the history may already end with another session's run
         )
         
         # Store result in session state
         st.session_state.run_success = success
         st.session_state.run_output = output
+        st.session_state.run_cached = bool(entry and entry.get('cached'))
         
-        # Update last run time
-        for i, j in enumerate(st.session_state.jobs):
-            if j['id'] == selected_job['id']:
-                st.session_state.jobs[i]['last_run'] = datetime.datetime.now()
-                break
+        # Update last run time; the scheduler and other sessions read the job meanwhile
+        state = get_state()
+        with state.lock:
+            job = state.find_job(selected_job['id'])
+            if job is not None:
+                job['last_run'] = datetime.datetime.now()
         
         # Save data
         save_data()
@@ -136,7 +148,10 @@ def main():
         st.subheader("Execution Results")
         
         if st.session_state.run_success:
-            st.success("Job executed successfully!")
+            if st.session_state.get('run_cached'):
+                st.success("Job result reused from the result cache.")
+            else:
+                st.success("Job executed successfully!")
             
             # Show output if there is any
             if st.session_state.run_output:
@@ -153,6 +168,7 @@ def main():
         if st.button("Clear Results"):
             del st.session_state.run_success
             del st.session_state.run_output
+            st.session_state.pop('run_cached', None)
             st.rerun()
 
 # Run the page
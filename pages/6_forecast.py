@@ -0,0 +1,115 @@
+import streamlit as st
+import pandas as pd
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import functions from main app
+from app import check_scheduled_jobs, get_job_history, get_state
+from profiling import profile_page
+from simulator import simulate, average_durations, DEFAULT_HOURS, MAX_HOURS
+
+# Set page configuration
+st.set_page_config(
+    page_title="Capacity Forecast - TaskFlow",
+    page_icon="📊",
+    layout="wide",
+    initial_sidebar_state="collapsed"
+)
+
+@profile_page("forecast")
+def main():
+    # Hide the deploy button/text with custom CSS
+    hide_deploy_text = """
+    <style>
+        #MainMenu {visibility: hidden;}
+        header {visibility: hidden;}
+        footer {visibility: hidden;}
+    </style>
+    """
+    st.markdown(hide_deploy_text, unsafe_allow_html=True)
+
+    st.title("Capacity Forecast")
+    st.caption("A dry run of the schedule: how many runs would be going at once, based on the average duration of each job's recorded runs. Nothing is executed.")
+
+    # Check and execute scheduled jobs
+    check_scheduled_jobs()
+
+    if st.button("Back to Home", use_container_width=True):
+        st.switch_page("app.py")
+
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        hours = st.slider("Hours to Simulate", min_value=1, max_value=MAX_HOURS, value=DEFAULT_HOURS)
+    with col2:
+        st.write("")
+        if st.button("Simulate", use_container_width=True, type="primary"):
+            state = get_state()
+            with state.lock:
+                jobs = list(state.jobs)
+                next_run_times = dict(state.next_run_times)
+            with st.spinner("Simulating..."):
+                st.session_state.forecast = simulate(jobs, next_run_times, average_durations(get_job_history()), hours=hours)
+
+    forecast = st.session_state.get('forecast')
+    if forecast is None:
+        st.info("Choose how far ahead to look and press Simulate.")
+        return
+
+    st.divider()
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Simulated Runs", f"{forecast['runs']:,}")
+    col2.metric("Peak Concurrent Runs", forecast['peak'], help=f"At {forecast['peak_at']:%Y-%m-%d %H:%M:%S}; at most {forecast['max_workers']} run at once")
+    col3.metric("Queueing Windows", len(forecast['queueing']))
+
+    notes = []
+    if forecast['without_history']:
+        notes.append(f"{forecast['without_history']} jobs without recorded runs were assumed to take 1 second")
+    for reason, count in sorted(forecast['skipped'].items()):
+        notes.append(f"{count} {reason} jobs were not simulated")
+    if notes:
+        st.caption(". ".join(notes) + f". Simulated in {forecast['elapsed']:.2f}s.")
+
+    # Per-minute load
+    st.subheader("Load per Minute")
+    histogram = pd.DataFrame(forecast['histogram']).set_index('minute')
+    st.line_chart(histogram[['peak', 'average']], y_label="Runs at once")
+    st.bar_chart(histogram[['started']], y_label="Runs started")
+
+    # Load per script type against its concurrency limit
+    st.subheader("Script Types")
+    st.dataframe(
+        pd.DataFrame([
+            {"Type": script_type, "Peak": load['peak'], "Limit": load['limit'], "Seconds With Waiting Runs": load['waiting_seconds']}
+            for script_type, load in forecast['by_type'].items()
+        ]),
+        use_container_width=True,
+        hide_index=True
+    )
+
+    # Windows in which the concurrency limits would make runs wait
+    st.subheader("Queueing Windows")
+    if not forecast['queueing']:
+        st.success("The concurrency limits are never reached.")
+    else:
+        st.dataframe(
+            pd.DataFrame([
+                {
+                    "Type": window['script_type'],
+                    "From": window['start'].strftime('%Y-%m-%d %H:%M:%S'),
+                    "To": window['end'].strftime('%Y-%m-%d %H:%M:%S'),
+                    "Peak Runs": window['peak'],
+                    "Slots": window['limit'],
+                }
+                for window in forecast['queueing']
+            ]),
+            use_container_width=True,
+            hide_index=True
+        )
+
+# Run the page
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Opt-in timing instrumentation for TaskFlow page reruns.
+
+Set the SCRIPTFLOW_PROFILE=1 environment variable before starting Streamlit to
+record the wall time of every instrumented call, grouped per page rerun. The
+numbers are shown in a collapsible debug panel at the bottom of each page and
+appended to a rolling trace file (data/trace.jsonl). When profiling is off the
+decorators return the original functions, so there is no runtime cost.
+"""
+import datetime
+import functools
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+PROFILE_ENABLED = os.environ.get("SCRIPTFLOW_PROFILE", "").lower() in ("1", "true", "yes", "on")
+TRACE_FILE = Path("data") / "trace.jsonl"
+TRACE_MAX_BYTES = 1024 * 1024
+TRACE_BACKUP_COUNT = 3
+# Number of reruns kept per session for the debug panel
+RERUN_HISTORY_SIZE = 20
+
+# Each Streamlit session runs its script in its own thread, so the rerun that
+# is currently being recorded is kept per thread
+_local = threading.local()
+_trace_logger = None
+_trace_lock = threading.Lock()
+
+
+# Function to get the logger that writes the rolling trace file
+def _get_trace_logger():
+    global _trace_logger
+    # Imported here, only profiled processes write a trace
+    import logging
+    import logging.handlers
+
+    with _trace_lock:
+        if _trace_logger is None:
+            TRACE_FILE.parent.mkdir(exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                TRACE_FILE, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUP_COUNT
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger = logging.getLogger("scriptflow.trace")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            logger.addHandler(handler)
+            _trace_logger = logger
+    return _trace_logger
+
+
+# Function to append one record to the trace file
+def _write_trace(record):
+    try:
+        _get_trace_logger().info(json.dumps(record))
+    except Exception:
+        # Profiling must never break the page it is measuring
+        pass
+
+
+# Function to add one measurement to the current rerun
+def _record_call(name, elapsed):
+    rerun = getattr(_local, 'rerun', None)
+    if rerun is None:
+        # Calls outside of a page rerun (CLI, benchmarks) go straight to the trace
+        _write_trace({'type': 'call', 'name': name, 'elapsed_s': elapsed,
+                      'timestamp': datetime.datetime.now().isoformat()})
+        return
+
+    stats = rerun['calls'].setdefault(name, {'count': 0, 'total_s': 0.0, 'max_s': 0.0})
+    stats['count'] += 1
+    stats['total_s'] += elapsed
+    stats['max_s'] = max(stats['max_s'], elapsed)
+
+
+# Decorator to record the wall time of every call to a function
+def timed(name=None):
+    def decorator(func):
+        if not PROFILE_ENABLED:
+            return func
+
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _record_call(label, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+# Function to count a file read in the current rerun
+def count_read(name):
+    if not PROFILE_ENABLED:
+        return
+
+    rerun = getattr(_local, 'rerun', None)
+    if rerun is not None:
+        rerun['reads'][name] = rerun['reads'].get(name, 0) + 1
+
+
+# Function to start recording a new rerun of a page
+def begin_rerun(page):
+    _local.rerun = {
+        'page': page,
+        'timestamp': datetime.datetime.now().isoformat(),
+        'started': time.perf_counter(),
+        'calls': {},
+        'reads': {},
+    }
+
+
+# Function to finish the current rerun, write it to the trace and keep it for the panel
+def end_rerun(interrupted=False):
+    rerun = getattr(_local, 'rerun', None)
+    _local.rerun = None
+    if rerun is None:
+        return None
+
+    record = {
+        'type': 'rerun',
+        'page': rerun['page'],
+        'timestamp': rerun['timestamp'],
+        'total_s': time.perf_counter() - rerun['started'],
+        # Reruns cut short by st.rerun() or st.switch_page() still count
+        'interrupted': interrupted,
+        'calls': rerun['calls'],
+        'reads': rerun['reads'],
+    }
+    _write_trace(record)
+
+    import streamlit as st
+    reruns = st.session_state.setdefault('profile_reruns', [])
+    reruns.append(record)
+    del reruns[:-RERUN_HISTORY_SIZE]
+
+    return record
+
+
+# Function to show the collected timings in a collapsible panel
+def render_debug_panel(record):
+    import streamlit as st
+
+    with st.expander(f"🐞 Debug timings ({record['total_s'] * 1000:.1f} ms)", expanded=False):
+        st.caption(f"Page **{record['page']}** rerun at {record['timestamp']}. Trace file: `{TRACE_FILE}`")
+
+        calls = [
+            {
+                "Function": name,
+                "Calls": stats['count'],
+                "Total (ms)": round(stats['total_s'] * 1000, 2),
+                "Max (ms)": round(stats['max_s'] * 1000, 2),
+            }
+            for name, stats in sorted(record['calls'].items(), key=lambda item: item[1]['total_s'], reverse=True)
+        ]
+        if calls:
+            st.dataframe(calls, use_container_width=True, hide_index=True)
+        else:
+            st.info("No instrumented calls in this rerun.")
+
+        if record['reads']:
+            st.markdown("**File reads:** " + ", ".join(f"`{name}` × {count}" for name, count in record['reads'].items()))
+
+        previous = st.session_state.get('profile_reruns', [])
+        if len(previous) > 1:
+            st.markdown("**Recent reruns**")
+            st.dataframe(
+                [
+                    {
+                        "Page": r['page'],
+                        "Time": r['timestamp'],
+                        "Total (ms)": round(r['total_s'] * 1000, 2),
+                        "Interrupted": r['interrupted'],
+                    }
+                    for r in reversed(previous)
+                ],
+                use_container_width=True,
+                hide_index=True,
+            )
+
+
+# Decorator for a page's main() that records one rerun per call
+def profile_page(page):
+    def decorator(func):
+        if not PROFILE_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            begin_rerun(page)
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                # st.rerun() and st.switch_page() unwind with an exception;
+                # the page is gone, so only record the timings
+                end_rerun(interrupted=True)
+                raise
+            record = end_rerun()
+            render_debug_panel(record)
+            return result
+
+        return wrapper
+
+    return decorator
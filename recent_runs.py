@@ -0,0 +1,59 @@
+"""Bounded feed of the most recent runs for the home page.
+
+The home page used to search the whole history for its five most recent runs
+and look up the name of each job in the job list. RecentRuns keeps the last
+RECENT_RUNS runs in a ring buffer instead: record_entry() adds every run as it
+is recorded, and the buffer is seeded once from the history after it has
+been loaded. Entries carry the job name at the time of the run, so reading
+them costs the same however large the history and the job list are.
+"""
+import threading
+from collections import deque
+
+RECENT_RUNS = 50
+
+
+# Function to get the status of a history entry: success, failed, cached or the overlap outcome
+def run_status(entry):
+    if entry.get('cached'):
+        return 'cached'
+    return entry.get('overlap') or ('success' if entry.get('success') else 'failed')
+
+
+# Function to build the feed entry of a history entry
+def recent_run(entry, name):
+    return {
+        'job_id': entry['job_id'],
+        'name': name,
+        'timestamp': entry['timestamp'],
+        'status': run_status(entry),
+        'duration': entry.get('duration'),
+    }
+
+
+class RecentRuns:
+    """The most recent runs, newest last"""
+
+    def __init__(self, size=RECENT_RUNS):
+        self._lock = threading.Lock()
+        self._runs = deque(maxlen=size)
+        self.seeded = False
+
+    def seed(self, history, job_names):
+        """Fill the buffer with the newest runs of a loaded HistoryStore"""
+        runs = [recent_run(history.row(row), job_names.get(history.job_id(row), 'Unknown'))
+                for row in history.latest(self._runs.maxlen)]
+        with self._lock:
+            if not self.seeded:
+                self._runs.extendleft(runs)
+                self.seeded = True
+
+    def add(self, entry, name):
+        with self._lock:
+            self._runs.append(recent_run(entry, name))
+
+    def latest(self, count):
+        """Return up to count runs, newest first"""
+        with self._lock:
+            runs = list(self._runs)
+        return runs[:-count - 1:-1]
@@ -0,0 +1,131 @@
+"""Opt-in cache of script results for idempotent jobs.
+
+A job with a result_cache policy
+
+    {"ttl_seconds": 300, "input_files": ["/srv/reports/input.csv"]}
+
+reuses the output of an earlier successful run instead of starting a process,
+as long as the script content, script type, arguments and the fingerprint
+(size and modification time) of the listed input files are unchanged and the
+entry is younger than ttl_seconds (0 means it only expires when the inputs
+change). The cache is shared by all sessions of the process and evicts the
+least recently used entries once it holds too many entries or bytes.
+"""
+import glob
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+MAX_ENTRIES = 1000
+MAX_BYTES = 64 * 1024 * 1024
+
+
+# Function to validate a cache policy, returns None when caching is off
+def normalize_cache_policy(policy):
+    if not policy or not policy.get('enabled', True):
+        return None
+
+    input_files = policy.get('input_files') or []
+    if isinstance(input_files, str):
+        input_files = [line.strip() for line in input_files.splitlines() if line.strip()]
+
+    return {
+        'ttl_seconds': max(int(policy.get('ttl_seconds', 0) or 0), 0),
+        'input_files': [str(path) for path in input_files],
+    }
+
+
+# Function to fingerprint the input files of a job, globs are expanded
+def input_fingerprint(patterns):
+    fingerprint = []
+    for pattern in patterns:
+        paths = sorted(glob.glob(pattern)) or [pattern]
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                fingerprint.append((path, stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                fingerprint.append((path, None, None))
+    return fingerprint
+
+
+# Function to build the cache key of a run
+def cache_key(script_content, script_type, arguments, policy):
+    digest = hashlib.sha256()
+    digest.update(script_type.encode())
+    digest.update(b"\0")
+    digest.update(script_content.encode())
+    digest.update(b"\0")
+    digest.update(arguments.encode())
+    for path, size, mtime in input_fingerprint(policy['input_files']):
+        digest.update(f"\0{path}\0{size}\0{mtime}".encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Thread-safe LRU cache of run results bounded by entry count and total size"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['expires'] is not None and entry['expires'] <= now:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry['result']
+
+    def put(self, key, result, ttl_seconds=0):
+        size = len(result.get('output') or '') + len(result.get('error') or '')
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {
+                'result': result,
+                'size': size,
+                'expires': time.time() + ttl_seconds if ttl_seconds else None,
+            }
+            self._bytes += size
+
+            # Evict least recently used entries until both limits hold
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses}
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry['size']
+
+
+_result_cache = ResultCache()
+
+
+# Function to get the result cache shared by all sessions of this process
+def get_result_cache():
+    return _result_cache
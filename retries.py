@@ -0,0 +1,58 @@
+"""Retry policies for failed scheduled runs.
+
+A job's retry_policy decides whether a failed scheduled run is tried again
+before its next regular run:
+
+    {"max_retries": 3, "backoff_seconds": 30, "jitter": 0.2, "retry_exit_codes": [1, 75]}
+
+The n-th retry is due backoff_seconds * 2 ** (n - 1) seconds after the failure,
+spread by +/- jitter and capped at the job interval, so a retry never lands
+after the next regular run. An empty retry_exit_codes list retries any failure.
+"""
+import random
+
+DEFAULT_BACKOFF_SECONDS = 30
+DEFAULT_JITTER = 0.2
+
+
+# Function to validate a retry policy, returns None when retries are off
+def normalize_retry_policy(policy):
+    if not policy:
+        return None
+
+    max_retries = int(policy.get('max_retries', 0) or 0)
+    if max_retries <= 0:
+        return None
+
+    exit_codes = policy.get('retry_exit_codes') or []
+    if isinstance(exit_codes, str):
+        exit_codes = parse_exit_codes(exit_codes)
+
+    return {
+        'max_retries': max_retries,
+        'backoff_seconds': max(float(policy.get('backoff_seconds', DEFAULT_BACKOFF_SECONDS) or DEFAULT_BACKOFF_SECONDS), 1.0),
+        'jitter': min(max(float(policy.get('jitter', DEFAULT_JITTER) or 0), 0.0), 1.0),
+        'retry_exit_codes': [int(code) for code in exit_codes],
+    }
+
+
+# Function to parse a comma-separated list of exit codes
+def parse_exit_codes(text):
+    return [int(code) for code in text.replace(' ', '').split(',') if code]
+
+
+# Function to decide whether a failed attempt should be retried
+def should_retry(policy, attempt, returncode):
+    """attempt is the number of the attempt that just failed, starting at 1"""
+    if not policy or attempt > policy['max_retries']:
+        return False
+    if policy['retry_exit_codes'] and returncode not in policy['retry_exit_codes']:
+        return False
+    return True
+
+
+# Function to compute the delay in seconds before the next attempt
+def retry_delay(policy, attempt, interval_seconds):
+    delay = policy['backoff_seconds'] * (2 ** (attempt - 1))
+    delay *= 1 + random.uniform(-policy['jitter'], policy['jitter'])
+    return min(delay, interval_seconds)
@@ -0,0 +1,184 @@
+"""Process-wide run queue with priorities and per-interpreter concurrency limits.
+
+Every script execution is submitted here instead of being started directly, so
+a burst of heavy jobs (go, Rscript, node) cannot starve cheap shell checks.
+Each script type has its own concurrency cap and queue. Whenever a slot frees
+up, the waiting run with the best priority is started; runs of equal priority
+start in submission order, and runs that have been waiting a long time are
+promoted so low priority jobs still get their turn.
+
+Limits can be overridden in data/run_queue.json, for example:
+
+    {"max_workers": 32, "concurrency": {"go": 2, "sh": 16}}
+"""
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from pathlib import Path
+
+CONFIG_FILE = Path("data") / "run_queue.json"
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+DEFAULT_PRIORITY = "normal"
+
+# Upper bound for all concurrently running scripts
+DEFAULT_MAX_WORKERS = 32
+# Concurrency cap per script type; types not listed use DEFAULT_TYPE_LIMIT
+DEFAULT_CONCURRENCY = {
+    "sh": 16,
+    "bat": 8,
+    "cmd": 8,
+    "py": 8,
+    "pl": 8,
+    "lua": 8,
+    "sql": 8,
+    "php": 4,
+    "rb": 4,
+    "ps1": 4,
+    "js": 4,
+    "r": 2,
+    "go": 2,
+}
+DEFAULT_TYPE_LIMIT = 4
+# A waiting run is promoted by one priority class for every this many seconds
+AGING_SECONDS = 60
+
+
+class RunQueue:
+    """Dispatches submitted runs onto worker threads within the concurrency limits"""
+
+    def __init__(self, concurrency=None, max_workers=DEFAULT_MAX_WORKERS, default_limit=DEFAULT_TYPE_LIMIT):
+        self.concurrency = dict(DEFAULT_CONCURRENCY)
+        self.concurrency.update(concurrency or {})
+        self.max_workers = max_workers
+        self.default_limit = default_limit
+
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._running = {}
+        self._total_running = 0
+        self._sequence = itertools.count()
+
+    def limit_for(self, script_type):
+        return self.concurrency.get(script_type, self.default_limit)
+
+    def submit(self, script_type, func, priority=DEFAULT_PRIORITY):
+        """Queue func() to run in a slot for script_type; returns a Future whose queue_wait is set when the run starts"""
+        future = Future()
+        future.script_type = script_type
+        future.priority = priority if priority in PRIORITIES else DEFAULT_PRIORITY
+        future.queued_at = time.monotonic()
+        future.queue_wait = None
+
+        with self._lock:
+            # One FIFO per script type and priority class
+            queues = self._pending.setdefault(script_type, [deque() for _ in PRIORITIES])
+            queues[PRIORITIES[future.priority]].append((next(self._sequence), future, func))
+
+        self._dispatch()
+        return future
+
+    def stats(self):
+        """Snapshot of queued and running counts per script type"""
+        with self._lock:
+            return {
+                script_type: {
+                    'queued': sum(len(queue) for queue in self._pending.get(script_type, [])),
+                    'running': self._running.get(script_type, 0),
+                    'limit': self.limit_for(script_type),
+                }
+                for script_type in set(self._pending) | set(self._running)
+            }
+
+    def _next_runnable(self):
+        # Called with the lock held; picks the best waiting run that has a free slot.
+        # Within one FIFO the oldest run is also the most promoted one, so only the
+        # head of each queue needs to be compared.
+        now = time.monotonic()
+        best = None
+        best_key = None
+        for script_type, queues in self._pending.items():
+            if self._running.get(script_type, 0) >= self.limit_for(script_type):
+                continue
+            for priority, queue in enumerate(queues):
+                if not queue:
+                    continue
+                sequence, future, func = queue[0]
+                promotion = int((now - future.queued_at) // AGING_SECONDS)
+                key = (max(priority - promotion, 0), sequence)
+                if best_key is None or key < best_key:
+                    best, best_key = (script_type, queue), key
+        return best
+
+    def _dispatch(self):
+        while True:
+            with self._lock:
+                if self._total_running >= self.max_workers:
+                    return
+                runnable = self._next_runnable()
+                if runnable is None:
+                    return
+
+                script_type, queue = runnable
+                sequence, future, func = queue.popleft()
+                self._running[script_type] = self._running.get(script_type, 0) + 1
+                self._total_running += 1
+
+            future.queue_wait = time.monotonic() - future.queued_at
+            threading.Thread(target=self._run, args=(script_type, future, func), daemon=True).start()
+
+    def _run(self, script_type, future, func):
+        result = error = None
+        started = False
+        try:
+            started = future.set_running_or_notify_cancel()
+            if started:
+                try:
+                    result = func()
+                except BaseException as e:
+                    error = e
+        finally:
+            # The slot is freed before the future completes: its callbacks, such as recording
+            # the run and saving the history, run on this thread and must not hold up other runs
+            with self._lock:
+                self._running[script_type] -= 1
+                self._total_running -= 1
+            self._dispatch()
+
+        if started:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+_run_queue = None
+_run_queue_lock = threading.Lock()
+
+
+# Function to load the optional limits override
+def load_config():
+    if not CONFIG_FILE.exists():
+        return {}
+    try:
+        with open(CONFIG_FILE, 'r') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+# Function to get the run queue shared by all sessions of this process
+def get_run_queue():
+    global _run_queue
+    with _run_queue_lock:
+        if _run_queue is None:
+            config = load_config()
+            _run_queue = RunQueue(
+                concurrency=config.get('concurrency'),
+                max_workers=config.get('max_workers', DEFAULT_MAX_WORKERS),
+                default_limit=config.get('default_limit', DEFAULT_TYPE_LIMIT),
+            )
+    return _run_queue
@@ -0,0 +1,456 @@
+"""Command line interface for TaskFlow.
+
+Run it from the TaskFlow directory so it uses the same data/ and scripts/
+folders as the web interface:
+
+    python scriptflow.py list
+    python scriptflow.py add "Backup" --script backup.sh --every 6 --unit hours
+    python scriptflow.py disable Backup
+    python scriptflow.py trigger Backup --args "--full"
+    python scriptflow.py history Backup -n 20 --follow
+    python scriptflow.py scheduler
+    python scriptflow.py import-jobs jobs.csv
+    python scriptflow.py export-jobs --format jsonl --output jobs.jsonl
+    python scriptflow.py worker --labels linux,gpu
+    python scriptflow.py simulate --hours 24
+    python scriptflow.py export-history --output data/history_parquet
+
+Commands only import the modules they need, and the core module they share
+with the web interface imports neither Streamlit nor pandas, so a command
+starts in a few tens of milliseconds and can be called from cron jobs and
+shell loops. Jobs are named by their id, the start of their id or their name.
+"""
+import argparse
+import datetime
+import signal
+import sys
+import time
+from pathlib import Path
+
+# Seconds between two checks of the schedule by the scheduler command
+SCHEDULER_TICK_SECONDS = 1.0
+# Seconds between two looks at history.json by history --follow
+FOLLOW_SECONDS = 1.0
+# Shortest id prefix accepted in place of a full job id
+MIN_ID_PREFIX = 4
+
+
+# Function to find jobs by id, id prefix or name; exits with an error when one matches no job or several
+def find_jobs(jobs, references):
+    found = []
+    for reference in references:
+        matches = [job for job in jobs if job['id'] == reference]
+        if not matches and len(reference) >= MIN_ID_PREFIX:
+            matches = [job for job in jobs if job['id'].startswith(reference)]
+        if not matches:
+            matches = [job for job in jobs if job['name'] == reference]
+        if not matches:
+            sys.exit(f"No job matches '{reference}'")
+        if len(matches) > 1:
+            sys.exit(f"'{reference}' matches {len(matches)} jobs, use the job id instead")
+        found.append(matches[0])
+    return found
+
+
+# Function to format a datetime for the command line
+def format_time(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else "-"
+
+
+# Function to format a history entry as one line
+def format_run(entry, names):
+    from recent_runs import run_status
+
+    duration = f"{entry['duration']:.2f}s" if entry.get('duration') is not None else "-"
+    arguments = f"  {entry['arguments']}" if entry.get('arguments') else ""
+    return f"{format_time(entry['timestamp'])}  {run_status(entry):<9}  {duration:>8}  {names.get(entry['job_id'], 'Unknown')}{arguments}"
+
+
+# Command to list the jobs
+def cmd_list(args):
+    import json
+    import core
+
+    state = core.load_data(history=False)
+    jobs = state.jobs
+    if args.enabled:
+        jobs = [job for job in jobs if job['enabled']]
+    if args.disabled:
+        jobs = [job for job in jobs if not job['enabled']]
+
+    for job in jobs:
+        next_run = state.next_run_times.get(job['id']) if job['enabled'] and not job.get('file_trigger') else None
+        last_status = (job.get('stats') or {}).get('last_status')
+        if args.json:
+            print(json.dumps({
+                'id': job['id'],
+                'name': job['name'],
+                'enabled': job['enabled'],
+                'script_type': job['script_type'],
+                'interval_seconds': None if job.get('file_trigger') else job['interval_seconds'],
+                'last_run': job['last_run'].isoformat() if job['last_run'] else None,
+                'next_run': next_run.isoformat() if next_run else None,
+                'last_status': last_status,
+            }))
+            continue
+        schedule = "on file change" if job.get('file_trigger') else f"every {job['interval_value']} {job['interval_unit']}"
+        print(f"{job['id'][:8]}  {'on ' if job['enabled'] else 'off'}  {job['script_type']:<4} {schedule:<18} "
+              f"last {format_time(job['last_run'])} ({last_status or 'never run'})  next {format_time(next_run)}  {job['name']}")
+    return 0
+
+
+# Command to add a job
+def cmd_add(args):
+    import core
+    from job_io import SCRIPT_TYPES
+
+    if args.script:
+        content = sys.stdin.read() if args.script == "-" else Path(args.script).read_text()
+    else:
+        content = args.content
+    script_type = args.type or (Path(args.script).suffix.lstrip(".").lower() if args.script and args.script != "-" else None)
+    if script_type not in SCRIPT_TYPES:
+        print(f"Error: pass --type, one of {', '.join(SCRIPT_TYPES)}", file=sys.stderr)
+        return 1
+
+    core.load_data(history=False)
+    try:
+        job_id = core.add_job(args.name, content, script_type, args.every, args.unit, not args.disabled, args.args, args.priority)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(job_id)
+    return 0
+
+
+# Command to enable or disable jobs
+def cmd_set_enabled(args):
+    import core
+
+    state = core.load_data(history=False)
+    jobs = find_jobs(state.jobs, args.jobs)
+    core.set_jobs_enabled([job['id'] for job in jobs], args.enabled)
+    for job in jobs:
+        print(f"{'Enabled' if args.enabled else 'Disabled'} {job['name']}")
+    return 0
+
+
+# Command to run a job now and wait for the result
+def cmd_trigger(args):
+    import core
+
+    state = core.load_data()
+    job = find_jobs(state.jobs, [args.job])[0]
+    arguments = job.get('script_arguments', "") if args.args is None else args.args
+    success, output = core.execute_script(job['id'], job['script_path'], job['script_type'], arguments, save=False, use_cache=not args.no_cache)
+    # Saved once with the run, as a run from the jobs page
+    job['last_run'] = datetime.datetime.now()
+    core.save_data()
+
+    sys.stdout.write(output if output.endswith("\n") or not output else output + "\n")
+    return 0 if success else 1
+
+
+# Command to print the latest runs, and optionally keep printing new ones
+def cmd_history(args):
+    import core
+    from output_store import pack_entry
+    from storage import HistoryLoader, file_stamp
+
+    state = core.load_data(history=False)
+    names = {job['id']: job['name'] for job in state.jobs}
+    job_ids = [job['id'] for job in find_jobs(state.jobs, [args.job])] if args.job else None
+
+    # Read directly rather than through the shared state, so --follow can read the file again
+    def read_history():
+        try:
+            return HistoryLoader(core.HISTORY_FILE, transform=pack_entry).result(), file_stamp(core.HISTORY_FILE)
+        except FileNotFoundError:
+            return None, None
+
+    history, stamp = read_history()
+    if history is not None:
+        for row in reversed(history.rows(job_ids)[:args.lines]):
+            print(format_run(history.row(row), names))
+    if not args.follow:
+        return 0
+
+    # history.json only grows at the end, except when old runs are pruned
+    seen = len(history) if history is not None else 0
+    stop = []
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.append(True))
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.append(True))
+    while not stop:
+        time.sleep(FOLLOW_SECONDS)
+        try:
+            changed = file_stamp(core.HISTORY_FILE) != stamp
+        except FileNotFoundError:
+            changed = False
+        if not changed:
+            continue
+
+        history, stamp = read_history()
+        if history is None:
+            continue
+        if len(history) < seen:
+            seen = len(history)
+        wanted = set(job_ids) if job_ids else None
+        for row in range(seen, len(history)):
+            if wanted is None or history.job_id(row) in wanted:
+                print(format_run(history.row(row), names), flush=True)
+        seen = len(history)
+    return 0
+
+
+# Command to run scheduled jobs until stopped, without the web interface
+def cmd_scheduler(args):
+    import core
+
+    stop = []
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.append(True))
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.append(True))
+
+    core.load_data()
+    history = core.get_job_history()
+    state = core.get_state()
+    print(f"Scheduling {sum(1 for job in state.jobs if job['enabled'])} enabled jobs, Ctrl+C to stop", flush=True)
+
+    # Function to print the runs recorded since the last call
+    def print_new_runs(seen):
+        names = {job['id']: job['name'] for job in state.jobs}
+        history = core.get_job_history()
+        for row in range(min(seen, len(history)), len(history)):
+            print(format_run(history.row(row), names), flush=True)
+        return len(history)
+
+    seen = len(history)
+    while not stop:
+        started = time.monotonic()
+        # Starts the due runs; they are recorded in the background as they finish
+        core.check_scheduled_jobs()
+        seen = print_new_runs(seen)
+        time.sleep(max(args.tick - (time.monotonic() - started), 0))
+
+    # Runs still going are recorded before exiting, a second Ctrl+C leaves them
+    if state.unrecorded_runs:
+        print(f"Waiting for {len(state.unrecorded_runs)} runs to finish", flush=True)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        state.wait_for_runs()
+        print_new_runs(seen)
+    return 0
+
+
+# Command to import jobs from a JSONL or CSV file
+def cmd_import_jobs(args):
+    import core
+    from job_io import detect_format
+
+    fmt = args.format or detect_format(args.file)
+    text = sys.stdin.read() if args.file == "-" else Path(args.file).read_text()
+
+    try:
+        job_ids, errors = core.import_jobs(text, fmt)
+    except ValueError as e:
+        print(f"Error reading {args.file}: {e}", file=sys.stderr)
+        return 1
+
+    for error in errors:
+        print(f"Skipped {error}", file=sys.stderr)
+    print(f"Imported {len(job_ids)} jobs")
+    return 1 if errors and not job_ids else 0
+
+
+# Command to export all jobs to a JSONL or CSV file
+def cmd_export_jobs(args):
+    import core
+    from job_io import detect_format
+
+    fmt = args.format or (detect_format(args.output) if args.output else "jsonl")
+    text = core.export_jobs(fmt)
+
+    if args.output:
+        Path(args.output).write_text(text)
+        print(f"Exported {len(core.get_state().jobs)} jobs to {args.output}")
+    else:
+        sys.stdout.write(text)
+    return 0
+
+
+# Command to execute runs of jobs with a worker label until stopped
+def cmd_worker(args):
+    import core
+    from work_queue import Worker
+
+    worker = Worker(core.submit_run, args.labels, concurrency=args.concurrency, lease_seconds=args.lease)
+
+    # Finish the runs already claimed on Ctrl+C or when systemd stops the worker
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: worker.stop())
+
+    labels = ", ".join(worker.labels + ["any"])
+    print(f"Worker {worker.id} claiming runs labelled {labels}", flush=True)
+    worker.run(drain=args.drain)
+    print(f"Worker {worker.id} stopped after {worker.completed} runs")
+    return 0
+
+
+# Command to list the workers and the queued runs
+def cmd_workers(args):
+    from work_queue import worker_status
+
+    workers, runs = worker_status()
+    now = time.time()
+    for worker in workers:
+        seen = datetime.timedelta(seconds=int(now - worker['last_seen']))
+        print(f"{worker['id']}  labels: {', '.join(worker['labels']) or '-'}  running: {worker['running']}  last seen {seen} ago")
+    if not workers:
+        print("No workers running")
+    for (label, state), count in sorted(runs.items()):
+        print(f"{label}: {count} {state}")
+    return 0
+
+
+# Command to forecast the load of the schedule over the next hours
+def cmd_simulate(args):
+    import core
+    from simulator import simulate, average_durations, DEFAULT_HOURS
+
+    core.load_data()
+    state = core.get_state()
+    with state.lock:
+        jobs = list(state.jobs)
+        next_run_times = dict(state.next_run_times)
+    hours = DEFAULT_HOURS if args.hours is None else args.hours
+    forecast = simulate(jobs, next_run_times, average_durations(core.get_job_history()), hours=hours)
+
+    print(f"Simulated {forecast['runs']} runs over {forecast['hours']:g} hours in {forecast['elapsed']:.2f}s")
+    print(f"Peak: {forecast['peak']} runs at once at {forecast['peak_at']:%Y-%m-%d %H:%M:%S} (limit {forecast['max_workers']})")
+    for script_type, load in forecast['by_type'].items():
+        print(f"  {script_type}: peak {load['peak']}, limit {load['limit']}, {load['waiting_seconds']}s with waiting runs")
+    if forecast['without_history']:
+        print(f"{forecast['without_history']} jobs without recorded runs were assumed to take 1s")
+    for reason, count in sorted(forecast['skipped'].items()):
+        print(f"Not simulated: {count} {reason} jobs")
+
+    if forecast['queueing']:
+        print(f"Runs would wait in {len(forecast['queueing'])} windows:")
+    for window in forecast['queueing'][:args.windows]:
+        print(f"  {window['start']:%Y-%m-%d %H:%M:%S} - {window['end']:%H:%M:%S}  {window['script_type']}: {window['peak']} runs for {window['limit']} slots")
+    if len(forecast['queueing']) > args.windows:
+        print(f"  ... and {len(forecast['queueing']) - args.windows} more")
+
+    if args.histogram:
+        import pandas as pd
+        pd.DataFrame(forecast['histogram']).to_csv(args.histogram, index=False)
+        print(f"Wrote the per-minute load to {args.histogram}")
+    return 0
+
+
+# Command to append the runs not exported yet to a Parquet dataset
+def cmd_export_history(args):
+    from history_export import sync_history, EXPORT_DIR
+
+    output = args.output or EXPORT_DIR
+    try:
+        result = sync_history(output, full=args.full)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(f"Exported {result['runs']} new runs to {output} in {result['seconds']:.1f}s ({result['total']} in total)")
+    return 0
+
+
+def build_parser():
+    # Only light modules here; numpy and pyarrow are imported by the commands that use them
+    from job_io import FORMATS, INTERVAL_UNITS
+    from run_queue import PRIORITIES, DEFAULT_PRIORITY
+    from work_queue import DEFAULT_CONCURRENCY, DEFAULT_LEASE_SECONDS
+
+    parser = argparse.ArgumentParser(prog="scriptflow", description="Manage TaskFlow jobs from the command line.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="List the jobs with their last result and next run")
+    list_parser.add_argument("--json", action="store_true", help="Print one JSON object per job")
+    list_filter = list_parser.add_mutually_exclusive_group()
+    list_filter.add_argument("--enabled", action="store_true", help="Only list enabled jobs")
+    list_filter.add_argument("--disabled", action="store_true", help="Only list disabled jobs")
+    list_parser.set_defaults(func=cmd_list)
+
+    add_parser = subparsers.add_parser("add", help="Add a job, prints its id")
+    add_parser.add_argument("name", help="Name of the job")
+    add_script = add_parser.add_mutually_exclusive_group(required=True)
+    add_script.add_argument("--script", help="File with the script, or - to read it from stdin")
+    add_script.add_argument("--content", help="The script itself")
+    add_parser.add_argument("--type", help="Script type (taken from the extension of --script by default)")
+    add_parser.add_argument("--every", type=int, default=1, help="Interval between runs (default: 1)")
+    add_parser.add_argument("--unit", choices=INTERVAL_UNITS, default="minutes", help="Unit of the interval (default: minutes)")
+    add_parser.add_argument("--args", default="", help="Default arguments passed to the script")
+    add_parser.add_argument("--priority", choices=list(PRIORITIES), default=DEFAULT_PRIORITY, help=f"Priority in the run queue (default: {DEFAULT_PRIORITY})")
+    add_parser.add_argument("--disabled", action="store_true", help="Add the job without scheduling it")
+    add_parser.set_defaults(func=cmd_add)
+
+    enable_parser = subparsers.add_parser("enable", help="Schedule jobs again")
+    enable_parser.add_argument("jobs", nargs="+", help="Ids, id prefixes or names of the jobs")
+    enable_parser.set_defaults(func=cmd_set_enabled, enabled=True)
+
+    disable_parser = subparsers.add_parser("disable", help="Stop scheduling jobs")
+    disable_parser.add_argument("jobs", nargs="+", help="Ids, id prefixes or names of the jobs")
+    disable_parser.set_defaults(func=cmd_set_enabled, enabled=False)
+
+    trigger_parser = subparsers.add_parser("trigger", help="Run a job now and print its output; exits with 1 if the run failed")
+    trigger_parser.add_argument("job", help="Id, id prefix or name of the job")
+    trigger_parser.add_argument("--args", help="Arguments for this run (the job's default arguments otherwise)")
+    trigger_parser.add_argument("--no-cache", action="store_true", help="Run even if the job's result cache has a result")
+    trigger_parser.set_defaults(func=cmd_trigger)
+
+    history_parser = subparsers.add_parser("history", help="Print the latest runs, oldest first")
+    history_parser.add_argument("job", nargs="?", help="Only runs of this job (id, id prefix or name)")
+    history_parser.add_argument("--lines", "-n", type=int, default=10, help="Number of runs to print (default: 10)")
+    history_parser.add_argument("--follow", "-f", action="store_true", help="Keep printing runs as they are recorded")
+    history_parser.set_defaults(func=cmd_history)
+
+    scheduler_parser = subparsers.add_parser("scheduler", help="Run scheduled jobs until stopped, without the web interface")
+    scheduler_parser.add_argument("--tick", type=float, default=SCHEDULER_TICK_SECONDS, help=f"Seconds between checks of the schedule (default: {SCHEDULER_TICK_SECONDS:g})")
+    scheduler_parser.set_defaults(func=cmd_scheduler)
+
+    import_parser = subparsers.add_parser("import-jobs", help="Create jobs from a JSONL or CSV file")
+    import_parser.add_argument("file", help="File to import, or - to read from stdin")
+    import_parser.add_argument("--format", choices=FORMATS, help="File format (detected from the extension by default)")
+    import_parser.set_defaults(func=cmd_import_jobs)
+
+    export_parser = subparsers.add_parser("export-jobs", help="Write all jobs, including script content, to a file")
+    export_parser.add_argument("--output", "-o", help="Output file (stdout by default)")
+    export_parser.add_argument("--format", choices=FORMATS, help="File format (detected from the extension by default)")
+    export_parser.set_defaults(func=cmd_export_jobs)
+
+    worker_parser = subparsers.add_parser("worker", help="Execute runs of jobs with a worker label")
+    worker_parser.add_argument("--labels", default="", help="Comma-separated labels of the jobs this worker runs; every worker also runs jobs labelled any")
+    worker_parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help=f"Maximum number of runs at the same time (default: {DEFAULT_CONCURRENCY})")
+    worker_parser.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, help=f"Seconds after which the run of a worker that stopped responding is handed to another worker (default: {DEFAULT_LEASE_SECONDS})")
+    worker_parser.add_argument("--drain", action="store_true", help="Exit once there is nothing left to run")
+    worker_parser.set_defaults(func=cmd_worker)
+
+    workers_parser = subparsers.add_parser("workers", help="List the running workers and the queued runs")
+    workers_parser.set_defaults(func=cmd_workers)
+
+    simulate_parser = subparsers.add_parser("simulate", help="Forecast the load of the schedule without running anything")
+    simulate_parser.add_argument("--hours", type=float, help="Hours to simulate (default: one day)")
+    simulate_parser.add_argument("--windows", type=int, default=20, help="Number of queueing windows to print (default: 20)")
+    simulate_parser.add_argument("--histogram", help="Write the per-minute load to this CSV file")
+    simulate_parser.set_defaults(func=cmd_simulate)
+
+    export_history_parser = subparsers.add_parser("export-history", help="Append new runs to a Parquet dataset partitioned by day and job")
+    export_history_parser.add_argument("--output", "-o", help="Dataset directory (default: data/history_parquet)")
+    export_history_parser.add_argument("--full", action="store_true", help="Remove the exported runs and export the whole history again")
+    export_history_parser.set_defaults(func=cmd_export_history)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""Full-text search over the output, errors and arguments of runs.
+
+The index is an SQLite database (data/search.db) with an FTS5 table holding
+every distinct text once, keyed like the output blobs, and a runs table that
+points each run at the texts of its output, error and arguments. A search
+matches the distinct texts first and then joins the runs that use them, so a
+job that printed the same output a million times adds one indexed document
+and a million small rows rather than a million documents.
+
+Runs are added as they finish; sync_index() catches up with runs recorded
+before the index existed or by another process, and drops pruned runs. Every
+run is indexed once under its run key however often it is added. The sync
+table remembers the first run of the history and the last run up to which the
+index is known to be complete, so a catch-up only looks at the runs after it
+unless old runs were pruned.
+"""
+import sqlite3
+import threading
+from pathlib import Path
+
+from output_store import entry_text, text_hash
+
+INDEX_FILE = Path("data") / "search.db"
+DEFAULT_LIMIT = 50
+# Words of context around a match in snippets
+SNIPPET_TOKENS = 12
+FIELDS = ("output", "error", "arguments")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS texts (id INTEGER PRIMARY KEY, hash TEXT UNIQUE NOT NULL);
+CREATE VIRTUAL TABLE IF NOT EXISTS texts_fts USING fts5(body);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    run_key TEXT NOT NULL,
+    job_id TEXT,
+    timestamp TEXT,
+    output_id INTEGER,
+    error_id INTEGER,
+    arguments_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS sync (id INTEGER PRIMARY KEY CHECK (id = 1), first_key TEXT, synced_key TEXT);
+"""
+# Indexes written before run keys were unique may hold a run more than once
+UNIQUE_KEYS = """
+DELETE FROM runs WHERE id NOT IN (SELECT MIN(id) FROM runs GROUP BY run_key);
+CREATE UNIQUE INDEX IF NOT EXISTS runs_key ON runs (run_key);
+"""
+INDEXES = """
+CREATE INDEX IF NOT EXISTS runs_output ON runs (output_id, timestamp);
+CREATE INDEX IF NOT EXISTS runs_error ON runs (error_id, timestamp);
+CREATE INDEX IF NOT EXISTS runs_arguments ON runs (arguments_id, timestamp);
+"""
+# Catch-ups larger than this drop the run indexes and rebuild them afterwards, which is much faster
+REBUILD_THRESHOLD = 100000
+
+_schema_lock = threading.Lock()
+_schema_ready = set()
+_sync_lock = threading.Lock()
+_sync_thread = None
+
+
+# Function to open the index, creating its tables on first use
+def connect(timeout=30):
+    INDEX_FILE.parent.mkdir(exist_ok=True)
+    db = sqlite3.connect(INDEX_FILE, timeout=timeout)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute("PRAGMA cache_size=-65536")
+    with _schema_lock:
+        if str(INDEX_FILE) not in _schema_ready:
+            db.executescript(SCHEMA + INDEXES)
+            if not db.execute("SELECT 1 FROM sqlite_master WHERE name = 'runs_key'").fetchone():
+                db.executescript(UNIQUE_KEYS)
+            _schema_ready.add(str(INDEX_FILE))
+    return db
+
+
+# Function to get the key a history entry is indexed under
+def run_key(entry):
+    if entry.get('run_id'):
+        return entry['run_id']
+    # History entries from before runs had an id
+    timestamp = entry['timestamp']
+    return f"{entry['job_id']}@{timestamp if isinstance(timestamp, str) else timestamp.isoformat()}"
+
+
+# Function to get the id of an indexed text, adding it to the index if it is new
+def _text_id(db, digest, text):
+    row = db.execute("SELECT id FROM texts WHERE hash = ?", (digest,)).fetchone()
+    if row:
+        return row[0]
+    # Another connection may have added the text since the lookup
+    cursor = db.execute("INSERT OR IGNORE INTO texts (hash) VALUES (?)", (digest,))
+    if not cursor.rowcount:
+        return db.execute("SELECT id FROM texts WHERE hash = ?", (digest,)).fetchone()[0]
+    db.execute("INSERT INTO texts_fts (rowid, body) VALUES (?, ?)", (cursor.lastrowid, text))
+    return cursor.lastrowid
+
+
+# Function to add history entries to an open index
+def _insert_runs(db, entries):
+    # This loop runs once per run on a catch-up, so ids are cached by hash and by arguments string
+    ids = {None: None}
+    argument_ids = {'': None}
+    rows = []
+    for entry in entries:
+        output_hash = entry.get('output_hash')
+        if output_hash not in ids:
+            ids[output_hash] = _text_id(db, output_hash, entry_text(entry, 'output'))
+        error_hash = entry.get('error_hash')
+        if error_hash not in ids:
+            ids[error_hash] = _text_id(db, error_hash, entry_text(entry, 'error'))
+        arguments = entry.get('arguments') or ''
+        if arguments not in argument_ids:
+            argument_ids[arguments] = _text_id(db, text_hash(arguments), arguments)
+
+        timestamp = entry['timestamp']
+        rows.append((
+            run_key(entry),
+            entry['job_id'],
+            timestamp if isinstance(timestamp, str) else timestamp.isoformat(),
+            ids[output_hash],
+            ids[error_hash],
+            argument_ids[arguments],
+        ))
+
+    # A run added by record_entry() while a catch-up adds it too is kept once
+    db.executemany("INSERT OR IGNORE INTO runs (run_key, job_id, timestamp, output_id, error_id, arguments_id) VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+
+# Function to index newly finished runs
+def index_runs(entries, timeout=30):
+    db = connect(timeout)
+    try:
+        with db:
+            _insert_runs(db, entries)
+    finally:
+        db.close()
+
+
+# Function to find the runs of the history that are not indexed, using the sync table when it still applies
+def _missing_runs(db, entries, count):
+    """Return the missing entries among the first count and the ids of indexed runs no longer in the history"""
+    first_key = run_key(entries[0]) if count else None
+    row = db.execute("SELECT first_key, synced_key FROM sync WHERE id = 1").fetchone()
+    if row is not None and row[0] == first_key and row[1] is not None:
+        # Nothing was pruned since the last catch-up; only runs recorded after it can be missing
+        start = None
+        for index in range(count - 1, -1, -1):
+            if run_key(entries[index]) == row[1]:
+                start = index + 1
+                break
+        if start is not None:
+            missing = []
+            for index in range(start, count):
+                entry = entries[index]
+                if not db.execute("SELECT 1 FROM runs WHERE run_key = ?", (run_key(entry),)).fetchone():
+                    missing.append(entry)
+            return missing, []
+
+    # First catch-up or old runs were pruned: compare all keys
+    indexed = {key: row_id for row_id, key in db.execute("SELECT id, run_key FROM runs")}
+    keys = set()
+    missing = []
+    for index in range(count):
+        entry = entries[index]
+        key = run_key(entry)
+        keys.add(key)
+        if key not in indexed:
+            missing.append(entry)
+    return missing, [row_id for key, row_id in indexed.items() if key not in keys]
+
+
+# Function to bring the index in line with the history, returns the number of runs added or removed
+def sync_index(entries):
+    db = connect()
+    try:
+        # The history may grow while this runs; runs after this point are indexed as they are recorded
+        count = len(entries)
+        missing, stale = _missing_runs(db, entries, count)
+
+        with db:
+            rebuild = len(missing) > REBUILD_THRESHOLD
+            if rebuild:
+                for name in ("runs_output", "runs_error", "runs_arguments"):
+                    db.execute(f"DROP INDEX IF EXISTS {name}")
+            _insert_runs(db, missing)
+            if rebuild:
+                for statement in INDEXES.strip().splitlines():
+                    db.execute(statement)
+            db.executemany("DELETE FROM runs WHERE id = ?", ((row_id,) for row_id in stale))
+            if stale:
+                # Texts no remaining run uses
+                unused = "SELECT id FROM texts WHERE id NOT IN (SELECT output_id FROM runs WHERE output_id IS NOT NULL UNION SELECT error_id FROM runs WHERE error_id IS NOT NULL UNION SELECT arguments_id FROM runs WHERE arguments_id IS NOT NULL)"
+                db.execute(f"DELETE FROM texts_fts WHERE rowid IN ({unused})")
+                db.execute(f"DELETE FROM texts WHERE id IN ({unused})")
+            db.execute(
+                "INSERT OR REPLACE INTO sync (id, first_key, synced_key) VALUES (1, ?, ?)",
+                (run_key(entries[0]), run_key(entries[count - 1])) if count else (None, None)
+            )
+        return len(missing) + len(stale)
+    finally:
+        db.close()
+
+
+# Function to catch up with the history in a background thread, so pages are not blocked
+def sync_in_background(entries):
+    global _sync_thread
+    with _sync_lock:
+        if _sync_thread is not None and _sync_thread.is_alive():
+            return
+        _sync_thread = threading.Thread(target=sync_index, args=(entries,), name="search-index-sync", daemon=True)
+        _sync_thread.start()
+
+
+# Function to tell whether a background catch-up is still running
+def syncing():
+    return _sync_thread is not None and _sync_thread.is_alive()
+
+
+# Function to search the index, newest matches first
+def search(query, job_ids=None, start=None, end=None, limit=DEFAULT_LIMIT, highlight=("**", "**")):
+    """Return dicts with run_key, job_id, timestamp, field and a snippet with the matches wrapped in highlight
+
+    start and end are ISO timestamps; job_ids limits the search to some jobs.
+    Queries use the FTS5 syntax; a query that is not valid FTS5 is searched as a phrase.
+    """
+    filters = []
+    params = []
+    if job_ids is not None:
+        filters.append(f"r.job_id IN ({', '.join('?' for _ in job_ids)})")
+        params.extend(job_ids)
+    if start:
+        filters.append("r.timestamp >= ?")
+        params.append(start)
+    if end:
+        filters.append("r.timestamp < ?")
+        params.append(end)
+    where = " AND ".join(filters) or "1"
+
+    branches = " UNION ALL ".join(
+        f"SELECT r.run_key, r.job_id, r.timestamp, '{field}' AS field, h.snippet "
+        f"FROM hits h JOIN runs r ON r.{field}_id = h.id WHERE {where}"
+        for field in FIELDS
+    )
+    sql = (
+        f"WITH hits AS (SELECT rowid AS id, snippet(texts_fts, 0, ?, ?, ' … ', {SNIPPET_TOKENS}) AS snippet "
+        f"FROM texts_fts WHERE texts_fts MATCH ?) "
+        f"SELECT * FROM ({branches}) ORDER BY timestamp DESC LIMIT ?"
+    )
+
+    db = connect()
+    try:
+        try:
+            rows = db.execute(sql, [*highlight, query] + params * len(FIELDS) + [limit]).fetchall()
+        except sqlite3.OperationalError:
+            phrase = '"' + query.replace('"', '""') + '"'
+            rows = db.execute(sql, [*highlight, phrase] + params * len(FIELDS) + [limit]).fetchall()
+    finally:
+        db.close()
+
+    return [
+        {'run_key': key, 'job_id': job_id, 'timestamp': timestamp, 'field': field, 'snippet': snippet}
+        for key, job_id, timestamp, field, snippet in rows
+    ]
@@ -0,0 +1,112 @@
+"""Jobs, history and schedule state shared by all browser sessions.
+
+Every Streamlit session used to load jobs.json and history.json into its own
+st.session_state, so each open tab held a full copy of the data and parsed the
+files again. SharedState holds one copy per process instead; load_data() only
+points st.session_state.jobs, job_history, next_run_times and retry_times at
+the shared objects, so a session costs a few references however large the
+history is.
+
+Changes made through one session are visible to all others at once. Every
+save bumps the version; sessions compare it with the version they last saw to
+notice changes made elsewhere, and wait_for_change() blocks until the next
+one. Code that has to read and update the schedule in one step (for example
+claiming a due job so two sessions do not both run it) holds the lock while
+doing so.
+"""
+import threading
+from pathlib import Path
+
+from recent_runs import RecentRuns
+
+
+class SharedState:
+    """One process-wide copy of the jobs, history and schedule of a data directory"""
+
+    def __init__(self):
+        # Reentrant, so helpers that take it can be called by code already holding it. save_data() must
+        # not be called with it held: the group commit writing the files may be running in another thread
+        self.lock = threading.RLock()
+        self._condition = threading.Condition(self.lock)
+        self.jobs = None
+        self.history = None
+        self.history_loader = None
+        self.history_snapshot = None
+        self.next_run_times = {}
+        self.retry_times = {}
+        # Firings of jobs with the queue overlap policy waiting for the previous run
+        self.queued_runs = {}
+        # Futures of scheduled runs that were started but are not recorded in the history yet
+        self.unrecorded_runs = set()
+        # Newest runs for the home page, seeded once the history is loaded
+        self.recent_runs = RecentRuns()
+        # storage.GroupCommit that writes the data files, created by the first save
+        self.commits = None
+        # Size and mtime of jobs.json when this process last read or wrote it
+        self.jobs_stamp = None
+        # The same for history.json, and the cutoff of the latest prune; see core.merge_history()
+        self.history_stamp = None
+        self.history_pruned_before = None
+        self.version = 0
+        self._job_index = {}
+
+    def find_job(self, job_id):
+        """Return the job with the given id or None; constant time unless the job list changed since the last lookup"""
+        jobs = self.jobs or []
+        index = self._job_index.get(job_id)
+        if index is None or index >= len(jobs) or jobs[index]['id'] != job_id:
+            self._job_index = {job['id']: index for index, job in enumerate(jobs)}
+            index = self._job_index.get(job_id)
+        return jobs[index] if index is not None else None
+
+    def changed(self):
+        """Record a change for the other sessions, returns the new version"""
+        with self._condition:
+            self.version += 1
+            self._condition.notify_all()
+            return self.version
+
+    def run_recorded(self, future):
+        """Forget a scheduled run once it is recorded, waking wait_for_runs()"""
+        with self._condition:
+            self.unrecorded_runs.discard(future)
+            self._condition.notify_all()
+
+    def wait_for_runs(self, timeout=None):
+        """Block until every scheduled run started is recorded or the timeout passes, returns whether they are"""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self.unrecorded_runs, timeout)
+
+    def wait_for_change(self, version, timeout=None):
+        """Block until the version differs from the given one or the timeout passes, returns the version"""
+        with self._condition:
+            self._condition.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+
+_states = {}
+_states_lock = threading.Lock()
+
+
+# Function to get the key shared state is kept under; one state per pair of data files
+def _state_key(jobs_file, history_file):
+    return (str(Path(jobs_file).resolve()), str(Path(history_file).resolve()))
+
+
+# Function to get the shared state of a data directory, creating it on first use
+def get_shared_state(jobs_file, history_file):
+    key = _state_key(jobs_file, history_file)
+    with _states_lock:
+        state = _states.get(key)
+        if state is None:
+            state = _states[key] = SharedState()
+    return state
+
+
+# Function to drop the shared state so the next load reads the files again
+def reset_shared_state(jobs_file=None, history_file=None):
+    with _states_lock:
+        if jobs_file is None:
+            _states.clear()
+        else:
+            _states.pop(_state_key(jobs_file, history_file), None)
@@ -0,0 +1,198 @@
+"""In-process execution of sql jobs against SQLite databases.
+
+An sql job names its target database in its sql_target option:
+
+    {"database": "/srv/data/metrics.db", "timeout_seconds": 60}
+
+Its script runs in the TaskFlow process (or worker) through a pooled sqlite3
+connection instead of a new sqlite3 process per run. Connections are pooled
+per database file and reused across runs and jobs. Without a database the
+script runs against a fresh in-memory database, as it used to.
+
+Statements run in autocommit mode unless the script opens a transaction
+itself; a transaction left open by a failed or unfinished script is rolled
+back before the connection goes back to the pool. A run that takes longer
+than timeout_seconds is interrupted. Rows returned by queries are printed
+like the sqlite3 shell prints them (columns separated by |), and the number
+of rows returned and changed is recorded with the run.
+
+Arguments are name=value pairs bound to the named parameters of the
+statements, e.g. `day=2024-01-31` for `WHERE day = :day`.
+"""
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from job_io import split_arguments
+from overlap import CANCELLED_MESSAGE
+
+MEMORY_DATABASE = ":memory:"
+DEFAULT_TIMEOUT_SECONDS = 300
+# Seconds to wait for a lock held by another connection before failing
+BUSY_TIMEOUT_SECONDS = 10
+# Idle connections kept per database file
+POOL_SIZE = 4
+# SQLite virtual machine instructions between two timeout checks
+PROGRESS_STEPS = 10000
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# Function to validate the sql_target option of a job, returns None for an in-memory database
+def normalize_sql_target(target):
+    if not target:
+        return None
+    if isinstance(target, str):
+        target = {'database': target}
+
+    database = str(target.get('database') or '').strip()
+    if not database:
+        return None
+
+    return {
+        'database': database,
+        'timeout_seconds': max(float(target.get('timeout_seconds', DEFAULT_TIMEOUT_SECONDS) or DEFAULT_TIMEOUT_SECONDS), 1.0),
+    }
+
+
+# Function to parse run arguments into the named parameters of the statements
+def parse_parameters(arguments):
+    parameters = {}
+    for pair in split_arguments(arguments):
+        name, separator, value = pair.partition("=")
+        if not separator or not name:
+            raise ValueError(f"SQL arguments must be name=value pairs, got '{pair}'")
+        parameters[name.lstrip(":@$")] = value
+    return parameters
+
+
+# Function to split a script into complete statements
+def split_statements(script):
+    statements = []
+    current = ""
+    # A semicolon only ends a statement outside of strings, comments and triggers
+    for piece in script.split(";"):
+        current += piece + ";"
+        if sqlite3.complete_statement(current):
+            statements.append(current.strip())
+            current = ""
+    # A last statement without a semicolon, minus the one added above
+    if current[:-1].strip():
+        statements.append(current[:-1].strip())
+    return [statement for statement in statements if statement.rstrip(";").strip()]
+
+
+# Function to format a row the way the sqlite3 shell does in its default list mode
+def format_row(row):
+    return "|".join("" if value is None else str(value) for value in row)
+
+
+class ConnectionPool:
+    """Idle sqlite3 connections per database file, shared by all runs of the process"""
+
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._idle = {}
+
+    def acquire(self, database):
+        """Take an idle connection to the database or open a new one"""
+        key = str(Path(database).resolve())
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        # Runs execute on run queue threads, so a connection moves between threads
+        db = sqlite3.connect(key, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def release(self, database, db):
+        """Return a connection to the pool, or close it if the pool is full"""
+        key = str(Path(database).resolve())
+        try:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+        except sqlite3.Error:
+            db.close()
+            return
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.size:
+                idle.append(db)
+                return
+        db.close()
+
+    def close_all(self):
+        with self._lock:
+            idle = [db for connections in self._idle.values() for db in connections]
+            self._idle.clear()
+        for db in idle:
+            db.close()
+
+
+# Function to get the process-wide connection pool
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+    return _pool
+
+
+# Function to run an sql script in-process and return its result like run_script()
+def run_sql(script_path, arguments="", sql_target=None, handle=None):
+    started = time.monotonic()
+    target = normalize_sql_target(sql_target)
+    timeout = target['timeout_seconds'] if target else DEFAULT_TIMEOUT_SECONDS
+    lines = []
+    rows_returned = 0
+    changes_before = None
+    db = None
+    try:
+        with open(script_path, 'r') as f:
+            statements = split_statements(f.read())
+        parameters = parse_parameters(arguments)
+
+        if target:
+            db = get_pool().acquire(target['database'])
+        else:
+            db = sqlite3.connect(MEMORY_DATABASE, isolation_level=None)
+        changes_before = db.total_changes
+
+        # Returning non-zero from the progress handler interrupts the running statement
+        deadline = started + timeout
+        cancelled = (lambda: handle.cancelled) if handle is not None else (lambda: False)
+        db.set_progress_handler(lambda: 1 if time.monotonic() > deadline or cancelled() else 0, PROGRESS_STEPS)
+        for statement in statements:
+            for row in db.execute(statement, parameters):
+                lines.append(format_row(row))
+                rows_returned += 1
+        success, returncode, error = True, 0, ''
+    except Exception as e:
+        success, returncode, error = False, 1, str(e)
+        if handle is not None and handle.cancelled:
+            error = CANCELLED_MESSAGE
+        elif isinstance(e, sqlite3.OperationalError) and time.monotonic() - started > timeout:
+            error = f"Timed out after {timeout:.0f} seconds ({e})"
+    finally:
+        rows_changed = db.total_changes - changes_before if changes_before is not None else 0
+        if db is not None:
+            db.set_progress_handler(None, 0)
+            if target:
+                get_pool().release(target['database'], db)
+            else:
+                db.close()
+
+    return {
+        'success': success,
+        'returncode': returncode,
+        'output': "".join(line + "\n" for line in lines),
+        'error': error,
+        'duration': time.monotonic() - started,
+        'rows_returned': rows_returned,
+        'rows_changed': rows_changed,
+        'cancelled': handle is not None and handle.cancelled,
+    }
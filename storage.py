@@ -0,0 +1,346 @@
+"""Reading and writing of the TaskFlow data files.
+
+history.json can grow to millions of entries, so it is never parsed in one go
+on the page thread. HistoryLoader parses it in a background thread, either from
+the JSON file item by item or from a binary snapshot (history.snapshot) that is
+kept next to it for quick restarts. The snapshot starts with the pickled
+HistoryStore; every save appends the new entries as another chunk, stamped
+with the size and mtime of the history.json it mirrors, so a stale snapshot
+is detected and ignored. Pruning renumbers the rows, so the first save after
+a prune rewrites the snapshot instead of appending to it.
+
+Data files are never written in place. write_atomic() writes a temporary file
+next to the target, fsyncs it and renames it over the target, so a crash or a
+reader in the middle of a save sees either the old or the new file, never a
+truncated one. GroupCommit merges saves that arrive within a few milliseconds
+of each other into one such write. file_lock() serializes changes to a file
+between processes, e.g. the web interface and the command line.
+"""
+import datetime
+import json
+import os
+import pickle
+import stat
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+if os.name == 'posix':
+    import fcntl
+else:
+    import msvcrt
+
+from history_store import HistoryStore
+
+# Bumped when the HistoryStore layout changes; 6 pickles interned values without their index
+SNAPSHOT_VERSION = 6
+# Snapshots with more appended chunks than this are rewritten on the next load
+SNAPSHOT_MAX_CHUNKS = 200
+READ_CHUNK_BYTES = 1024 * 1024
+# Seconds the first of a group of saves waits for others to join its write
+GROUP_COMMIT_SECONDS = 0.005
+
+_decoder = json.JSONDecoder()
+
+
+# Function to iterate over the items of a JSON array file without loading it whole
+def iter_json_array(path, chunk_bytes=READ_CHUNK_BYTES):
+    """Yield the items of a top-level JSON array one at a time"""
+    with open(path, 'r') as f:
+        buffer = ''
+        index = 0
+        eof = False
+        while True:
+            length = len(buffer)
+            while index < length and buffer[index] in ' \t\r\n,[':
+                index += 1
+            if index < length and buffer[index] == ']':
+                return
+            if index >= length and eof:
+                return
+
+            try:
+                item, index = _decoder.raw_decode(buffer, index)
+            except json.JSONDecodeError:
+                # Either the item is cut off at the end of the buffer or the file is broken
+                if eof:
+                    raise
+                more = f.read(chunk_bytes)
+                if not more:
+                    eof = True
+                buffer = buffer[index:] + more
+                index = 0
+                continue
+
+            yield item
+
+
+# Function to make a rename in a directory durable; directories cannot be synced on Windows
+def fsync_directory(directory):
+    if os.name != 'posix':
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# Function to replace a file with the content written by write(f), all or nothing
+def write_atomic(path, write, mode='w'):
+    path = Path(path)
+    fd, temp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        # mkstemp creates the file readable by its owner only
+        os.chmod(temp_name, stat.S_IMODE(os.stat(path).st_mode) if path.exists() else 0o644)
+        with os.fdopen(fd, mode) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_name, path)
+    except BaseException:
+        try:
+            os.remove(temp_name)
+        except OSError:
+            pass
+        raise
+    fsync_directory(path.parent)
+
+
+# Function to hold an exclusive lock on a data file across processes, using a .lock file next to it
+@contextmanager
+def file_lock(path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + ".lock"), 'a+b') as f:
+        if os.name == 'posix':
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if os.name == 'posix':
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# Function to move a data file that cannot be read out of the way, so the next save does not replace it
+def set_aside(path):
+    """Return the new path of the file"""
+    path = Path(path)
+    broken = path.with_name(f"{path.name}.broken-{datetime.datetime.now():%Y%m%d-%H%M%S}")
+    os.replace(path, broken)
+    return broken
+
+
+class GroupCommit:
+    """Merges saves requested within a short window into one durable write.
+
+    The first caller of commit() waits GROUP_COMMIT_SECONDS, then runs write()
+    once for itself and every caller that arrived meanwhile; they all return
+    when that write is done, or raise its error. write() must read the data it
+    saves when it runs, not when commit() was called, and callers must not hold
+    a lock write() needs.
+    """
+
+    def __init__(self, write, window=GROUP_COMMIT_SECONDS):
+        self.write = write
+        self.window = window
+        self.writes = 0
+        self._condition = threading.Condition()
+        self._requested = 0
+        self._committed = 0
+        self._writing = False
+        # Last request of a write -> [its error or None, callers of the write yet to see it]
+        self._batches = {}
+
+    def commit(self):
+        with self._condition:
+            self._requested += 1
+            ticket = self._requested
+            while self._committed < ticket and self._writing:
+                self._condition.wait()
+            if self._committed >= ticket:
+                # The first write that covered this request decides, not whichever write came last
+                last = min(last for last in self._batches if last >= ticket)
+                batch = self._batches[last]
+                batch[1] -= 1
+                if not batch[1]:
+                    del self._batches[last]
+                if batch[0] is not None:
+                    raise batch[0]
+                return
+            self._writing = True
+
+        # This caller writes for everyone who asks until the window closes
+        error = None
+        covered = ticket
+        try:
+            time.sleep(self.window)
+            with self._condition:
+                covered = self._requested
+            self.write()
+        except BaseException as e:
+            error = e
+
+        with self._condition:
+            self.writes += 1
+            # Everyone from the last write up to covered waited for this one, except this caller
+            waiting = covered - self._committed - 1
+            if waiting:
+                self._batches[covered] = [error, waiting]
+            self._committed = covered
+            self._writing = False
+            self._condition.notify_all()
+        if error is not None:
+            raise error
+
+
+# Function to get a cheap fingerprint of a data file
+def file_stamp(path):
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+# Function to get the snapshot path that belongs to a data file
+def snapshot_path(path):
+    return Path(path).with_suffix('.snapshot')
+
+
+# Function to read the snapshot of a data file, returns None when it is missing or stale
+def read_snapshot(path):
+    snapshot_file = snapshot_path(path)
+    if not snapshot_file.exists():
+        return None
+
+    history = None
+    chunks = 0
+    stamp = None
+    try:
+        with open(snapshot_file, 'rb') as f:
+            while True:
+                try:
+                    version, stamp, chunk = pickle.load(f)
+                except EOFError:
+                    break
+                if version != SNAPSHOT_VERSION:
+                    return None
+                if history is None:
+                    # The first chunk is the whole store, later ones are appended entries
+                    history = chunk
+                else:
+                    for entry in chunk:
+                        history.append(entry)
+                chunks += 1
+    except Exception:
+        return None
+
+    if history is None or stamp is None or tuple(stamp) != file_stamp(path):
+        return None
+
+    return history, chunks, snapshot_file.stat().st_size
+
+
+# Function to write a complete snapshot of a data file, returns the snapshot size
+def write_snapshot(path, history):
+    snapshot_file = snapshot_path(path)
+    stamp = file_stamp(path)
+
+    # The columns pickle as a few large byte strings, so this is quick even for millions of runs
+    write_atomic(snapshot_file, lambda f: pickle.dump((SNAPSHOT_VERSION, stamp, history), f, protocol=pickle.HIGHEST_PROTOCOL), mode='wb')
+
+    return snapshot_file.stat().st_size
+
+
+# Function to append new entries to a snapshot, returns the new size or None if a full rewrite is needed
+def append_snapshot(path, new_entries, expected_size):
+    snapshot_file = snapshot_path(path)
+    try:
+        # Someone else wrote the snapshot since we last saw it
+        if snapshot_file.stat().st_size != expected_size:
+            return None
+    except FileNotFoundError:
+        return None
+
+    with open(snapshot_file, 'ab') as f:
+        pickle.dump((SNAPSHOT_VERSION, file_stamp(path), list(new_entries)), f,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+
+    return snapshot_file.stat().st_size
+
+
+# Function to bring the snapshot of a data file up to date after it was saved
+def update_snapshot(path, history, snapshot_state):
+    """Append the runs added since snapshot_state, or rewrite the snapshot; returns the new state"""
+    size = None
+    # After a prune the snapshot still holds the removed runs, appending to it would bring them back
+    if snapshot_state and snapshot_state['generation'] == history.generation and len(history) >= snapshot_state['count']:
+        new_entries = [history.row(row) for row in range(snapshot_state['count'], len(history))]
+        size = append_snapshot(path, new_entries, snapshot_state['size'])
+    if size is None:
+        size = write_snapshot(path, history)
+    return {'count': len(history), 'size': size, 'generation': history.generation}
+
+
+class HistoryLoader:
+    """Loads history.json in a background thread so pages can render before it is parsed"""
+
+    def __init__(self, path, transform=None):
+        self.path = Path(path)
+        # Applied to every entry read from the JSON file, e.g. to migrate older entries
+        self.transform = transform
+        self.history = HistoryStore()
+        self.snapshot_state = None
+        # Size and mtime of the file before it was read, so later changes by other processes are noticed
+        self.stamp = None
+        self.error = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="history-loader", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            if not self.path.exists():
+                return
+            self.stamp = file_stamp(self.path)
+
+            snapshot = read_snapshot(self.path)
+            if snapshot is not None:
+                history, chunks, size = snapshot
+                self.history = history
+                if chunks > SNAPSHOT_MAX_CHUNKS:
+                    size = write_snapshot(self.path, history)
+                self.snapshot_state = {'count': len(history), 'size': size, 'generation': history.generation}
+                return
+
+            history = HistoryStore()
+            transform = self.transform
+            for entry in iter_json_array(self.path):
+                history.append(transform(entry) if transform else entry)
+            self.history = history
+            try:
+                size = write_snapshot(self.path, history)
+                self.snapshot_state = {'count': len(history), 'size': size, 'generation': history.generation}
+            except Exception:
+                # The snapshot is only an accelerator, history.json stays the source of truth
+                self.snapshot_state = None
+        except Exception as e:
+            self.error = e
+        finally:
+            self._done.set()
+
+    def ready(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """Wait for the load to finish and return the history store, raising any load error"""
+        self._done.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.history
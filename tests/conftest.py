@@ -0,0 +1,65 @@
+"""Shared fixtures for the TaskFlow tests.
+
+The modules keep their data under a relative data/ directory, so every test
+runs in its own temporary directory with fresh process-wide state.
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """A temporary TaskFlow directory with data/ and scripts/ that the modules use"""
+    import file_triggers
+    import notifications
+    import output_store
+    import result_cache
+    import run_queue
+    import search_index
+    import shared_state
+    import work_queue
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    # Both remember which database files already have their tables
+    monkeypatch.setattr(work_queue, "QUEUE_FILE", tmp_path / "data" / "work_queue.db")
+    monkeypatch.setattr(search_index, "INDEX_FILE", tmp_path / "data" / "search.db")
+    # The result collector belongs to the queue of the previous test
+    monkeypatch.setattr(work_queue, "_collector", None)
+    # Dictionaries and blobs read from the data/ directory of the previous test
+    monkeypatch.setattr(output_store, "_dicts", None)
+    monkeypatch.setattr(output_store, "_job_dicts", None)
+    monkeypatch.setattr(output_store, "_blobs", None)
+    monkeypatch.setattr(output_store, "_blob_added", {})
+    monkeypatch.setattr(output_store, "_blobs_read", None)
+    # Process-wide singletons start over, so no test sees the runs, results, watches or events of another
+    monkeypatch.setattr(run_queue, "_run_queue", None)
+    monkeypatch.setattr(result_cache, "_result_cache", result_cache.ResultCache())
+    monkeypatch.setattr(file_triggers, "_watcher", None)
+    monkeypatch.setattr(notifications, "_notifier", None)
+    shared_state.reset_shared_state()
+    yield tmp_path
+    # A collector still waiting for runs would go on polling the queue file of the next test's directory
+    collector = work_queue._collector
+    if collector is not None:
+        with collector._lock:
+            collector._futures.clear()
+    shared_state.reset_shared_state()
+
+
+@pytest.fixture
+def script(workdir):
+    """Function writing a script into the temporary directory and returning its path"""
+    def write(name, content):
+        path = workdir / "scripts" / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(content)
+        os.chmod(path, 0o755)
+        return str(path)
+    return write
@@ -0,0 +1,80 @@
+import shlex
+import time
+
+import pytest
+
+from file_triggers import normalize_file_trigger, trigger_arguments
+from output_store import entry_output
+from sql_runner import parse_parameters
+
+
+def test_trigger_without_paths_is_rejected():
+    assert normalize_file_trigger(None) is None
+    with pytest.raises(ValueError):
+        normalize_file_trigger({'paths': "", 'events': ["create"]})
+    with pytest.raises(ValueError):
+        normalize_file_trigger({'paths': [], 'events': ["create"]})
+
+
+def test_add_and_update_job_reject_a_trigger_without_paths(workdir):
+    import core
+
+    core.load_data()
+    with pytest.raises(ValueError):
+        core.add_job("Watch", "echo hi", "sh", 1, "hours", file_trigger={'paths': "  \n"})
+    assert core.get_state().jobs == []
+
+    job_id = core.add_job("Watch", "echo hi", "sh", 1, "hours", file_trigger={'paths': str(workdir)})
+    assert not core.update_job(job_id, "Watch", "echo hi", "sh", 1, "hours", True, file_trigger={'paths': []})
+    assert core.get_state().find_job(job_id)['file_trigger']['paths'] == [str(workdir)]
+
+
+def test_paths_with_spaces_stay_one_argument():
+    path = "/srv/in coming/it's here.csv"
+    arguments = trigger_arguments({'script_type': 'sh', 'script_arguments': "--mode fast"}, path)
+    assert shlex.split(arguments) == ["--mode", "fast", path]
+
+    arguments = trigger_arguments({'script_type': 'sql', 'script_arguments': "day=2024-01-31"}, path)
+    assert parse_parameters(arguments) == {'day': "2024-01-31", 'path': path}
+
+
+def test_file_event_starts_the_run_without_another_check(workdir, script):
+    import core
+
+    incoming = workdir / "in coming"
+    incoming.mkdir()
+    core.load_data()
+    job_id = core.add_job("Watch", 'echo "got $1"', "sh", 1, "hours",
+                          file_trigger={'paths': str(incoming), 'events': ["create", "modify"], 'debounce_seconds': 0.1})
+    core.check_scheduled_jobs()
+
+    (incoming / "new file.txt").write_text("data")
+    deadline = time.monotonic() + 15
+    while not core.get_job_history().rows([job_id]) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert core.get_state().wait_for_runs(30)
+
+    history = core.get_job_history()
+    run = history.row(history.rows([job_id])[0])
+    assert run['success']
+    assert run['arguments'] == shlex.quote(str(incoming / "new file.txt"))
+    assert f"got {incoming / 'new file.txt'}" in entry_output(run)
+
+
+def test_arguments_with_unbalanced_quotes(workdir, script):
+    import core
+    from job_io import parse_jobs
+
+    core.load_data()
+    with pytest.raises(ValueError):
+        core.add_job("Quote", "echo hi", "sh", 1, "hours", script_arguments="O'Brien")
+    job_id = core.add_job("Quote", "echo hi", "sh", 1, "hours", script_arguments='"O\'Brien"')
+    assert not core.update_job(job_id, "Quote", "echo hi", "sh", 1, "hours", True, script_arguments="O'Brien")
+    assert core.get_state().find_job(job_id)['script_arguments'] == '"O\'Brien"'
+
+    specs, errors = parse_jobs('{"name": "Quote", "script_content": "echo hi", "script_type": "sh", "script_arguments": "O\'Brien"}', "jsonl")
+    assert specs == [] and len(errors) == 1
+
+    # Saved before arguments were checked, such jobs still run with the arguments split on spaces
+    path = script("args.sh", 'printf "%s|" "$@"\n')
+    assert core.run_script(path, "sh", "O'Brien  x")['output'] == "O'Brien|x|"
@@ -0,0 +1,111 @@
+import datetime
+import json
+import subprocess
+import sys
+import threading
+import uuid
+
+import shared_state
+from conftest import ROOT
+from storage import read_snapshot
+
+
+# Function to add a history entry of a job that ran the given number of days ago
+def record(core, job_id, days_ago):
+    state = core.get_state()
+    with state.lock:
+        state.history.append({
+            'job_id': job_id,
+            'run_id': str(uuid.uuid4()),
+            'timestamp': datetime.datetime.now() - datetime.timedelta(days=days_ago),
+            'success': True,
+            'output': f"{days_ago} days ago",
+            'error': "",
+            'arguments': "",
+        })
+
+
+# Function to load the history again the way a restarted process does
+def reload_history(core):
+    shared_state.reset_shared_state()
+    core.load_data()
+    return core.get_job_history()
+
+
+def test_appends_after_a_prune_do_not_bring_pruned_runs_back(workdir):
+    import core
+
+    core.load_data()
+    job_id = core.add_job("Old", "echo hi", "sh", 1, "hours")
+    core.get_job_history()
+    for days_ago in (30, 20, 10):
+        record(core, job_id, days_ago)
+    core.save_data()
+
+    # Runs finishing between the prune and its save make the history as long as the snapshot again
+    state = core.get_state()
+    with state.lock:
+        assert state.history.prune(datetime.datetime.now() - datetime.timedelta(days=15)) == 2
+    for days_ago in (3, 2):
+        record(core, job_id, days_ago)
+    core.save_data()
+
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=15)
+    history, chunks, size = read_snapshot(core.HISTORY_FILE)
+    assert len(history) == 3 and min(history.timestamp_of(row) for row in range(3)) > cutoff
+    history = reload_history(core)
+    assert len(history) == 3 and min(history.timestamp_of(row) for row in range(3)) > cutoff
+
+
+def test_runs_recorded_while_saving_are_kept(workdir):
+    import core
+
+    core.load_data()
+    job_id = core.add_job("Busy", "echo hi", "sh", 1, "hours")
+    core.get_job_history()
+    for days_ago in range(2000):
+        record(core, job_id, days_ago / 1000)
+
+    # Saves serialize outside the lock, so runs keep being recorded while they write
+    savers = [threading.Thread(target=core.save_data) for _ in range(4)]
+    for saver in savers:
+        saver.start()
+    for days_ago in range(100):
+        record(core, job_id, days_ago / 1000)
+    for saver in savers:
+        saver.join()
+    core.save_data()
+
+    assert len(reload_history(core)) == 2100
+
+
+def test_runs_saved_by_another_process_are_kept(workdir):
+    import core
+
+    core.load_data()
+    job_id = core.add_job("Shared", "echo hi", "sh", 1, "hours")
+    core.get_job_history()
+    record(core, job_id, 2)
+    core.save_data()
+
+    # The command line records a run while this process keeps its own copy of the history
+    trigger = subprocess.run([sys.executable, str(ROOT / "scriptflow.py"), "trigger", job_id],
+                             capture_output=True, text=True, timeout=60)
+    assert trigger.returncode == 0, trigger.stderr
+    record(core, job_id, 1)
+    core.save_data()
+
+    saved = json.loads(core.HISTORY_FILE.read_text())
+    assert len(saved) == 3
+    assert len(core.get_job_history()) == 3
+    # record() leaves the stats alone, the merged run of the command line counts
+    assert core.get_state().find_job(job_id)['stats']['runs'] == 1
+
+    # Runs pruned here stay gone, although the other process saved them again before the prune
+    trigger = subprocess.run([sys.executable, str(ROOT / "scriptflow.py"), "trigger", job_id],
+                             capture_output=True, text=True, timeout=60)
+    assert trigger.returncode == 0, trigger.stderr
+    assert core.prune_history(1.5) == 1
+    saved = json.loads(core.HISTORY_FILE.read_text())
+    assert len(saved) == 3
+    assert len(core.get_job_history()) == 3
@@ -0,0 +1,56 @@
+import subprocess
+import sys
+
+import pyarrow.dataset as ds
+
+from conftest import ROOT
+from history_export import sync_history
+from test_history import record
+
+
+# Function to read the run ids of an exported dataset
+def exported_run_ids(directory):
+    return sorted(ds.dataset(directory, partitioning="hive").to_table(columns=['run_id'])['run_id'].to_pylist())
+
+
+def test_sync_exports_every_run_once(workdir):
+    import core
+
+    core.load_data()
+    job_id = core.add_job("Export", "echo hi", "sh", 1, "hours")
+    core.get_job_history()
+    export = workdir / "export"
+    record(core, job_id, 0)
+    core.save_data()
+    assert sync_history(export)['runs'] == 1
+    assert sync_history(export)['runs'] == 0
+
+    record(core, job_id, 0)
+    core.save_data()
+    result = sync_history(export)
+    assert (result['runs'], result['total']) == (1, 2)
+    assert exported_run_ids(export) == sorted(core.get_job_history().run_id(row) for row in range(2))
+
+
+def test_runs_saved_before_merged_ones_are_exported(workdir):
+    import core
+
+    core.load_data()
+    job_id = core.add_job("Export", "echo hi", "sh", 1, "hours")
+    core.get_job_history()
+    export = workdir / "export"
+    record(core, job_id, 0)
+    core.save_data()
+
+    trigger = subprocess.run([sys.executable, str(ROOT / "scriptflow.py"), "trigger", job_id],
+                             capture_output=True, text=True, timeout=60)
+    assert trigger.returncode == 0, trigger.stderr
+    assert sync_history(export)['runs'] == 2
+
+    # Saved ahead of the run of the command line, which is merged in after it
+    record(core, job_id, 0)
+    core.save_data()
+    result = sync_history(export)
+    assert (result['runs'], result['total']) == (1, 3)
+    history = core.get_job_history()
+    assert exported_run_ids(export) == sorted(history.run_id(row) for row in range(len(history)))
@@ -0,0 +1,128 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import notifications
+from notifications import MAX_ATTEMPTS, Notifier
+
+
+class Endpoint(BaseHTTPRequestHandler):
+    """Webhook stub: /ok accepts, /flaky fails its first two requests, /gone always answers 404"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, body))
+            attempts = sum(1 for path, _ in server.requests if path == self.path)
+        if self.path == "/gone" or (self.path == "/flaky" and attempts <= 2):
+            status = 404 if self.path == "/gone" else 503
+        else:
+            status = 200
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def endpoint():
+    """Base URL of a webhook stub running in a thread; its requests are in endpoint.requests"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Endpoint)
+    server.lock = threading.Lock()
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+# Function to build the notifications option of a job sending everything to a stub path
+def webhook(server, path, on=("success", "failure")):
+    return [{'type': 'webhook', 'target': f"http://127.0.0.1:{server.server_port}{path}", 'on': list(on)}]
+
+
+# Function to build the event of a run
+def event(number, events=("failure",)):
+    return {'events': list(events), 'job_id': "job", 'job_name': "Job", 'run_id': str(number)}
+
+
+# Function to wait until a condition holds, returns whether it did
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def requests_to(server, path):
+    with server.lock:
+        return [body for request_path, body in server.requests if request_path == path]
+
+
+def test_events_published_together_are_sent_in_one_request(endpoint, tmp_path):
+    notifier = Notifier(dead_letter_file=tmp_path / "dead.jsonl", batch_seconds=0.3, retry_seconds=0.05)
+    sinks = webhook(endpoint, "/ok", on=["failure"])
+    for number in range(5):
+        notifier.publish(sinks, event(number))
+    # Not wanted by the sink, so never sent
+    notifier.publish(sinks, event(99, events=["success"]))
+
+    assert wait_for(lambda: notifier.stats()['delivered'] == 5)
+    requests = requests_to(endpoint, "/ok")
+    assert len(requests) == 1
+    assert [sent['run_id'] for sent in requests[0]['events']] == ["0", "1", "2", "3", "4"]
+    assert notifier.stats()['backlog'] == 0
+
+
+def test_failed_deliveries_are_retried(endpoint, tmp_path):
+    notifier = Notifier(dead_letter_file=tmp_path / "dead.jsonl", batch_seconds=0.05, retry_seconds=0.05)
+    notifier.publish(webhook(endpoint, "/flaky"), event(1))
+
+    assert wait_for(lambda: notifier.stats()['delivered'] == 1)
+    requests = requests_to(endpoint, "/flaky")
+    # Two failures, then the same batch again
+    assert len(requests) == 3
+    assert all(body == requests[0] for body in requests)
+    stats = notifier.stats()
+    assert stats['retried'] == 2 and stats['dead'] == 0 and stats['backlog'] == 0
+    assert not (tmp_path / "dead.jsonl").exists()
+
+
+def test_deliveries_that_keep_failing_go_to_the_dead_letter_file(endpoint, tmp_path):
+    dead_letters = tmp_path / "dead.jsonl"
+    notifier = Notifier(dead_letter_file=dead_letters, batch_seconds=0.05, retry_seconds=0.02)
+    notifier.publish(webhook(endpoint, "/gone"), event(1))
+    notifier.publish(webhook(endpoint, "/gone"), event(2))
+
+    assert wait_for(lambda: notifier.stats()['dead'] == 2)
+    assert len(requests_to(endpoint, "/gone")) == MAX_ATTEMPTS
+
+    records = [json.loads(line) for line in dead_letters.read_text().splitlines()]
+    assert len(records) == 1
+    assert records[0]['attempts'] == MAX_ATTEMPTS
+    assert "404" in records[0]['error']
+    assert [dead['run_id'] for dead in records[0]['events']] == ["1", "2"]
+    assert notifier.stats()['backlog'] == 0
+
+
+def test_waking_the_delivery_thread_never_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(notifications, "MAX_BACKLOG", 2)
+    notifier = Notifier(dead_letter_file=tmp_path / "dead.jsonl")
+    # Nothing takes messages off the queue, as when the thread is busy with a batch
+    notifier._wake()
+    assert notifier.stats()['backlog'] == 0
+    notifier._queue.put_nowait(({'type': 'file', 'target': "x"}, event(1)))
+
+    started = time.monotonic()
+    notifier._wake()
+    assert time.monotonic() - started < 1
+    assert notifier.stats()['backlog'] == 1
@@ -0,0 +1,127 @@
+import datetime
+import time
+
+import pytest
+
+from overlap import overlap_action, normalize_overlap_policy
+
+
+@pytest.mark.parametrize("policy, active, queued, action", [
+    (None, 3, False, 'start'),
+    ({'mode': 'skip'}, 0, False, 'start'),
+    ({'mode': 'skip'}, 1, False, 'skip'),
+    ({'mode': 'queue'}, 1, False, 'queue'),
+    ({'mode': 'queue'}, 1, True, 'coalesce'),
+    ({'mode': 'parallel', 'max_parallel': 2}, 1, False, 'start'),
+    ({'mode': 'parallel', 'max_parallel': 2}, 2, False, 'skip'),
+    ({'mode': 'cancel'}, 1, False, 'cancel'),
+])
+def test_overlap_action(policy, active, queued, action):
+    assert overlap_action(policy, active, queued) == action
+
+
+def test_normalize_overlap_policy():
+    assert normalize_overlap_policy(None) is None
+    assert normalize_overlap_policy("allow") is None
+    assert normalize_overlap_policy("skip") == {'mode': 'skip'}
+    assert normalize_overlap_policy({'mode': 'parallel', 'max_parallel': 0}) == {'mode': 'parallel', 'max_parallel': 1}
+    with pytest.raises(ValueError):
+        normalize_overlap_policy("sometimes")
+
+
+# Function to add a job that runs for a while, returns the core module and the job id
+def slow_job(policy, seconds=1.5):
+    import core
+
+    core.load_data()
+    job_id = core.add_job("Slow", f"sleep {seconds}\necho done", "sh", 1, "hours", overlap_policy=policy)
+    return core, job_id
+
+
+# Function to make a job due and run the scheduler once
+def fire(core, job_id):
+    core.get_state().next_run_times[job_id] = datetime.datetime.now() - datetime.timedelta(seconds=1)
+    core.check_scheduled_jobs()
+
+
+# Function to wait for the scheduled runs and return the job's history entries, oldest first
+def finished_runs(core, job_id):
+    assert core.get_state().wait_for_runs(30)
+    history = core.get_job_history()
+    return [history.row(row) for row in reversed(history.rows([job_id]))]
+
+
+def test_without_policy_every_firing_starts_a_run(workdir):
+    from overlap import get_active_runs
+
+    core, job_id = slow_job(None)
+    fire(core, job_id)
+    fire(core, job_id)
+    assert get_active_runs().count(job_id) == 2
+
+    runs = finished_runs(core, job_id)
+    assert [run['success'] for run in runs] == [True, True]
+
+
+def test_skip_records_the_skipped_firing(workdir):
+    core, job_id = slow_job("skip")
+    fire(core, job_id)
+    fire(core, job_id)
+
+    runs = finished_runs(core, job_id)
+    assert sorted(run.get('overlap') or 'run' for run in runs) == ['run', 'skipped']
+    assert [run['success'] for run in runs if not run.get('overlap')] == [True]
+
+
+def test_queue_starts_one_waiting_firing_once_the_job_is_idle(workdir):
+    core, job_id = slow_job("queue", seconds=1)
+    fire(core, job_id)
+    fire(core, job_id)
+    fire(core, job_id)
+    state = core.get_state()
+    assert job_id in state.queued_runs
+
+    # The first run finishes; the next check starts the waiting firing
+    deadline = time.monotonic() + 30
+    while job_id in state.queued_runs and time.monotonic() < deadline:
+        time.sleep(0.2)
+        core.check_scheduled_jobs()
+
+    runs = finished_runs(core, job_id)
+    assert sorted(run.get('overlap') or 'run' for run in runs) == ['coalesced', 'run', 'run']
+
+
+def test_parallel_skips_firings_beyond_the_limit(workdir):
+    from overlap import get_active_runs
+
+    core, job_id = slow_job({'mode': 'parallel', 'max_parallel': 2})
+    for _ in range(3):
+        fire(core, job_id)
+    assert get_active_runs().count(job_id) == 2
+
+    runs = finished_runs(core, job_id)
+    assert sorted(run.get('overlap') or 'run' for run in runs) == ['run', 'run', 'skipped']
+    assert get_active_runs().outcomes(job_id)['skipped'] == 1
+
+
+def test_cancel_stops_the_running_run(workdir):
+    core, job_id = slow_job("cancel", seconds=20)
+    fire(core, job_id)
+    # Give the first run time to start its process
+    time.sleep(0.5)
+    started = time.monotonic()
+    fire(core, job_id)
+    core.get_state().next_run_times[job_id] = datetime.datetime.now() + datetime.timedelta(hours=1)
+
+    # Only the newer run is left going; cancel it too so the test does not wait for it
+    from overlap import get_active_runs
+    deadline = time.monotonic() + 10
+    while get_active_runs().count(job_id) > 1 and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert get_active_runs().count(job_id) == 1
+    assert time.monotonic() - started < 10
+    get_active_runs().cancel(job_id)
+
+    runs = finished_runs(core, job_id)
+    assert [run.get('overlap') for run in runs] == ['cancelled', 'cancelled']
+    assert all(not run['success'] for run in runs)
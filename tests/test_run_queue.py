@@ -0,0 +1,52 @@
+import threading
+import time
+
+from run_queue import RunQueue
+
+
+def test_slot_is_free_while_the_callbacks_of_a_finished_run_run():
+    runs = RunQueue(concurrency={'sh': 1})
+    saved = threading.Event()
+
+    # Stands in for recording the run and saving the history
+    def slow_save(future):
+        time.sleep(1)
+        saved.set()
+
+    go = threading.Event()
+    first = runs.submit('sh', lambda: go.wait(10) and 'first')
+    first.add_done_callback(slow_save)
+    go.set()
+    second = runs.submit('sh', lambda: 'second')
+
+    assert second.result(timeout=10) == 'second'
+    assert not saved.is_set()
+    assert second.queue_wait < 0.5
+    assert first.result(timeout=10) == 'first'
+
+
+def test_priorities_decide_which_waiting_run_starts_first():
+    runs = RunQueue(concurrency={'sh': 1})
+    release = threading.Event()
+    started = []
+
+    def run(name):
+        started.append(name)
+        if name == 'blocker':
+            release.wait(10)
+        return name
+
+    blocker = runs.submit('sh', lambda: run('blocker'))
+    low = runs.submit('sh', lambda: run('low'), priority='low')
+    high = runs.submit('sh', lambda: run('high'), priority='high')
+    release.set()
+
+    assert [future.result(timeout=10) for future in (blocker, low, high)] == ['blocker', 'low', 'high']
+    assert started == ['blocker', 'high', 'low']
+
+
+def test_errors_are_set_on_the_future():
+    runs = RunQueue()
+    future = runs.submit('py', lambda: 1 / 0)
+    assert isinstance(future.exception(timeout=10), ZeroDivisionError)
+    assert runs.stats()['py']['running'] == 0
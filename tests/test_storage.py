@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from storage import GroupCommit
+
+
+class SlowWake(threading.Condition):
+    """Condition that keeps the thread named "slow" from returning from wait() until resume is set"""
+
+    def __init__(self):
+        super().__init__()
+        self.parked = threading.Event()
+        self.resume = threading.Event()
+
+    def wait(self, timeout=None):
+        result = super().wait(timeout)
+        if threading.current_thread().name == "slow":
+            self.release()
+            self.parked.set()
+            self.resume.wait(10)
+            self.acquire()
+        return result
+
+
+def test_each_caller_gets_the_result_of_the_write_that_covered_it():
+    outcomes = [None, OSError("disk full")]
+
+    def write():
+        error = outcomes.pop(0)
+        if error is not None:
+            raise error
+
+    group = GroupCommit(write, window=0.2)
+    group._condition = SlowWake()
+    results = {}
+
+    def commit(name):
+        try:
+            group.commit()
+            results[name] = "ok"
+        except OSError as e:
+            results[name] = str(e)
+
+    # The first write covers both callers and succeeds
+    first = threading.Thread(target=commit, args=("first",))
+    first.start()
+    time.sleep(0.05)
+    slow = threading.Thread(target=commit, args=("slow",), name="slow")
+    slow.start()
+    first.join(10)
+    assert group._condition.parked.wait(10)
+
+    # A later write fails before the caller of the first one looks at its result
+    commit("later")
+    group._condition.resume.set()
+    slow.join(10)
+
+    assert results == {'first': "ok", 'slow': "ok", 'later': "disk full"}
+    assert group.writes == 2 and group._batches == {}
+
+
+def test_a_failed_write_is_raised_to_every_caller_it_covered():
+    def write():
+        raise OSError("disk full")
+
+    group = GroupCommit(write, window=0.2)
+    errors = []
+
+    def commit():
+        with pytest.raises(OSError):
+            group.commit()
+        errors.append(True)
+
+    threads = [threading.Thread(target=commit) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert len(errors) == 4 and group.writes == 1
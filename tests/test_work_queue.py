@@ -0,0 +1,165 @@
+import datetime
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import work_queue
+from conftest import ROOT
+
+
+# Function to start scriptflow worker processes in the temporary directory
+def start_workers(count, labels, concurrency=2):
+    return [
+        subprocess.Popen(
+            [sys.executable, str(ROOT / "scriptflow.py"), "worker", "--labels", labels, "--concurrency", str(concurrency)],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+        )
+        for _ in range(count)
+    ]
+
+
+# Function to read the state of a run in the queue
+def run_state(run_id):
+    db = work_queue.connect()
+    try:
+        return db.execute("SELECT state FROM runs WHERE id = ?", (run_id,)).fetchone()[0]
+    finally:
+        db.close()
+
+
+# Function to stop worker processes and wait for them to exit
+def stop_workers(workers):
+    for worker in workers:
+        worker.send_signal(signal.SIGTERM)
+    for worker in workers:
+        worker.communicate(timeout=30)
+
+
+def test_runs_are_spread_over_several_local_workers(script):
+    # Prints the pid of the worker process that started the script
+    path = script("whoami.sh", "sleep 0.3\necho $PPID\n")
+    workers = start_workers(3, "local")
+    try:
+        futures = [work_queue.submit_remote("local", path, "sh") for _ in range(12)]
+        results = [future.result(timeout=60) for future in futures]
+    finally:
+        stop_workers(workers)
+
+    assert all(result['success'] for result in results)
+    pids = {int(result['output']) for result in results}
+    assert pids <= {worker.pid for worker in workers}
+    assert len(pids) > 1
+    assert all(future.queue_wait >= 0 for future in futures)
+
+
+def test_runs_of_other_labels_are_left_alone(script):
+    path = script("hello.sh", "echo hello\n")
+    workers = start_workers(1, "linux")
+    try:
+        mine = work_queue.submit_remote("linux", path, "sh")
+        anyone = work_queue.submit_remote(work_queue.ANY_LABEL, path, "sh")
+        assert mine.result(timeout=60)['output'] == "hello\n"
+        assert anyone.result(timeout=60)['success']
+
+        other = work_queue.submit_remote("gpu", path, "sh")
+        time.sleep(2)
+        assert not other.done()
+    finally:
+        stop_workers(workers)
+
+
+def test_unclaimed_run_fails_after_the_claim_timeout(script):
+    path = script("hello.sh", "echo hello\n")
+    collector = work_queue.ResultCollector(poll_seconds=0.05, claim_timeout=0.5)
+
+    future = collector.submit("nobody", path, "sh")
+    result = future.result(timeout=10)
+
+    assert not result['success']
+    assert "nobody" in result['error']
+
+
+def test_runs_waiting_behind_a_live_worker_do_not_fail(script):
+    path = script("hello.sh", "echo hello\n")
+    collector = work_queue.ResultCollector(poll_seconds=0.05, claim_timeout=0.5)
+    # A worker that keeps sending heartbeats but is too busy to claim the run
+    work_queue.register_worker("busy-worker", "busy")
+
+    future = collector.submit("busy", path, "sh")
+    deadline = time.monotonic() + 1.5
+    while time.monotonic() < deadline:
+        work_queue.heartbeat("busy-worker", [])
+        time.sleep(0.1)
+    assert not future.done()
+
+    # Once the worker is gone the run fails
+    result = future.result(timeout=10)
+    assert not result['success']
+    assert "busy" in result['error']
+
+
+def test_worker_abandons_a_run_whose_lease_it_lost(script):
+    import core
+
+    path = script("slow.sh", "sleep 30\n")
+    future = work_queue.submit_remote("local", path, "sh")
+    worker = work_queue.Worker(core.submit_run, "local", lease_seconds=0.6)
+    thread = threading.Thread(target=worker.run, kwargs={'drain': True})
+    thread.start()
+
+    # Another worker took the run over, e.g. after this one missed its heartbeats
+    deadline = time.monotonic() + 10
+    while run_state(future.run_id) != 'running' and time.monotonic() < deadline:
+        time.sleep(0.05)
+    db = work_queue.connect()
+    try:
+        db.execute("UPDATE runs SET worker = 'other-worker', lease_until = ? WHERE id = ?", (time.time() + 60, future.run_id))
+        db.commit()
+    finally:
+        db.close()
+
+    thread.join(timeout=20)
+    assert not thread.is_alive()
+    assert worker.lost == 1 and worker.completed == 0
+    assert run_state(future.run_id) == 'running'
+
+
+def test_run_lost_by_its_worker_goes_to_another_worker(script):
+    path = script("hello.sh", "echo hello\n")
+    future = work_queue.submit_remote("local", path, "sh")
+
+    # A worker that claims the run and dies without renewing its lease
+    assert work_queue.claim("lost-worker", "local", lease_seconds=0.2)['script_path'] == path
+    time.sleep(0.5)
+
+    import core
+    worker = work_queue.Worker(core.submit_run, "local")
+    worker.run(drain=True)
+
+    assert future.result(timeout=10)['output'] == "hello\n"
+    assert worker.completed == 1
+
+
+def test_scheduler_does_not_wait_for_runs_without_a_worker(workdir, monkeypatch):
+    import core
+    from output_store import entry_error
+
+    monkeypatch.setattr(work_queue, "_collector", work_queue.ResultCollector(poll_seconds=0.05, claim_timeout=1))
+    core.load_data()
+    job_id = core.add_job("Pinned", "echo hi", "sh", 1, "minutes", worker_label="nowhere")
+    state = core.get_state()
+    state.next_run_times[job_id] = datetime.datetime.now() - datetime.timedelta(seconds=1)
+
+    started = time.monotonic()
+    core.check_scheduled_jobs()
+    assert time.monotonic() - started < 1
+    assert len(state.unrecorded_runs) == 1
+
+    # The run is recorded as failed once no worker claimed it in time
+    assert state.wait_for_runs(10)
+    entry = core.get_job_history()[-1]
+    assert entry['job_id'] == job_id
+    assert not entry['success']
+    assert "nowhere" in entry_error(entry)
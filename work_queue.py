@@ -0,0 +1,452 @@
+"""Durable queue of runs executed by worker processes.
+
+Jobs with a worker label are not run by the TaskFlow process itself. Their
+runs are written to an SQLite queue (data/work_queue.db) and executed by
+`python scriptflow.py worker` processes, on this host or on other hosts that
+share the TaskFlow directory. Workers run scripts through the same run queue
+and run_script() as the web interface.
+
+A worker claims a run together with a lease and renews the lease with a
+heartbeat while the script runs. If a worker dies, its lease expires and the
+run goes back to the queue for another worker, up to MAX_CLAIMS times. A
+worker whose heartbeat finds that it lost a lease stops that script and
+drops its result, so a run is never finished twice. The result is written
+back to the queue and picked up by the process that submitted the run.
+
+A worker only claims runs whose label is one of its labels. Every worker also
+claims runs with the label "any". A run waiting for a worker fails after
+CLAIM_TIMEOUT_SECONDS if no worker with its label has been seen for that
+long, so nobody waits forever for a label no worker serves. Runs waiting
+behind busy, live workers keep waiting however long the backlog is.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from pathlib import Path
+
+from overlap import RunHandle
+from run_queue import PRIORITIES, DEFAULT_PRIORITY, AGING_SECONDS
+
+QUEUE_FILE = Path("data") / "work_queue.db"
+ANY_LABEL = "any"
+DEFAULT_LEASE_SECONDS = 30
+DEFAULT_CONCURRENCY = 4
+# A run whose worker was lost this many times fails instead of being claimed again
+MAX_CLAIMS = 3
+# How often results are collected, and how often idle workers look for new runs
+POLL_SECONDS = 0.2
+WORKER_POLL_SECONDS = 0.5
+# Results nobody collected, e.g. because TaskFlow restarted, are deleted after a day
+RESULT_TTL_SECONDS = 86400
+# Seconds a run may wait while no worker with its label is seen before it fails
+CLAIM_TIMEOUT_SECONDS = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    label TEXT NOT NULL,
+    script_path TEXT NOT NULL,
+    script_type TEXT NOT NULL,
+    arguments TEXT NOT NULL,
+    sql_target TEXT,
+    priority INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    worker TEXT,
+    lease_until REAL,
+    claims INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_state ON runs (state, label);
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    labels TEXT NOT NULL,
+    host TEXT,
+    pid INTEGER,
+    started_at REAL,
+    last_seen REAL,
+    running INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+_schema_lock = threading.Lock()
+_schema_ready = set()
+_collector = None
+_collector_lock = threading.Lock()
+
+
+# Function to open the queue, creating its tables on first use
+def connect(timeout=30):
+    QUEUE_FILE.parent.mkdir(exist_ok=True)
+    # Transactions are managed explicitly so a claim can lock the queue before reading it
+    db = sqlite3.connect(QUEUE_FILE, timeout=timeout, isolation_level=None)
+    with _schema_lock:
+        if str(QUEUE_FILE) not in _schema_ready:
+            db.executescript(SCHEMA)
+            # Queues created before sql jobs could name a database
+            columns = {row[1] for row in db.execute("PRAGMA table_info(runs)")}
+            if 'sql_target' not in columns:
+                db.execute("ALTER TABLE runs ADD COLUMN sql_target TEXT")
+            _schema_ready.add(str(QUEUE_FILE))
+    return db
+
+
+# Function to turn a list or comma separated string of labels into a clean list
+def parse_labels(labels):
+    if isinstance(labels, str):
+        labels = labels.split(",")
+    return [label.strip() for label in labels or [] if label and label.strip()]
+
+
+# Function to clean up the worker label of a job, None when its runs execute in the TaskFlow process
+def normalize_worker_label(label):
+    if label is None:
+        return None
+    label = str(label).strip()
+    if "," in label:
+        raise ValueError("A job has a single worker label")
+    return label or None
+
+
+# Function to add a run to the queue, returns its id
+def enqueue(label, script_path, script_type, arguments="", priority=None, sql_target=None):
+    run_id = str(uuid.uuid4())
+    db = connect()
+    try:
+        db.execute(
+            "INSERT INTO runs (id, label, script_path, script_type, arguments, sql_target, priority, state, enqueued_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', ?)",
+            (run_id, label, str(script_path), script_type, arguments or "", json.dumps(sql_target) if sql_target else None,
+             PRIORITIES.get(priority or DEFAULT_PRIORITY, PRIORITIES[DEFAULT_PRIORITY]), time.time())
+        )
+    finally:
+        db.close()
+    return run_id
+
+
+# Function to build the result of a run that could not be executed
+def _failed_result(error):
+    return {'success': False, 'returncode': None, 'output': '', 'error': error, 'duration': 0.0}
+
+
+# Function to claim the next run for a worker, returns the run as a dict or None
+def claim(worker_id, labels, lease_seconds=DEFAULT_LEASE_SECONDS):
+    labels = parse_labels(labels) + [ANY_LABEL]
+    now = time.time()
+    db = connect()
+    try:
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # Runs of workers that stopped renewing their lease go back to the queue, or fail once lost too often
+            db.execute(
+                "UPDATE runs SET state = 'done', finished_at = ?, result = ? "
+                "WHERE state = 'running' AND lease_until < ? AND claims >= ?",
+                (now, json.dumps(_failed_result(f"The run was lost by its worker {MAX_CLAIMS} times")), now, MAX_CLAIMS)
+            )
+            db.execute(
+                "UPDATE runs SET state = 'pending', worker = NULL WHERE state = 'running' AND lease_until < ?",
+                (now,)
+            )
+
+            # Best priority first, promoted by one class for every AGING_SECONDS of waiting like the local run queue
+            row = db.execute(
+                f"SELECT id, script_path, script_type, arguments, priority, sql_target FROM runs "
+                f"WHERE state = 'pending' AND label IN ({', '.join('?' for _ in labels)}) "
+                f"ORDER BY MAX(priority - CAST((? - enqueued_at) / ? AS INTEGER), 0), enqueued_at LIMIT 1",
+                labels + [now, AGING_SECONDS]
+            ).fetchone()
+            if row is not None:
+                db.execute(
+                    "UPDATE runs SET state = 'running', worker = ?, lease_until = ?, claims = claims + 1, "
+                    "started_at = COALESCE(started_at, ?) WHERE id = ?",
+                    (worker_id, now + lease_seconds, now, row[0])
+                )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+    finally:
+        db.close()
+
+    if row is None:
+        return None
+    priority_names = {number: name for name, number in PRIORITIES.items()}
+    return {
+        'id': row[0],
+        'script_path': row[1],
+        'script_type': row[2],
+        'arguments': row[3],
+        'priority': priority_names.get(row[4], DEFAULT_PRIORITY),
+        'sql_target': json.loads(row[5]) if row[5] else None,
+    }
+
+
+# Function to renew the leases of a worker's runs, returns the ids the worker still holds
+def heartbeat(worker_id, run_ids, lease_seconds=DEFAULT_LEASE_SECONDS):
+    now = time.time()
+    db = connect()
+    try:
+        db.execute("UPDATE workers SET last_seen = ?, running = ? WHERE id = ?", (now, len(run_ids), worker_id))
+        held = []
+        for run_id in run_ids:
+            cursor = db.execute(
+                "UPDATE runs SET lease_until = ? WHERE id = ? AND worker = ? AND state = 'running'",
+                (now + lease_seconds, run_id, worker_id)
+            )
+            if cursor.rowcount:
+                held.append(run_id)
+        return held
+    finally:
+        db.close()
+
+
+# Function to store the result of a run, ignored if the worker lost the run to another worker
+def complete(run_id, worker_id, result):
+    db = connect()
+    try:
+        cursor = db.execute(
+            "UPDATE runs SET state = 'done', finished_at = ?, result = ? WHERE id = ? AND worker = ? AND state = 'running'",
+            (time.time(), json.dumps(result), run_id, worker_id)
+        )
+        return cursor.rowcount > 0
+    finally:
+        db.close()
+
+
+# Function to record a worker in the queue so it shows up in worker_status()
+def register_worker(worker_id, labels):
+    # Imported here, only worker processes need it
+    import socket
+    now = time.time()
+    db = connect()
+    try:
+        db.execute(
+            "INSERT OR REPLACE INTO workers (id, labels, host, pid, started_at, last_seen) VALUES (?, ?, ?, ?, ?, ?)",
+            (worker_id, ",".join(parse_labels(labels)), socket.gethostname(), os.getpid(), now, now)
+        )
+    finally:
+        db.close()
+
+
+# Function to remove a worker that shut down cleanly
+def unregister_worker(worker_id):
+    db = connect()
+    try:
+        db.execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+    finally:
+        db.close()
+
+
+# Function to get the registered workers and the number of queued runs per label and state
+def worker_status():
+    db = connect()
+    try:
+        workers = [
+            {'id': row[0], 'labels': parse_labels(row[1]), 'host': row[2], 'pid': row[3], 'last_seen': row[4], 'running': row[5]}
+            for row in db.execute("SELECT id, labels, host, pid, last_seen, running FROM workers ORDER BY id")
+        ]
+        runs = {
+            (label, state): count
+            for label, state, count in db.execute("SELECT label, state, COUNT(*) FROM runs GROUP BY label, state")
+        }
+        return workers, runs
+    finally:
+        db.close()
+
+
+class ResultCollector:
+    """Polls the queue for the results of runs submitted by this process and completes their futures"""
+
+    def __init__(self, poll_seconds=POLL_SECONDS, claim_timeout=CLAIM_TIMEOUT_SECONDS):
+        self.poll_seconds = poll_seconds
+        self.claim_timeout = claim_timeout
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._thread = None
+
+    def submit(self, label, script_path, script_type, arguments="", priority=None, sql_target=None):
+        """Queue a run for the workers with the given label and return a future for its result"""
+        future = Future()
+        future.run_id = enqueue(label, script_path, script_type, arguments, priority, sql_target)
+        with self._lock:
+            self._futures[future.run_id] = future
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="work-queue-collector", daemon=True)
+                self._thread.start()
+        return future
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_seconds)
+            with self._lock:
+                if not self._futures:
+                    self._thread = None
+                    return
+                run_ids = list(self._futures)
+            try:
+                self._collect(run_ids)
+            except sqlite3.Error:
+                # The queue is busy, try again on the next poll
+                continue
+
+    def _collect(self, run_ids):
+        now = time.time()
+        db = connect()
+        try:
+            # Runs no live worker can take fail, so the process waiting for them is not stuck forever;
+            # runs waiting behind busy workers keep waiting
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                unclaimed = db.execute(
+                    f"SELECT id, label FROM runs WHERE state IN ('pending', 'running') "
+                    f"AND COALESCE(lease_until, enqueued_at) < ? AND id IN ({', '.join('?' for _ in run_ids)})",
+                    [now - self.claim_timeout] + run_ids
+                ).fetchall()
+                served = None
+                if unclaimed:
+                    served = set()
+                    for (labels,) in db.execute("SELECT labels FROM workers WHERE last_seen >= ?", (now - self.claim_timeout,)):
+                        served.update(parse_labels(labels) + [ANY_LABEL])
+                for run_id, label in unclaimed:
+                    if label in served:
+                        continue
+                    error = f"No worker with the label '{label}' was seen for {self.claim_timeout:g} seconds"
+                    db.execute(
+                        "UPDATE runs SET state = 'done', finished_at = ?, result = ? WHERE id = ?",
+                        (now, json.dumps(_failed_result(error)), run_id)
+                    )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+            rows = db.execute(
+                f"SELECT id, enqueued_at, started_at, result FROM runs "
+                f"WHERE state = 'done' AND id IN ({', '.join('?' for _ in run_ids)})",
+                run_ids
+            ).fetchall()
+            db.executemany("DELETE FROM runs WHERE id = ?", ((row[0],) for row in rows))
+            db.execute("DELETE FROM runs WHERE state = 'done' AND finished_at < ?", (time.time() - RESULT_TTL_SECONDS,))
+        finally:
+            db.close()
+
+        for run_id, enqueued_at, started_at, result in rows:
+            with self._lock:
+                future = self._futures.pop(run_id, None)
+            if future is None:
+                continue
+            future.queue_wait = max((started_at or enqueued_at) - enqueued_at, 0.0)
+            try:
+                future.set_result(json.loads(result))
+            except ValueError:
+                future.set_result(_failed_result("The worker returned an unreadable result"))
+
+
+# Function to get the process-wide result collector
+def get_collector():
+    global _collector
+    with _collector_lock:
+        if _collector is None:
+            _collector = ResultCollector()
+    return _collector
+
+
+# Function to queue a run for the workers with the given label, returns a future like submit_run()
+def submit_remote(label, script_path, script_type, arguments="", priority=None, sql_target=None):
+    return get_collector().submit(label, script_path, script_type, arguments, priority, sql_target)
+
+
+class Worker:
+    """Claims runs from the queue and executes them until stopped"""
+
+    def __init__(self, submit, labels, concurrency=DEFAULT_CONCURRENCY, lease_seconds=DEFAULT_LEASE_SECONDS):
+        # submit(script_path, script_type, arguments, priority, sql_target, handle) returns a future for the result of run_script()
+        self.submit = submit
+        self.labels = parse_labels(labels)
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        import socket
+        self.id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.completed = 0
+        self.lost = 0
+        self._lock = threading.Lock()
+        # Run id -> RunHandle of the runs this worker holds a lease on
+        self._running = {}
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Stop claiming runs; runs already started are finished"""
+        self._stop.set()
+
+    def _finish(self, run_id, handle, future):
+        with self._lock:
+            # The lease was lost and the run may be running elsewhere, so its result is dropped
+            if self._running.get(run_id) is not handle:
+                return
+        try:
+            result = future.result()
+        except Exception as e:
+            result = _failed_result(str(e))
+        try:
+            complete(run_id, self.id, result)
+        finally:
+            with self._lock:
+                self._running.pop(run_id, None)
+                self.completed += 1
+
+    def _heartbeat(self, running):
+        held = set(heartbeat(self.id, running, self.lease_seconds))
+        # Runs whose lease expired were handed back to the queue; stop them instead of finishing them twice
+        for run_id in running:
+            if run_id not in held:
+                with self._lock:
+                    handle = self._running.pop(run_id, None)
+                    if handle is not None:
+                        self.lost += 1
+                if handle is not None:
+                    handle.cancel()
+
+    def run(self, drain=False):
+        """Work until stop() is called, or with drain until nothing is left to claim"""
+        register_worker(self.id, self.labels)
+        next_heartbeat = 0
+        try:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                with self._lock:
+                    running = list(self._running)
+                if now >= next_heartbeat:
+                    self._heartbeat(running)
+                    next_heartbeat = now + self.lease_seconds / 3
+
+                run = None
+                if len(running) < self.concurrency:
+                    run = claim(self.id, self.labels, self.lease_seconds)
+                if run is None:
+                    if drain and not running:
+                        break
+                    self._stop.wait(WORKER_POLL_SECONDS)
+                    continue
+
+                handle = RunHandle()
+                with self._lock:
+                    self._running[run['id']] = handle
+                future = self.submit(run['script_path'], run['script_type'], run['arguments'], run['priority'], run['sql_target'], handle)
+                future.add_done_callback(lambda future, run_id=run['id'], handle=handle: self._finish(run_id, handle, future))
+
+            # Let the runs already started finish, keeping their leases alive meanwhile
+            while True:
+                with self._lock:
+                    running = list(self._running)
+                if not running:
+                    break
+                self._heartbeat(running)
+                time.sleep(min(self.lease_seconds / 3, 1))
+        finally:
+            unregister_worker(self.id)